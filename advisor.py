@@ -0,0 +1,205 @@
+import functools
+import helpers
+
+# --- Strategy Advisor ---
+# Expected value of each action for the active hand, computed from the
+# cards the player has not seen: what is left in the shoe plus the
+# dealer's hole card. Compositions are tuples of card counts by value
+# (index 0 = twos ... index 8 = ten-valued, index 9 = aces).
+#
+# The dealer's outcomes are exact for the composition at the time of the
+# query: every card the dealer draws is taken out of it. They are worked
+# out once per query and kept in a bounded LRU cache keyed on the up card
+# and composition, so asking again in the same position is free and a new
+# hand costs one dealer enumeration. The player's own draws are taken out
+# of the composition for the first REMOVAL_DEPTH cards when working out
+# what the player draws next, but the dealer's outcomes are not
+# recomputed for them: that effect is a few thousandths of a bet, and
+# recomputing them was what made advice on a draining shoe slow.
+#
+# The dealer plays like helpers.dealer_step: draw below DEALER_STANDS_ON,
+# stand on it soft or hard, no peek for blackjack. Splits are evaluated as two independent
+# hands without resplitting, with this table's split rules: split aces
+# stand on the first hand only, and a second split hand of 21 in two cards
+# is paid as a blackjack.
+
+VALUES = (2, 3, 4, 5, 6, 7, 8, 9, 10, 11)
+DEALER_CACHE_SIZE = 10000
+PLAYER_CACHE_SIZE = 100000
+# Player draws taken out of the composition for the player's next draws when hitting
+REMOVAL_DEPTH = 1
+# The cards the dealer has drawn, as one integer: a 5-bit count per value
+DRAWN = tuple(1 << 5 * index for index in range(len(VALUES)))
+
+# Dealer outcomes: finishing on each total from DEALER_STANDS_ON to 21, then bust
+STANDS_ON = helpers.DEALER_STANDS_ON
+BUST = 22 - STANDS_ON
+
+def unseen_composition(table):
+    """Count tuple of the cards the player cannot see: the shoe plus the dealer's hole card"""
+    counts = [0] * len(VALUES)
+    for rank, count in enumerate(table.rank_counts):
+        counts[helpers.CARD_VALUES[helpers.CARD_RANKS[rank]] - 2] += count
+    counts[helpers.CARD_CODE_VALUES[table.game_state['dealer_hand'][0]] - 2] += 1
+    return tuple(counts)
+
+def _remove(counts, index):
+    return counts[:index] + (counts[index] - 1,) + counts[index + 1:]
+
+def _add(total, soft, value):
+    """Add a card to a (total, soft aces) pair, counting aces like helpers.Hand"""
+    total += value
+    if value == 11:
+        soft += 1
+    if total > 21 and soft:
+        total -= 10
+        soft -= 1
+    return total, soft
+
+@functools.lru_cache(maxsize=DEALER_CACHE_SIZE)
+def dealer_outcomes(up, counts):
+    """Probabilities of each dealer outcome (see BUST) with `up` showing, drawing from counts"""
+    counts = list(counts)
+    results = {}
+
+    def draw(total, soft, remaining, drawn):
+        # The cards drawn so far (DRAWN digits) fix the total, so they alone key the results
+        result = results.get(drawn)
+        if result is not None:
+            return result
+        result = [0.0] * (BUST + 1)
+        for index, count in enumerate(counts):
+            if count:
+                p = count / remaining
+                new_total, new_soft = _add(total, soft, VALUES[index])
+                if new_total > 21:
+                    result[BUST] += p
+                elif new_total >= STANDS_ON:
+                    result[new_total - STANDS_ON] += p
+                else:
+                    counts[index] -= 1
+                    for outcome, q in enumerate(draw(new_total, new_soft, remaining - 1, drawn + DRAWN[index])):
+                        if q:
+                            result[outcome] += p * q
+                    counts[index] += 1
+        results[drawn] = result
+        return result
+
+    return tuple(draw(*_add(0, 0, up), sum(counts), 0))
+
+def stand_ev(total, outcomes):
+    """EV (per unit bet) of standing on total against the dealer's outcomes"""
+    ev = outcomes[BUST]
+    for outcome in range(BUST):
+        dealer_total = STANDS_ON + outcome
+        if total > dealer_total:
+            ev += outcomes[outcome]
+        elif total < dealer_total:
+            ev -= outcomes[outcome]
+    return ev
+
+def _draw(counts):
+    """(probability, value, composition after the draw) for each possible next card"""
+    remaining = sum(counts)
+    return [(count / remaining, VALUES[index], _remove(counts, index))
+            for index, count in enumerate(counts) if count]
+
+@functools.lru_cache(maxsize=PLAYER_CACHE_SIZE)
+def hit_ev(total, soft, outcomes, counts, removals=REMOVAL_DEPTH):
+    """
+    EV of hitting once and then playing hit/stand optimally (a hand reaching
+    21 stands) against the dealer's outcomes. The first `removals` cards
+    drawn are taken out of the composition; later ones are drawn from it as
+    it stands.
+    """
+    ev = 0.0
+    remaining = sum(counts)
+    for index, count in enumerate(counts):
+        if not count:
+            continue
+        p = count / remaining
+        after = _remove(counts, index) if removals else counts
+        new_total, new_soft = _add(total, soft, VALUES[index])
+        if new_total > 21:
+            ev -= p
+        elif new_total == 21:
+            ev += p * stand_ev(21, outcomes)
+        else:
+            ev += p * max(stand_ev(new_total, outcomes),
+                          hit_ev(new_total, new_soft, outcomes, after, max(removals - 1, 0)))
+    return ev
+
+def double_ev(total, soft, outcomes, counts):
+    """EV of doubling: one card at twice the bet"""
+    ev = 0.0
+    for p, value, _ in _draw(counts):
+        new_total, _ = _add(total, soft, value)
+        ev += p * (-2.0 if new_total > 21 else 2.0 * stand_ev(new_total, outcomes))
+    return ev
+
+def _split_hand_ev(total, soft, outcomes, counts):
+    """Best of stand / hit / double for a split hand after its second card"""
+    if total == 21:
+        return stand_ev(21, outcomes)
+    # The card dealt to the split hand already used up one tracked removal
+    return max(stand_ev(total, outcomes), hit_ev(total, soft, outcomes, counts, REMOVAL_DEPTH - 1),
+               double_ev(total, soft, outcomes, counts))
+
+def _dealer_blackjack(up, counts):
+    """Probability that the hole card gives the dealer 21 with two cards"""
+    if up not in (10, 11):
+        return 0.0
+    return counts[9 if up == 10 else 8] / sum(counts)
+
+def split_ev(pair_value, up, outcomes, counts):
+    """EV of splitting a pair, as two independent hands"""
+    first = second = 0.0
+    for p, value, after in _draw(counts):
+        total, soft = _add(*_add(0, 0, pair_value), value)
+        if pair_value == 11:
+            first += p * stand_ev(total, outcomes)
+        else:
+            first += p * _split_hand_ev(total, soft, outcomes, after)
+        if total == 21:
+            # move_to_next_hand marks a two-card 21 as blackjack: 3:2 unless the dealer has one
+            dealer_bj = _dealer_blackjack(up, after)
+            second += p * 1.5 * (1.0 - dealer_bj)
+        else:
+            second += p * _split_hand_ev(total, soft, outcomes, after)
+    return first + second
+
+def advise(table):
+    """EV of each allowed action for the table's active hand, in units of that hand's bet"""
+    game_state = table.game_state
+    hand = game_state['player_hands'][game_state['active_hand_index']]['hand']
+
+    counts = unseen_composition(table)
+    up = helpers.CARD_CODE_VALUES[game_state['dealer_hand'][1]]
+
+    total, soft = hand.value, int(hand.soft)
+    outcomes = dealer_outcomes(up, counts)
+
+    ev = {
+        'stand': stand_ev(total, outcomes),
+        'hit': hit_ev(total, soft, outcomes, counts),
+    }
+    if game_state['can_double']:
+        ev['double'] = double_ev(total, soft, outcomes, counts)
+    if game_state['can_split']:
+        ev['split'] = split_ev(hand.pair_value, up, outcomes, counts)
+
+    return {
+        'hand_index': game_state['active_hand_index'],
+        'player_value': total,
+        'soft': soft > 0,
+        'dealer_up': up,
+        'ev': ev,
+        'best': max(ev, key=ev.get),
+    }
+
+def cache_info():
+    """Hit/miss counts of the memoization caches"""
+    return {
+        'dealer_outcomes': dealer_outcomes.cache_info()._asdict(),
+        'hit_ev': hit_ev.cache_info()._asdict(),
+    }
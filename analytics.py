@@ -0,0 +1,165 @@
+import bisect
+import math
+import threading
+import time
+
+import handlog
+
+# --- Session Statistics ---
+# Live statistics of the hands settled at every table, kept as running sums
+# so recording a hand and answering a query both take constant time and
+# memory, however many hands have been played. Each table has one player
+# (one bank), so its statistics are that player's; the totals of all
+# tables are kept alongside. Next to the totals since start-up, each keeps
+# two windows: the last WINDOW_HANDS hands, in a ring buffer whose oldest
+# hand is subtracted as a new one comes in, and the last WINDOW_SECONDS, in
+# a ring of SLOT_SECONDS slots that are cleared as they come round again.
+
+WINDOW_HANDS = 100
+WINDOW_SECONDS = 3600
+SLOT_SECONDS = 60
+BET_BUCKETS = (10, 20, 50, 100, 200, 500, 1000)  # Upper bounds in $; larger bets share a last bucket
+MAX_TRUE_COUNT = 6  # True counts are truncated toward zero and clipped to +-this, as handlog.statistics does
+
+def count_bucket(true_count):
+    """Index into Totals.by_count of a true count"""
+    return min(max(math.trunc(true_count), -MAX_TRUE_COUNT), MAX_TRUE_COUNT) + MAX_TRUE_COUNT
+
+class Totals:
+    """Sums over a set of settled hands; add() with sign=-1 takes a hand back out"""
+
+    __slots__ = ('rounds', 'hands', 'outcomes', 'busts', 'wagered', 'net', 'bets', 'by_count')
+
+    def __init__(self):
+        self.rounds = self.hands = self.busts = self.wagered = self.net = 0
+        self.outcomes = [0] * len(handlog.OUTCOME_NAMES)
+        self.bets = [0] * (len(BET_BUCKETS) + 1)
+        self.by_count = [[0, 0, 0, 0] for _ in range(2 * MAX_TRUE_COUNT + 1)]  # hands, wins, wagered, net
+
+    def add(self, hand, sign=1):
+        """Count a hand recorded by SessionStats.record: (outcome, bet, net, bust, count bucket, first of its round)"""
+        outcome, bet, net, bust, bucket, first = hand
+        self.rounds += sign * first
+        self.hands += sign
+        self.outcomes[outcome] += sign
+        self.busts += sign * bust
+        self.wagered += sign * bet
+        self.net += sign * net
+        self.bets[bisect.bisect_left(BET_BUCKETS, bet)] += sign
+        row = self.by_count[bucket]
+        row[0] += sign
+        row[1] += sign * (outcome >= handlog.WIN)
+        row[2] += sign * bet
+        row[3] += sign * net
+
+    def merge(self, other):
+        self.rounds += other.rounds
+        self.hands += other.hands
+        self.busts += other.busts
+        self.wagered += other.wagered
+        self.net += other.net
+        for i, count in enumerate(other.outcomes):
+            self.outcomes[i] += count
+        for i, count in enumerate(other.bets):
+            self.bets[i] += count
+        for row, other_row in zip(self.by_count, other.by_count):
+            for i, value in enumerate(other_row):
+                row[i] += value
+
+    def summary(self):
+        """The totals as served by /stats: counts, rates per hand and EV per true count"""
+        hands = self.hands or 1
+        bet_labels = [f"<={bound}" for bound in BET_BUCKETS] + [f">{BET_BUCKETS[-1]}"]
+        return {
+            'rounds': self.rounds,
+            'hands': self.hands,
+            'rates': {name: count / hands for name, count in zip(handlog.OUTCOME_NAMES, self.outcomes)},
+            'bust_rate': self.busts / hands,
+            'wagered': self.wagered,
+            'net': self.net,
+            'return_per_wager': self.net / self.wagered if self.wagered else 0.0,
+            'bets': dict(zip(bet_labels, self.bets)),
+            'by_true_count': {bucket - MAX_TRUE_COUNT: {'hands': row[0], 'win_rate': row[1] / row[0],
+                                                        'wagered': row[2], 'net': row[3],
+                                                        'ev': row[3] / row[2] if row[2] else 0.0}
+                              for bucket, row in enumerate(self.by_count) if row[0]},
+        }
+
+class _Series:
+    """Totals since start-up, over the last `window_hands` hands and over the last `slots` time slots"""
+
+    def __init__(self, window_hands, slots):
+        self.total = Totals()
+        self.recent = Totals()
+        self.ring = [None] * window_hands
+        self.ring_index = 0
+        self.slots = [Totals() for _ in range(slots)]
+        self.slot_ids = [-1] * slots
+
+    def add(self, hand, slot_id):
+        self.total.add(hand)
+        if self.ring:
+            evicted = self.ring[self.ring_index]
+            if evicted is not None:
+                self.recent.add(evicted, -1)
+            self.ring[self.ring_index] = hand
+            self.ring_index = (self.ring_index + 1) % len(self.ring)
+            self.recent.add(hand)
+        index = slot_id % len(self.slots)
+        if self.slot_ids[index] != slot_id:
+            self.slots[index] = Totals()
+            self.slot_ids[index] = slot_id
+        self.slots[index].add(hand)
+
+    def window(self, slot_id):
+        """Totals of the slots still within the time window at slot_id"""
+        totals = Totals()
+        for index, slot in enumerate(self.slots):
+            if self.slot_ids[index] > slot_id - len(self.slots):
+                totals.merge(slot)
+        return totals
+
+class SessionStats:
+    """Rolling statistics per table and over all tables, fed by helpers.determine_winners"""
+
+    def __init__(self, window_hands=WINDOW_HANDS, window_seconds=WINDOW_SECONDS, slot_seconds=SLOT_SECONDS):
+        self.window_hands = window_hands
+        self.window_seconds = window_seconds
+        self.slot_seconds = slot_seconds
+        self._slots = max(1, window_seconds // slot_seconds)
+        self._all = _Series(window_hands, self._slots)
+        self._series = {}  # Table id -> _Series
+        self._lock = threading.Lock()
+
+    def _slot_id(self):
+        return int(time.monotonic() // self.slot_seconds)
+
+    def record(self, table_id, true_count, hands):
+        """
+        Record a settled round of a table: `true_count` is the Hi-Lo true
+        count it was dealt at, `hands` a list of (outcome, bet, net, value)
+        per hand, outcomes as handlog's SETTLE codes.
+        """
+        bucket = count_bucket(true_count)
+        slot_id = self._slot_id()
+        with self._lock:
+            series = self._series.get(table_id)
+            if series is None:
+                series = self._series[table_id] = _Series(self.window_hands, self._slots)
+            for i, (outcome, bet, net, value) in enumerate(hands):
+                hand = (outcome, bet, net, value > 21, bucket, i == 0)
+                series.add(hand, slot_id)
+                self._all.add(hand, slot_id)
+
+    def query(self, table_id=None):
+        """Summaries since start-up, of the last hands and of the last window_seconds, for a table or all of them"""
+        slot_id = self._slot_id()
+        with self._lock:
+            series = self._all if table_id is None else self._series.get(table_id) or _Series(0, 1)
+            total, recent, hour = series.total, series.recent, series.window(slot_id)
+            summaries = {
+                'total': total.summary(),
+                'last_hands': dict(recent.summary(), window=self.window_hands),
+                'last_seconds': dict(hour.summary(), window=self.window_seconds),
+            }
+        return dict(summaries, table=table_id or 'all')
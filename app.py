@@ -1,45 +1,398 @@
-import paho.mqtt.client as mqtt
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, g, render_template, jsonify, request, send_from_directory, url_for
+import functools
+import mimetypes
+import os
+import threading
 import time
+import advisor
+import analytics
+import assets
+import autoplay
+import connections
 import helpers  # Import our new helpers file
+import metrics
+import scheduler
+import shoes
+import snapshot
+import store
+import strategy
+import wire
 
 # --- MQTT Configuration ---
 MQTT_BROKER = "broker.hivemq.com"
 MQTT_PORT = 1883
-MQTT_TOPIC = "ece508/blkjck_table1"
+MQTT_TOPIC_PREFIX = "ece508/blkjck_"
+MQTT_QOS = 0
+MQTT_COALESCE = False  # One frame per action ("AH,TD"); the counter devices expect one card per message
+MQTT_WIRE_FORMAT = wire.TEXT  # Default for tables; wire.BINARY sends sequenced frames (see wire.py)
+SPLIT_CARD_DELAY = 0.5  # Seconds between the two cards dealt to split hands
+DEALER_STEP_INTERVAL = 0.3  # Seconds between server-driven dealer steps
+HAND_LOG_DIRECTORY = 'hand_logs'  # Hand history per table (see handlog.py); None disables it
+SHOE_POOL_SIZE = 1  # Shuffled shoes kept ready per table (see shoes.py)
+SHOE_SEED = None  # Set to an int (or string) to deal the same shoes on every run
+STATE_DATABASE = 'blackjack.db'  # SQLite file tables are saved to and restored from; None disables it
+STATE_BACKEND = 'local'  # 'shared' to serve the tables from several worker processes (see store.py)
+SHARED_STORE_ATTEMPTS = 5  # Times an action is retried after another worker changed its table first
+METRICS_ENABLED = False  # Collect metrics from start-up; otherwise from the first scrape of /metrics
+BUILD_ASSETS = True  # Serve hashed, precompressed static files built by assets.py; False serves static/ as is
+ASSET_CACHE_MAX_AGE = 365 * 24 * 3600  # Seconds; built assets change name whenever they change
 
 # --- App Configuration ---
 app = Flask(__name__)
-mqtt_client = mqtt.Client("flask_blackjack_" + str(time.time()))
+ASSET_DIRECTORY = os.path.join(app.root_path, 'static', 'dist')
+asset_manifest = {}  # Source file name -> hashed file name in ASSET_DIRECTORY
+# Distinguishes ETags of this process from those handed out before a restart
+BOOT_ID = format(int(time.time() * 1000), 'x')
+# Built by create_app(), not on import (see Application Start-up below).
+# One connection per broker, shared by the tables publishing to it (see connections.py)
+mqtt_connections = None
+default_connection = None  # Held for the life of the app
+mqtt_publisher = None
+shoe_factory = None
+table_store = None
+session_stats = None
+
+# --- Metrics ---
+REQUEST_LATENCY = metrics.Histogram('http_request_duration_seconds', 'Request handling time by route',
+                                    ('route',))
+RESPONSES = metrics.Counter('http_responses_total', 'Responses by route and status code',
+                            ('route', 'status'))
+LOCK_WAIT = metrics.Histogram('table_lock_wait_seconds', 'Time a request waited for its table lock',
+                              ('route',))
+LOCK_HOLD = metrics.Histogram('table_lock_hold_seconds', 'Time a request held its table lock',
+                              ('route',))
+
+def broker_stats():
+    """Stats of every broker connection, by broker; none before create_app()"""
+    return mqtt_connections.stats() if mqtt_connections is not None else {}
+
+metrics.Callback('mqtt_messages_total', 'Card messages by broker and outcome in the MQTT publishers', 'counter',
+                 lambda: {(broker, key): value for broker, stats in broker_stats().items()
+                          for key, value in stats.items()
+                          if key in ('queued', 'published', 'acked', 'dropped', 'failed', 'ack_timeouts', 'retried')},
+                 ('broker', 'outcome'))
+metrics.Callback('mqtt_queue_depth', 'Batches waiting in the MQTT publisher queue of each broker', 'gauge',
+                 lambda: {(broker,): stats['queue_depth'] for broker, stats in broker_stats().items()},
+                 ('broker',))
+metrics.Callback('mqtt_connection_events_total', 'Broker connections made and lost', 'counter',
+                 lambda: {(broker, event): stats[event + 's'] for broker, stats in broker_stats().items()
+                          for event in ('connect', 'disconnect')},
+                 ('broker', 'event'))
+metrics.Callback('mqtt_connected', 'Whether each broker connection is up', 'gauge',
+                 lambda: {(broker,): int(stats['connected']) for broker, stats in broker_stats().items()},
+                 ('broker',))
+metrics.Callback('scheduler_pending_events', 'Reveals and dealer steps waiting to run', 'gauge',
+                 scheduler.pending)
+metrics.Callback('shoe_factory_shoes_total', 'Shoes taken, by whether one was ready', 'counter',
+                 lambda: {('ready',): shoe_factory.hits, ('shuffled',): shoe_factory.misses}
+                 if shoe_factory else {},
+                 ('source',))
+metrics.Callback('table_store_rows_total', 'Table states saved, by what happened to them', 'counter',
+                 lambda: {(key,): value for key, value in table_store.stats().items()
+                          if key in ('saves', 'coalesced', 'rows_written', 'conflicts', 'reloads')}
+                 if table_store else {},
+                 ('outcome',))
+metrics.Callback('blackjack_tables', 'Tables created since start-up', 'gauge', lambda: len(helpers.tables))
+
+@app.before_request
+def start_on_first_request():
+    """Set the app up with the default settings if it was imported without calling create_app()"""
+    if startup_thread is None:
+        create_app()
+
+@app.before_request
+def start_request_timer():
+    if metrics.enabled:
+        g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.endpoint or 'unmatched'
+        REQUEST_LATENCY.labels(route).observe(time.perf_counter() - started)
+        RESPONSES.labels(route, response.status_code).inc()
+    return response
+
+# --- Static Assets ---
+
+@app.context_processor
+def asset_helpers():
+    return {'asset_url': asset_url, 'asset_manifest': asset_manifest}
+
+def asset_url(name):
+    """URL of a static file: its hashed build if there is one, else the file in static/"""
+    filename = asset_manifest.get(name)
+    if filename is None:
+        return url_for('static', filename=name)
+    return url_for('asset', filename=filename)
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    """A built asset, precompressed if the client accepts it, cached for good"""
+    response = None
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in request.accept_encodings and os.path.isfile(os.path.join(ASSET_DIRECTORY, filename + suffix)):
+            response = send_from_directory(ASSET_DIRECTORY, filename + suffix,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = send_from_directory(ASSET_DIRECTORY, filename)
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_CACHE_MAX_AGE}, immutable'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 # --- MQTT Functions ---
 
-def send_to_arduino(message):
-    """Send a message to Arduino via MQTT and print the revealed card"""
-    try:
-        testmessage = mqtt_client.publish(MQTT_TOPIC, message)
-        print(f"Card revealed on table: {message}")
-    except Exception as e:
-        print(f"MQTT publish error: {e}")
+def send_to_arduino(table, message, delay=0.0):
+    """
+    Send a message to the table's Arduino, `delay` seconds after the previous
+    reveal queued for that table. Immediate messages are collected in the
+    table's outbox and handed to the publisher when the request finishes;
+    delayed ones are then scheduled, and published by the scheduler thread.
+    Either way the request handler never waits on the broker and the table
+    always sees its cards in order. Each message is stamped with the table's shoe id
+    and next sequence number now, for the binary wire format.
+    """
+    event = (table.shoe_id, table.next_seq, message)
+    table.next_seq += 1
+    now = time.monotonic()
+    due = max(now, table.reveal_at) + delay
+    table.reveal_at = due
+    
+    if due <= now and table.reveals_pending == 0 and not table.paced:
+        table.outbox.append(event)
+    else:
+        table.paced.append((due, event))
+
+def publish_scheduled_card(table, event):
+    """Scheduler callback for a paced reveal"""
+    publish_cards(table, [event])
+    with table.lock:
+        table.reveals_pending -= 1
+
+def flush_outbox(table):
+    """Queue the messages an action collected in the table's outbox and schedule its paced reveals"""
+    if table.outbox:
+        publish_cards(table, table.outbox)
+        table.outbox = []
+    if table.paced:
+        for due, event in table.paced:
+            table.reveals_pending += 1
+            scheduler.call_at(due, publish_scheduled_card, table, event)
+        table.paced = []
+
+def publish_cards(table, events):
+    """Queue card events for the table's MQTT topic in its wire format and print the revealed cards"""
+    messages = [message for _, _, message in events]
+    if (table.wire_format or MQTT_WIRE_FORMAT) == wire.BINARY:
+        batches = [wire.encode_events(table.table_id, events)]
+    else:
+        batches = wire.text_batches(messages)
+    publisher = table_connection(table).publisher
+    queued = [publisher.publish(table.topic, payloads, table.qos) for payloads in batches]
+    if any(queued):
+        print(f"Card revealed on {table.table_id}: {', '.join(messages)}")
+
+def send_unpaced(table, message, delay=0.0):
+    """send_to_arduino for auto-played tables: no pacing, every card goes out with its round"""
+    table.outbox.append((table.shoe_id, table.next_seq, message))
+    table.next_seq += 1
+
+def table_connection(table):
+    """The broker connection the table's cards go out on"""
+    return table.connection or default_connection
+
+# --- State Stream ---
+
+def publish_state(table):
+    """Push the table's current revision to every stream subscriber, once per revision"""
+    helpers.commit_state(table)
+    if table.streamed_revision != table.revision:
+        table.streamed_revision = table.revision
+        table.channel.publish(table.state_json)
+
+def state_response(table):
+    """
+    Response carrying the table's state. If the client sent ?since=<revision>
+    and that revision is still in the table's history, only a JSON patch from
+    it is returned; otherwise the full state, serialized once per revision.
+    """
+    state_json = helpers.commit_state(table)
+    
+    since = request.args.get('since', type=int)
+    if since is not None:
+        patch = helpers.state_patch(table, since)
+        if patch is not None:
+            return jsonify({'revision': table.revision, 'since': since, 'patch': patch})
+    
+    return app.response_class(state_json, mimetype='application/json')
+
+def schedule_dealer_turn(table):
+    """Start playing the dealer's turn on the server if the table is waiting for it"""
+    if table.game_state['game_status'] == 'dealer_turn' and not table.dealer_turn_scheduled:
+        table.dealer_turn_scheduled = True
+        scheduler.call_later(DEALER_STEP_INTERVAL, run_dealer_turn, table)
+
+def run_dealer_turn(table):
+    """Scheduler callback: one dealer step, then the next one after DEALER_STEP_INTERVAL"""
+    def step():
+        if table.game_state['game_status'] == 'dealer_turn':
+            helpers.dealer_step(table, send_to_arduino)
+    
+    with table.lock:
+        table.dealer_turn_scheduled = False
+        if run_action(table, step) is BUSY:
+            schedule_dealer_turn(table)  # Try the step again later
+
+def finish_action(table):
+    """Publish everything an action produced: MQTT messages, the state stream, dealer steps, statistics, the saved state"""
+    flush_outbox(table)
+    helpers.record_stats(table)
+    publish_state(table)
+    schedule_dealer_turn(table)
+    if table_store is not None and not table_store.shared:
+        table_store.save(table)
+
+BUSY = object()  # run_action's result when every attempt lost to another worker
 
-def setup_mqtt_client():
-    """Connects the MQTT client"""
+def run_action(table, action, read_only=False):
+    """
+    Call action() on the table, whose lock must be held, and unless it only
+    reads state, finish it. With a shared table store the table is first
+    brought up to the stored revision, and an action that changed the state
+    is finished only once its write lands: if another worker changed the
+    table first, the attempt is thrown away (its cards were not sent nor
+    its rounds recorded yet), the table reloaded and the action run again.
+    Returns action()'s result, or BUSY when every attempt lost.
+    """
+    if table_store is None or not table_store.shared:
+        try:
+            return action()
+        finally:
+            if not read_only:
+                finish_action(table)
+    
+    for _ in range(SHARED_STORE_ATTEMPTS):
+        table_store.sync(table)
+        if read_only:
+            return action()
+        revision, reveal_at = table.revision, table.reveal_at
+        try:
+            result = action()
+            helpers.commit_state(table)
+        except Exception:
+            discard_attempt(table, reveal_at)  # Drop whatever the action changed before it failed
+            raise
+        if table.revision == revision or table_store.save(table, revision):
+            finish_action(table)
+            return result
+        discard_attempt(table, reveal_at)
+    return BUSY
+
+def discard_attempt(table, reveal_at):
+    """Undo an action run under a shared table store: reload the table and drop what it queued"""
+    # Always reload: another worker's write may have reached the same revision number
+    table_store.sync(table, force=True)
+    table.outbox, table.paced, table.settled_rounds, table.reveal_at = [], [], [], reveal_at
+
+@app.route('/stream')
+@app.route('/table/<table_id>/stream')
+def stream(table_id=helpers.DEFAULT_TABLE_ID):
+    """Server-sent events stream of a table's state, one event per change"""
+    if not helpers.is_valid_table_id(table_id):
+        return jsonify({'error': 'Invalid table id'}), 404
+    
+    table = helpers.get_table(table_id, MQTT_TOPIC_PREFIX)
+    with table.lock:
+        run_action(table, lambda: publish_state(table), read_only=True)
+    
     try:
-        mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
-        mqtt_client.loop_start()
-        print("MQTT Client Connected.")
-    except Exception as e:
-        print(f"MQTT connection failed: {e}")
+        last_event_id = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        last_event_id = 0
+    
+    return Response(table.channel.listen(last_event_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/mqtt_stats', methods=['GET'])
+def mqtt_stats():
+    """Queue depth, delivery counters and latency of the default broker's publisher, and of every connection"""
+    stats = mqtt_publisher.stats()
+    stats['connections'] = mqtt_connections.stats()
+    return jsonify(stats)
+
+@app.route('/stats', methods=['GET'])
+@app.route('/table/<table_id>/stats', methods=['GET'])
+def stats(table_id=None):
+    """Session statistics of a table, or of all tables, since start-up, over the last hands and the last hour"""
+    if table_id is not None and not helpers.is_valid_table_id(table_id):
+        return jsonify({'error': 'Invalid table id'}), 404
+    
+    return jsonify(session_stats.query(table_id))
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Metrics in the Prometheus text format; the first scrape switches collection on"""
+    metrics.enable()
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# --- Table Routing ---
+
+def table_route(rule, **options):
+    """
+    Register a view for one table under both `/table/<table_id><rule>` and
+    the bare `<rule>`, which addresses the default table. The view is called
+    as `view(table, state)` while holding that table's lock, so requests on
+    different tables never wait on each other. Unless the view only reads
+    state, its result is then pushed to the table's stream (see run_action).
+    """
+    read_only = options.get('methods') == ['GET']
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(table_id=helpers.DEFAULT_TABLE_ID):
+            if not helpers.is_valid_table_id(table_id):
+                return jsonify({'error': 'Invalid table id'}), 404
+            
+            table = helpers.get_table(table_id, MQTT_TOPIC_PREFIX)
+            wait_started = time.perf_counter()
+            with table.lock:
+                locked_at = time.perf_counter()
+                try:
+                    result = run_action(table, lambda: view(table, table.game_state), read_only)
+                finally:
+                    if metrics.enabled:
+                        LOCK_WAIT.labels(view.__name__).observe(locked_at - wait_started)
+                        LOCK_HOLD.labels(view.__name__).observe(time.perf_counter() - locked_at)
+            if result is BUSY:
+                return jsonify({'error': 'Table is busy, try again'}), 409
+            return result
+        
+        app.add_url_rule(rule, view_func=wrapper, **options)
+        app.add_url_rule('/table/<table_id>' + rule, view_func=wrapper, **options)
+        return wrapper
+    return decorator
 
 # --- Flask Routes ---
 
 @app.route('/')
-def index():
-    """Render the main game page"""
-    return render_template('blackjack.html') 
+@app.route('/table/<table_id>/')
+def index(table_id=None):
+    """Render the main game page, optionally bound to a specific table"""
+    if table_id is None:
+        table_id, api_base = helpers.DEFAULT_TABLE_ID, ''
+    elif helpers.is_valid_table_id(table_id):
+        api_base = f'/table/{table_id}'
+    else:
+        return jsonify({'error': 'Invalid table id'}), 404
+    
+    table = helpers.get_table(table_id, MQTT_TOPIC_PREFIX)
+    return render_template('blackjack.html', api_base=api_base, mqtt_topic=table.topic)
 
-@app.route('/set_bet', methods=['POST'])
-def set_bet():
+@table_route('/set_bet', methods=['POST'])
+def set_bet(table, state):
     """Set the bet amount before dealing"""
     data = request.get_json()
     bet_amount = data.get('amount', helpers.MIN_BET)
@@ -47,290 +400,150 @@ def set_bet():
     if bet_amount < helpers.MIN_BET:
         return jsonify({'error': f'Minimum bet is ${helpers.MIN_BET}'}), 400
     
-    if bet_amount > helpers.game_state['bank']:
+    if bet_amount > state['bank']:
         return jsonify({'error': 'Insufficient funds'}), 400
     
-    helpers.game_state['current_bet'] = bet_amount
+    state['current_bet'] = bet_amount
     return jsonify({
-        'current_bet': helpers.game_state['current_bet'], 
-        'bank': helpers.game_state['bank']
+        'current_bet': state['current_bet'], 
+        'bank': state['bank']
     })
 
-@app.route('/deal', methods=['POST'])
-def deal():
+@table_route('/deal', methods=['POST'])
+def deal(table, state):
     """Start a new game by dealing initial cards"""
-    if helpers.game_state['bank'] < helpers.MIN_BET:
+    if state['bank'] < helpers.MIN_BET:
         return jsonify({'error': 'Insufficient funds. Please reset your bank.'}), 400
     
-    if helpers.game_state['current_bet'] > helpers.game_state['bank']:
-        helpers.game_state['current_bet'] = min(
-            helpers.game_state['bank'], helpers.game_state['current_bet']
-        )
-    
-    # Deduct bet from bank
-    helpers.game_state['bank'] -= helpers.game_state['current_bet']
-    
-    # Reset game state but keep bank
-    bank_backup = helpers.game_state['bank']
-    current_bet_backup = helpers.game_state['current_bet']
-    helpers.reset_game_state()
-    helpers.game_state['bank'] = bank_backup
-    helpers.game_state['current_bet'] = current_bet_backup
-    
-    helpers.game_state['player_hands'] = [{
-        'hand': [], 
-        'value': 0, 
-        'status': 'playing', 
-        'bet': helpers.game_state['current_bet']
-    }]
-    helpers.game_state['active_hand_index'] = 0
-    helpers.game_state['game_status'] = 'playing'
-
-    card1 = helpers.deal_card()
-    card2 = helpers.deal_card()
-    card3 = helpers.deal_card()
-    card4 = helpers.deal_card()
-    
-    active_hand = helpers.game_state['player_hands'][0]
-    
-    active_hand['hand'].append(card1)
-    send_to_arduino(card1)
-    
-    helpers.game_state['dealer_hand'].append(card2)
-    
-    active_hand['hand'].append(card3)
-    send_to_arduino(card3)
-    
-    helpers.game_state['dealer_hand'].append(card4)
-    send_to_arduino(card4)
-    
-    active_hand['value'] = helpers.calculate_hand_value(active_hand['hand'])
-    helpers.game_state['dealer_value'] = helpers.CARD_VALUES[card4[:-1]]
-    
-    if active_hand['value'] == 21:
-        active_hand['status'] = 'blackjack'
-        helpers.game_state['message'] = "Blackjack! Let's see what the dealer has..."
-        helpers.game_state['active_hand_index'] = -1
-        # Pass the send_to_arduino function to dealer_plays
-        helpers.dealer_plays(send_to_arduino)
-    else:
-        helpers.game_state['message'] = f"Your turn for Hand 1 (Bet: ${helpers.game_state['current_bet']})"
-        helpers.update_hand_options()
-    
-    return jsonify(helpers.game_state)
+    helpers.start_hand(table, send_to_arduino)
+    return state_response(table)
 
-@app.route('/hit', methods=['POST'])
-def hit():
+@table_route('/hit', methods=['POST'])
+def hit(table, state):
     """Player hits - deal another card"""
-    if helpers.game_state['game_status'] != 'playing':
+    if state['game_status'] != 'playing':
         return jsonify({'error': 'Game not in progress'}), 400
     
-    active_hand = helpers.game_state['player_hands'][helpers.game_state['active_hand_index']]
-
-    new_card = helpers.deal_card()
-    active_hand['hand'].append(new_card)
-    active_hand['value'] = helpers.calculate_hand_value(active_hand['hand'])
-    
-    send_to_arduino(new_card)
-    
-    helpers.game_state['can_double'] = False
-    helpers.game_state['can_split'] = False
-    
-    if active_hand['value'] > 21:
-        active_hand['status'] = 'bust'
-        helpers.game_state['message'] = f"Hand {helpers.game_state['active_hand_index'] + 1} busts!"
-        helpers.move_to_next_hand()
-    elif active_hand['value'] == 21:
-        active_hand['status'] = 'stood'
-        helpers.game_state['message'] = f"Hand {helpers.game_state['active_hand_index'] + 1} has 21!"
-        helpers.move_to_next_hand()
-    
-    return jsonify(helpers.game_state)
+    helpers.hit(table, send_to_arduino)
+    return state_response(table)
 
-@app.route('/stand', methods=['POST'])
-def stand():
+@table_route('/stand', methods=['POST'])
+def stand(table, state):
     """Player stands - dealer's turn"""
-    if helpers.game_state['game_status'] != 'playing':
+    if state['game_status'] != 'playing':
         return jsonify({'error': 'Game not in progress'}), 400
     
-    active_hand = helpers.game_state['player_hands'][helpers.game_state['active_hand_index']]
-    active_hand['status'] = 'stood'
-    
-    helpers.game_state['message'] = f"Hand {helpers.game_state['active_hand_index'] + 1} stands."
-    helpers.move_to_next_hand()
-    
-    return jsonify(helpers.game_state)
+    helpers.stand(table)
+    return state_response(table)
 
-@app.route('/double', methods=['POST'])
-def double_down():
+@table_route('/double', methods=['POST'])
+def double_down(table, state):
     """Player doubles down."""
-    if helpers.game_state['game_status'] != 'playing' or not helpers.game_state['can_double']:
+    if state['game_status'] != 'playing' or not state['can_double']:
         return jsonify({'error': 'Cannot double down now'}), 400
     
-    active_hand = helpers.game_state['player_hands'][helpers.game_state['active_hand_index']]
-    
-    # Deduct additional bet from bank
-    helpers.game_state['bank'] -= active_hand['bet']
-    active_hand['bet'] *= 2
-    
-    new_card = helpers.deal_card()
-    active_hand['hand'].append(new_card)
-    active_hand['value'] = helpers.calculate_hand_value(active_hand['hand'])
-    send_to_arduino(new_card)
-    
-    helpers.game_state['can_double'] = False
-    helpers.game_state['can_split'] = False
-    
-    if active_hand['value'] > 21:
-        active_hand['status'] = 'bust'
-        helpers.game_state['message'] = f"Hand {helpers.game_state['active_hand_index'] + 1} busts on double!"
-    else:
-        active_hand['status'] = 'stood'
-        helpers.game_state['message'] = f"Hand {helpers.game_state['active_hand_index'] + 1} doubles and stands."
-    
-    helpers.move_to_next_hand()
-    return jsonify(helpers.game_state)
+    helpers.double_down(table, send_to_arduino)
+    return state_response(table)
 
-@app.route('/split', methods=['POST'])
-def split():
+@table_route('/split', methods=['POST'])
+def split(table, state):
     """Player splits a pair."""
-    if helpers.game_state['game_status'] != 'playing' or not helpers.game_state['can_split']:
+    if state['game_status'] != 'playing' or not state['can_split']:
         return jsonify({'error': 'Cannot split now'}), 400
     
-    # Deduct additional bet from bank
-    helpers.game_state['bank'] -= helpers.game_state['current_bet']
-        
-    active_hand = helpers.game_state['player_hands'][helpers.game_state['active_hand_index']]
-    card_to_move = active_hand['hand'].pop()
-    
-    active_hand['value'] = helpers.calculate_hand_value(active_hand['hand'])
-    
-    new_hand = {
-        'hand': [card_to_move],
-        'value': helpers.calculate_hand_value([card_to_move]),
-        'status': 'pending',
-        'bet': helpers.game_state['current_bet']
-    }
-    
-    helpers.game_state['player_hands'].insert(helpers.game_state['active_hand_index'] + 1, new_hand)
-    
-    new_card_1 = helpers.deal_card()
-    active_hand['hand'].append(new_card_1)
-    active_hand['value'] = helpers.calculate_hand_value(active_hand['hand'])
-    send_to_arduino(new_card_1)
-    
-    time.sleep(0.5)
-    
-    new_card_2 = helpers.deal_card()
-    new_hand['hand'].append(new_card_2)
-    new_hand['value'] = helpers.calculate_hand_value(new_hand['hand'])
-    send_to_arduino(new_card_2)
-    
-    rank1 = active_hand['hand'][0][:-1]
-    is_ace_split = (helpers.CARD_VALUES[rank1] == 11)
-    
-    if is_ace_split:
-        active_hand['status'] = 'stood'
-        new_hand['status'] = 'stood'
-        helpers.game_state['message'] = "Split Aces! Each hand gets one card and stands."
-        helpers.move_to_next_hand()
-    else:
-        helpers.update_hand_options()
-        
-        if active_hand['value'] == 21:
-            active_hand['status'] = 'stood'
-            helpers.move_to_next_hand()
-        else:
-            helpers.game_state['message'] = f"Split! Your turn for Hand {helpers.game_state['active_hand_index'] + 1}"
-
-    return jsonify(helpers.game_state)
+    helpers.split_hand(table, send_to_arduino, SPLIT_CARD_DELAY)
+    return state_response(table)
 
 
-@app.route('/dealer_step', methods=['POST'])
-def dealer_step():
+@table_route('/dealer_step', methods=['POST'])
+def dealer_step(table, state):
     """Performs one step of the dealer's turn."""
-    if helpers.game_state['game_status'] != 'dealer_turn':
+    if state['game_status'] != 'dealer_turn':
         return jsonify({'error': 'Not dealer\'s turn'}), 400
 
-    # Step 1: Reveal hidden card if it's the first step
-    if helpers.game_state['dealer_hidden']:
-        helpers.game_state['dealer_hidden'] = False
-        helpers.game_state['dealer_value'] = helpers.calculate_hand_value(helpers.game_state['dealer_hand'])
-        send_to_arduino(helpers.game_state['dealer_hand'][0]) # Reveal hole card
-        helpers.game_state['message'] = f"Dealer reveals. Value is {helpers.game_state['dealer_value']}"
-        
-        # After revealing, check if we're done (e.g., dealer has 17-21)
-        if helpers.game_state['dealer_value'] >= 17:
-            helpers.determine_winners()
-        
-        return jsonify(helpers.game_state)
-
-    # Step 2: Draw a card if under 17
-    if helpers.game_state['dealer_value'] < 17:
-        new_card = helpers.deal_card()
-        helpers.game_state['dealer_hand'].append(new_card)
-        helpers.game_state['dealer_value'] = helpers.calculate_hand_value(helpers.game_state['dealer_hand'])
-        send_to_arduino(new_card)
-        
-        if helpers.game_state['dealer_value'] > 21:
-            helpers.game_state['message'] = "Dealer busts!"
-        else:
-            helpers.game_state['message'] = f"Dealer hits. Value is {helpers.game_state['dealer_value']}"
-        
-        # After drawing, check if we're done
-        if helpers.game_state['dealer_value'] >= 17:
-            helpers.determine_winners() # This will set status to 'complete'
-    
-    # This should only happen if dealer hits and is still < 17
-    # Or if they were already >= 17, in which case we determine winners
-    elif helpers.game_state['game_status'] != 'complete':
-        helpers.determine_winners()
-
-    return jsonify(helpers.game_state)
+    helpers.dealer_step(table, send_to_arduino)
+    return state_response(table)
 
-@app.route('/shuffle', methods=['POST'])
-def shuffle():
+@table_route('/shuffle', methods=['POST'])
+def shuffle(table, state):
     """Shuffle the deck and notify Arduino"""
-    if helpers.game_state['game_status'] == 'playing':
+    if state['game_status'] == 'playing':
         return jsonify({'error': 'Cannot shuffle during a game'}), 400
     
-    helpers.build_shoe()
-    send_to_arduino("0")  # Send shuffle signal to Arduino
-    helpers.game_state['cards_remaining'] = len(helpers.current_shoe)
-    helpers.game_state['message'] = f"Deck shuffled! {helpers.game_state['cards_remaining']} cards remaining."
+    helpers.build_shoe(table)
+    send_to_arduino(table, "0")  # Send shuffle signal to Arduino
+    state['cards_remaining'] = len(table.shoe)
+    state['message'] = f"Deck shuffled! {state['cards_remaining']} cards remaining."
     
-    return jsonify(helpers.game_state)
+    return state_response(table)
 
-@app.route('/reset_bank', methods=['POST'])
-def reset_bank():
+@table_route('/reset_bank', methods=['POST'])
+def reset_bank(table, state):
     """Reset the player's bank to starting amount"""
-    if helpers.game_state['game_status'] == 'playing':
+    if state['game_status'] == 'playing':
         return jsonify({'error': 'Cannot reset bank during a game'}), 400
     
-    helpers.game_state['bank'] = helpers.STARTING_BANK
-    helpers.game_state['message'] = f"Bank reset to ${helpers.STARTING_BANK}!"
+    state['bank'] = helpers.STARTING_BANK
+    state['message'] = f"Bank reset to ${helpers.STARTING_BANK}!"
     
-    return jsonify(helpers.game_state)
+    return state_response(table)
 
-@app.route('/state', methods=['GET'])
-def get_state():
-    """Get current game state"""
-    return jsonify(helpers.game_state)
+@table_route('/snapshot', methods=['GET'])
+def get_snapshot(table, state):
+    """The table's state, shoe and RNG as a binary snapshot (see snapshot.py)"""
+    return Response(snapshot.dump(table), mimetype='application/octet-stream')
 
-@app.route('/update_mqtt', methods=['POST'])
-def update_mqtt():
-    """Update MQTT configuration"""
-    global MQTT_BROKER, MQTT_PORT, MQTT_TOPIC, mqtt_client
+@table_route('/restore', methods=['POST'])
+def restore(table, state):
+    """Put the table back at a snapshot taken with GET /snapshot, from this or any other table"""
+    try:
+        snapshot.load(table, request.get_data())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
+    return state_response(table)
+
+@table_route('/state', methods=['GET'])
+def get_state(table, state):
+    """Get current game state, answering 304 if the client's ETag is current"""
+    response = state_response(table)
+    response.set_etag(f"{BOOT_ID}.{table.revision}")
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@table_route('/advice', methods=['GET'])
+def advice(table, state):
+    """Expected value of each action for the active hand, from the cards left in the shoe"""
+    if state['game_status'] != 'playing':
+        return jsonify({'error': 'Game not in progress'}), 400
+
+    return jsonify(advisor.advise(table))
+
+@table_route('/update_mqtt', methods=['POST'])
+def update_mqtt(table, state):
+    """
+    Move this table to another MQTT broker and/or topic. The connection to
+    the broker is shared with other tables on it and is made in the
+    background; cards queued before the switch still go out as addressed.
+    """
+    connection = table_connection(table)
     data = request.get_json()
-    new_broker = data.get('broker', MQTT_BROKER)
-    new_port = data.get('port', MQTT_PORT)
-    new_topic = data.get('topic', MQTT_TOPIC)
+    new_broker = data.get('broker', connection.broker)
+    new_port = data.get('port', connection.port)
+    new_topic = data.get('topic', table.topic)
+    new_qos = data.get('qos', connection.publisher.qos if table.qos is None else table.qos)
+    new_wire_format = data.get('wire_format', table.wire_format or MQTT_WIRE_FORMAT)
     
     # Validate inputs
     if not new_broker or not new_topic:
         return jsonify({'error': 'Broker and topic cannot be empty'}), 400
     
+    if new_qos not in (0, 1, 2):
+        return jsonify({'error': 'QoS must be 0, 1 or 2'}), 400
+    
+    if new_wire_format not in wire.FORMATS:
+        return jsonify({'error': f"Wire format must be one of: {', '.join(wire.FORMATS)}"}), 400
+    
     try:
         new_port = int(new_port)
         if new_port < 1 or new_port > 65535:
@@ -338,39 +551,176 @@ def update_mqtt():
     except ValueError:
         return jsonify({'error': 'Invalid port number'}), 400
     
-    # Disconnect old client
-    try:
-        mqtt_client.loop_stop()
-        mqtt_client.disconnect()
-    except:
-        pass
+    new_broker = None if (new_broker, new_port) == (MQTT_BROKER, MQTT_PORT) else (new_broker, new_port)
+    if (new_broker, new_topic, new_qos, new_wire_format) != (helpers.table_broker(table), table.topic,
+                                                             table.qos, table.wire_format):
+        # The old connection is closed once no table uses it any more
+        helpers.set_broker(table, new_broker)
+        table.topic = new_topic
+        table.qos = new_qos
+        table.wire_format = new_wire_format
+        helpers.touch_state(table)  # So the table store saves the new settings
+    connection = table_connection(table)
+    
+    return jsonify({
+        'broker': connection.broker,
+        'port': connection.port,
+        'topic': table.topic,
+        'qos': table.qos,
+        'wire_format': table.wire_format,
+        'connected': connection.connected,
+        'message': 'MQTT configuration updated successfully' if connection.connected
+                   else 'MQTT configuration updated, connecting to the broker in the background'
+    })
+
+@app.route('/autoplay', methods=['POST'])
+def autoplay_rounds():
+    """
+    Play many rounds of a strategy on a private server-side table and return
+    the aggregate results. The cards are only published if a topic is given.
+    """
+    data = request.get_json() or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    spec = data.get('strategy', 'basic')
+    bet = data.get('bet', {})
+    
+    if not isinstance(spec, (str, dict)) or not isinstance(bet, dict):
+        return jsonify({'error': 'Strategy must be a name or charts, and bet an object'}), 400
     
-    # Update configuration
-    MQTT_BROKER = new_broker
-    MQTT_PORT = new_port
-    MQTT_TOPIC = new_topic
+    try:
+        strat = strategy.load(spec)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Reconnect with new settings
     try:
-        mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
-        mqtt_client.loop_start()
-        return jsonify({
-            'broker': MQTT_BROKER,
-            'port': MQTT_PORT,
-            'topic': MQTT_TOPIC,
-            'message': 'MQTT configuration updated successfully'
-        })
-    except Exception as e:
-        return jsonify({'error': f'Failed to connect: {str(e)}'}), 500
+        bet_rule = autoplay.BetRule(**bet)
+    except TypeError:
+        return jsonify({'error': 'Bet accepts "units" and "ramp"'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    rounds = data.get('rounds', 1000)
+    bankroll = data.get('bankroll', helpers.STARTING_BANK)
+    seed = data.get('seed')
+    if not all(isinstance(value, int) and not isinstance(value, bool)
+               for value in (rounds, bankroll, 0 if seed is None else seed)):
+        return jsonify({'error': 'Rounds, bankroll and seed must be integers'}), 400
+    
+    if rounds < 1 or rounds > autoplay.MAX_ROUNDS:
+        return jsonify({'error': f'Rounds must be between 1 and {autoplay.MAX_ROUNDS}'}), 400
+    
+    if bankroll < helpers.MIN_BET or bankroll > autoplay.MAX_BANKROLL:
+        return jsonify({'error': f'Bankroll must be between ${helpers.MIN_BET} and ${autoplay.MAX_BANKROLL}'}), 400
+    
+    topic = data.get('topic')
+    if topic and rounds > autoplay.MAX_PUBLISHED_ROUNDS:
+        return jsonify({'error': f'At most {autoplay.MAX_PUBLISHED_ROUNDS} rounds can be published to a topic'}), 400
+    
+    if topic:
+        results = autoplay.play(strat, rounds, bet_rule, bankroll, seed, bool(data.get('log')),
+                                topic, send_unpaced, flush_outbox)
+    else:
+        results = autoplay.play(strat, rounds, bet_rule, bankroll, seed, bool(data.get('log')))
+    results['strategy'] = spec if isinstance(spec, str) else 'custom'
+    return jsonify(results)
 
 # --- Application Start-up ---
-# These functions MUST run when the file is imported by the
-# PythonAnywhere server, so they must be outside the __name__ block.
-helpers.reset_game_state()
-helpers.build_shoe()
-setup_mqtt_client()
+# Importing this module only defines the app. create_app() applies the
+# configuration, builds the broker connections, table store and shoe
+# factory, and leaves the slow work to a background thread: building the
+# assets, restoring saved tables and shuffling the default table's shoe.
+# Requests are served in the meantime; a table is restored on first use
+# anyway, and pages use static/ until the assets are built. paho connects
+# to the broker on its own thread (see connections.py). GET /ready reports
+# how far start-up has got.
+
+STARTUP_STEPS = ('assets', 'saved_tables', 'default_table')
+startup_lock = threading.Lock()
+startup_thread = None
+startup_started_at = None
+startup_finished = {}  # Step -> seconds after create_app() it finished
+startup_errors = {}    # Step -> error message, for steps that failed
+
+def build_assets():
+    if BUILD_ASSETS:
+        asset_manifest.update(assets.load_manifest(app.static_folder, ASSET_DIRECTORY))
+
+def restore_saved_tables():
+    """Bring back every saved table, and finish any dealer turn cut off by the restart"""
+    if table_store is not None:
+        for saved_id in table_store.table_ids():
+            saved_table = helpers.get_table(saved_id, MQTT_TOPIC_PREFIX)
+            with saved_table.lock:
+                schedule_dealer_turn(saved_table)
+
+def open_default_table():
+    helpers.get_table(helpers.DEFAULT_TABLE_ID, MQTT_TOPIC_PREFIX)
+
+def run_startup():
+    """Start-up thread: run each step, recording when it finished or why it failed"""
+    for name, step in zip(STARTUP_STEPS, (build_assets, restore_saved_tables, open_default_table)):
+        try:
+            step()
+        except Exception as e:
+            startup_errors[name] = str(e)
+            print(f"Start-up step {name} failed: {e}")
+        startup_finished[name] = time.monotonic() - startup_started_at
+
+def create_app(config=None):
+    """
+    The Flask app. The first call per process sets it up: `config` overrides
+    settings at the top of this module (e.g. {'STATE_DATABASE': None}), the
+    broker connections, table store and shoe factory are built, and the
+    background start-up begins. Later calls return the same app.
+    """
+    global startup_thread, startup_started_at
+    global mqtt_connections, default_connection, mqtt_publisher, shoe_factory, table_store, session_stats
+    
+    with startup_lock:
+        if startup_thread is None:
+            for name, value in (config or {}).items():
+                if not name.isupper() or name not in globals():
+                    raise ValueError(f"Unknown setting: {name}")
+                globals()[name] = value
+            mqtt_connections = connections.ConnectionManager(qos=MQTT_QOS, coalesce=MQTT_COALESCE)
+            default_connection = mqtt_connections.acquire(MQTT_BROKER, MQTT_PORT)
+            mqtt_publisher = default_connection.publisher
+            shoe_factory = shoes.ShoeFactory(helpers._build_shoe_internal(), SHOE_POOL_SIZE, SHOE_SEED)
+            table_store = store.BACKENDS[STATE_BACKEND](STATE_DATABASE) if STATE_DATABASE else None
+            session_stats = analytics.SessionStats()
+            # Workers sharing tables would all append to the same hand log files
+            helpers.hand_log_directory = None if table_store is not None and table_store.shared else HAND_LOG_DIRECTORY
+            helpers.shoe_factory = shoe_factory
+            helpers.table_store = table_store
+            helpers.session_stats = session_stats
+            helpers.mqtt_connections = mqtt_connections
+            if METRICS_ENABLED:
+                metrics.enable()
+            startup_started_at = time.monotonic()
+            startup_thread = threading.Thread(target=run_startup, name='startup', daemon=True)
+            startup_thread.start()
+    return app
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Start-up progress and broker connections; 503 until every start-up step has run"""
+    steps = {name: {'done': name in startup_finished,
+                    'seconds': startup_finished.get(name),
+                    'error': startup_errors.get(name)}
+             for name in STARTUP_STEPS}
+    is_ready = len(startup_finished) == len(STARTUP_STEPS)
+    return jsonify({
+        'ready': is_ready,
+        'steps': steps,
+        'mqtt': {name: connection['connected'] for name, connection in broker_stats().items()},
+        'tables': len(helpers.tables),
+    }), 200 if is_ready else 503
+
+# A server that imports `app` from this file (PythonAnywhere's WSGI file)
+# without calling create_app() gets it set up on the first request.
 
 
 if __name__ == '__main__':
     # This block will now only be used when you run it locally
-    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
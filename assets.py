@@ -0,0 +1,124 @@
+"""
+Static asset build: bundles the card images into one script, gives every
+asset a content-hashed name and precompresses the text ones.
+
+    python assets.py build [--static static] [--output static/dist]
+
+The app runs the build on start-up when the output is missing or older
+than its sources, so this is only needed to build ahead of a deploy.
+"""
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:  # Optional: .br variants are only written when it is installed
+    brotli = None
+
+# --- Asset Build ---
+# The page used to fetch each of the 53 card PNGs on its own. The build
+# writes them as data URIs into a CARD_IMAGES index script (cards.js), so a
+# cold page load needs the HTML, style.css, crown.png, cards.js and
+# script.js. Every output file is named <name>.<hash>.<ext> after its
+# content and listed in manifest.json, so the app can serve it with an
+# immutable Cache-Control header: a changed file gets a new URL. JS and CSS
+# also get .gz (and .br) variants for clients that accept them.
+
+SUIT_DIRECTORIES = {'H': 'hearts', 'D': 'diamonds', 'C': 'clubs', 'S': 'spades'}
+CARD_BACK = 'back'
+SOURCES = ('style.css', 'script.js', 'crown.png')  # Copied with a hashed name
+COMPRESSED_TYPES = ('.js', '.css')  # PNG data does not compress any further
+MANIFEST = 'manifest.json'
+HASH_LENGTH = 10
+
+def card_image_paths(static_dir):
+    """Card name ("AH", ..., and "back") -> PNG path"""
+    images = os.path.join(static_dir, 'images')
+    paths = {CARD_BACK: os.path.join(images, 'back.png')}
+    for directory in SUIT_DIRECTORIES.values():
+        for filename in sorted(os.listdir(os.path.join(images, directory))):
+            name, ext = os.path.splitext(filename)
+            if ext == '.png':
+                paths[name] = os.path.join(images, directory, filename)
+    return paths
+
+def card_index(static_dir):
+    """The cards.js source: a CARD_IMAGES object of data URIs"""
+    lines = ['const CARD_IMAGES = {']
+    for name, path in sorted(card_image_paths(static_dir).items()):
+        with open(path, 'rb') as f:
+            data = base64.b64encode(f.read()).decode('ascii')
+        lines.append(f'  "{name}": "data:image/png;base64,{data}",')
+    lines.append('};\n')
+    return '\n'.join(lines).encode('ascii')
+
+def source_paths(static_dir):
+    """Every file the build reads"""
+    return [os.path.join(static_dir, name) for name in SOURCES] + list(card_image_paths(static_dir).values())
+
+def _write(output_dir, name, content):
+    """Write content under its hashed name, with compressed variants; returns the file name"""
+    stem, ext = os.path.splitext(name)
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    filename = f"{stem}.{digest}{ext}"
+    path = os.path.join(output_dir, filename)
+    with open(path, 'wb') as f:
+        f.write(content)
+    if ext in COMPRESSED_TYPES:
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(content))
+    return filename
+
+def build(static_dir, output_dir):
+    """Build every asset into output_dir, remove outdated ones, and return the manifest"""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {'cards.js': _write(output_dir, 'cards.js', card_index(static_dir))}
+    for name in SOURCES:
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            manifest[name] = _write(output_dir, name, f.read())
+
+    current = set(manifest.values())
+    for filename in os.listdir(output_dir):
+        built = filename[:-3] if filename.endswith(('.gz', '.br')) else filename
+        if filename != MANIFEST and built not in current:
+            os.remove(os.path.join(output_dir, filename))
+    with open(os.path.join(output_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+def load_manifest(static_dir, output_dir):
+    """The manifest of output_dir, rebuilding the assets first if any source is newer"""
+    path = os.path.join(output_dir, MANIFEST)
+    try:
+        built_at = os.path.getmtime(path)
+        if all(os.path.getmtime(source) <= built_at for source in source_paths(static_dir)):
+            with open(path) as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+    return build(static_dir, output_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    build_parser = subcommands.add_parser('build', help='Build the assets and print the manifest')
+    here = os.path.dirname(os.path.abspath(__file__))
+    build_parser.add_argument('--static', default=os.path.join(here, 'static'))
+    build_parser.add_argument('--output', default=os.path.join(here, 'static', 'dist'))
+    args = parser.parse_args()
+
+    manifest = build(args.static, args.output)
+    for name, filename in sorted(manifest.items()):
+        sizes = [os.path.getsize(os.path.join(args.output, filename + suffix))
+                 for suffix in ('', '.gz', '.br') if os.path.exists(os.path.join(args.output, filename + suffix))]
+        print(f"{name:<12}{filename:<28}" + '  '.join(f"{size:>9,}" for size in sizes))
+
+if __name__ == '__main__':
+    main()
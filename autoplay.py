@@ -0,0 +1,109 @@
+import math
+import random
+import time
+
+import helpers
+import strategy
+
+# --- Batch Auto-Play ---
+# Plays many rounds of one strategy in a single call, on a private table
+# that is not in helpers.tables: no lock contention with players, no hand
+# log, no saved state. Every round goes through helpers.start_hand and
+# strategy.play_hand, the same actions the routes use, so results match
+# what a bot would get by playing the rounds over HTTP.
+
+MAX_ROUNDS = 1000000
+MAX_BANKROLL = 10 ** 9
+# Rounds of a run that publishes its cards: each round is one batch for the
+# publisher's queue, which waits up to put_timeout per batch while it is full
+MAX_PUBLISHED_ROUNDS = 200
+OUTCOMES = ('win', 'lose', 'tie')  # Hand statuses determine_winners settles on
+
+class BetRule:
+    """
+    Bets in units of helpers.MIN_BET: flat `units`, or with ramp > 0,
+    `units` times the Hi-Lo true count clamped to 1..ramp (as simulator.py
+    --ramp does). The table caps a bet at the bank.
+    """
+
+    def __init__(self, units=1, ramp=0):
+        if not isinstance(units, int) or not isinstance(ramp, int) or units < 1 or ramp < 0:
+            raise ValueError("Bet units must be an integer of at least 1 and ramp one of at least 0")
+        self.units = units
+        self.ramp = ramp
+
+    def amount(self, table):
+        units = self.units
+        if self.ramp:
+            decks_left = max(len(table.shoe), 1) / 52
+            true_count = math.floor(table.running_count / decks_left)
+            units *= min(max(true_count, 1), self.ramp)
+        return units * helpers.MIN_BET
+
+def play(strat, rounds, bet_rule=None, bankroll=helpers.STARTING_BANK, seed=None, log=False,
+         topic='', send_func=strategy.no_send, after_round=None):
+    """
+    Play up to `rounds` rounds of a strategy.Strategy, stopping early if the
+    bank drops below the minimum bet. With a seed the shoes are shuffled by
+    random.Random(seed), so the same call plays the same cards. `send_func`
+    receives the cards like the routes' send function, and
+    `after_round(table)` is called after every round.
+
+    Returns aggregate results, plus a "log" of [bet, net, dealer cards,
+    [player hand cards]] per round when `log` is set.
+    """
+    bet_rule = bet_rule or BetRule()
+    table = helpers.Table('autoplay', topic)
+    table.log_shoes = False
+    if seed is not None:
+        table.rng = random.Random(seed)
+    helpers.build_shoe(table)
+    game_state = table.game_state
+    game_state['bank'] = bankroll
+
+    totals = dict.fromkeys(('rounds', 'hands', 'wagered', 'blackjacks', 'busts', 'doubles', 'splits'), 0)
+    outcomes = dict.fromkeys(OUTCOMES, 0)
+    rounds_log = [] if log else None
+    started = time.perf_counter()
+
+    for _ in range(rounds):
+        if game_state['bank'] < helpers.MIN_BET:
+            break
+        bank_before = game_state['bank']
+        game_state['current_bet'] = bet_rule.amount(table)
+        helpers.start_hand(table, send_func)
+        strategy.play_hand(strat, table, send_func)
+        if after_round is not None:
+            after_round(table)
+
+        hands = game_state['player_hands']
+        bet = game_state['current_bet']
+        totals['rounds'] += 1
+        totals['hands'] += len(hands)
+        totals['splits'] += len(hands) - 1
+        for hand in hands:
+            outcomes[hand['status']] += 1
+            totals['wagered'] += hand['bet']
+            totals['busts'] += hand['value'] > 21
+            totals['doubles'] += hand['bet'] > bet
+        totals['blackjacks'] += len(hands) == 1 and hands[0]['hand'].is_blackjack
+        if rounds_log is not None:
+            rounds_log.append([bet, game_state['bank'] - bank_before,
+                               ' '.join(helpers.card_names(game_state['dealer_hand'])),
+                               [' '.join(helpers.card_names(hand['hand'])) for hand in hands]])
+
+    net = game_state['bank'] - bankroll
+    results = dict(totals)
+    results.update({
+        'outcomes': outcomes,
+        'net': net,
+        'bank': game_state['bank'],
+        'broke': totals['rounds'] < rounds,
+        'units_per_round': net / helpers.MIN_BET / totals['rounds'] if totals['rounds'] else 0.0,
+        'return_per_wager': net / totals['wagered'] if totals['wagered'] else 0.0,
+        'shoes': table.shoe_id,
+        'elapsed_ms': (time.perf_counter() - started) * 1000,
+    })
+    if rounds_log is not None:
+        results['log'] = rounds_log
+    return results
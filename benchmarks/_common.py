@@ -0,0 +1,53 @@
+"""
+Helpers shared by the benchmarks in this directory; not a benchmark itself.
+"""
+import atexit
+import math
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class NullMQTTClient:
+    """Drops every publish so a benchmark never touches a real broker"""
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        return None
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(len(ordered) * p / 100) - 1)]
+
+
+def best(stmt, number, repeat, scale=1e6):
+    """Best time per call, in microseconds (or seconds times `scale`)"""
+    return min(timeit.repeat(stmt, number=number, repeat=repeat)) / number * scale
+
+
+def import_app(config=None):
+    """
+    Import app.py and set it up with its saved tables and hand logs in a
+    temporary directory, not the working copy's blackjack.db and hand_logs/,
+    and with `config` on top (see app.create_app). Returns the module once
+    its start-up has finished. The directory is removed at exit.
+    """
+    work = tempfile.mkdtemp(prefix='blackjack-bench-')
+    atexit.register(_remove, work)
+    import app
+    app.create_app({'STATE_DATABASE': os.path.join(work, 'blackjack.db'),
+                    'HAND_LOG_DIRECTORY': os.path.join(work, 'hand_logs'),
+                    **(config or {})})
+    app.startup_thread.join()
+    return app
+
+
+def _remove(work):
+    import handlog
+    # Write the hand logs now: handlog's own exit hook may run after this one
+    handlog.flush_all()
+    shutil.rmtree(work, ignore_errors=True)
@@ -0,0 +1,101 @@
+"""
+Benchmark of the session statistics behind /stats.
+
+Run from the repository root:
+
+    python benchmarks/bench_analytics.py [--rounds 500] [--hands 1000000]
+
+Plays --rounds rounds on a table through the Flask test client (/deal,
+/hit below 17, /stand, /dealer_step) and checks that /table/<id>/stats
+adds up to the rounds played and the change in the table's bank. Then
+records --hands synthetic hands in an analytics.SessionStats, timing each
+record() call, and times a query after every tenfold increase in hands
+recorded: it should stay flat.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+import handlog  # noqa: E402
+import helpers  # noqa: E402
+from _common import NullMQTTClient, import_app  # noqa: E402
+
+blackjack_app = import_app({'STATE_DATABASE': None, 'HAND_LOG_DIRECTORY': None})
+
+TABLE_ID = 'stats_check'
+
+
+def play(client, rounds):
+    """Play `rounds` rounds on TABLE_ID; returns the bank before and after"""
+    base = f'/table/{TABLE_ID}'
+    bank = client.post(base + '/reset_bank').get_json()['bank']
+    for _ in range(rounds):
+        state = client.post(base + '/deal').get_json()
+        while state.get('game_status') == 'playing':
+            hand = state['player_hands'][state['active_hand_index']]
+            state = client.post(base + ('/hit' if hand['value'] < 17 else '/stand')).get_json()
+        while state.get('game_status') == 'dealer_turn':
+            state = client.post(base + '/dealer_step').get_json()
+    return bank, state['bank']
+
+
+def synthetic_round(rng):
+    """A one-hand round for SessionStats.record: true count, [(outcome, bet, net, value)]"""
+    bet = rng.choice((10, 10, 20, 50, 100))
+    outcome = rng.choice((handlog.LOSE, handlog.LOSE, handlog.PUSH, handlog.WIN, handlog.WIN, handlog.BLACKJACK))
+    net = {handlog.LOSE: -bet, handlog.PUSH: 0, handlog.WIN: bet, handlog.BLACKJACK: bet * 3 // 2}[outcome]
+    return rng.uniform(-8, 8), [(outcome, bet, net, rng.randint(12, 23))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rounds', type=int, default=500)
+    parser.add_argument('--hands', type=int, default=1000000)
+    args = parser.parse_args()
+
+    blackjack_app.default_connection.use_client(NullMQTTClient())
+    blackjack_app.DEALER_STEP_INTERVAL = 3600.0  # The benchmark steps the dealer itself
+    blackjack_app.SPLIT_CARD_DELAY = helpers.DEALER_REVEAL_DELAY = 0  # No reveals left printing afterwards
+    client = blackjack_app.app.test_client()
+
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')  # Routes print every card
+    try:
+        bank_before, bank_after = play(client, args.rounds)
+        table_stats = client.get(f'/table/{TABLE_ID}/stats').get_json()
+        query_us = min(timeit.repeat(lambda: client.get('/stats'), number=200, repeat=5)) / 200 * 1e6
+    finally:
+        sys.stdout = stdout
+
+    total = table_stats['total']
+    print(f"{args.rounds} rounds through the routes: stats count {total['rounds']} rounds, "
+          f"{total['hands']} hands, net {total['net']:+} (bank changed {bank_after - bank_before:+})")
+    print(f"matches: {total['rounds'] == args.rounds and total['net'] == bank_after - bank_before}")
+    print(f"GET /stats: {query_us:.0f} us per request")
+
+    rng = random.Random(1)
+    session = analytics.SessionStats()
+    rounds = [synthetic_round(rng) for _ in range(10000)]
+    recorded, checkpoint, record_seconds = 0, 1000, 0.0
+    print(f"{'hands':>10}{'record us':>12}{'query us':>10}")
+    while recorded < args.hands:
+        count = min(checkpoint, args.hands) - recorded
+        start = time.perf_counter()
+        for i in range(count):
+            true_count, hands = rounds[i % len(rounds)]
+            session.record(f'table{i % 8}', true_count, hands)
+        record_seconds = time.perf_counter() - start
+        recorded += count
+        query = statistics.median(timeit.repeat(lambda: session.query('table0'), number=100, repeat=5)) / 100
+        print(f"{recorded:>10,}{record_seconds / count * 1e6:>12.2f}{query * 1e6:>10.1f}")
+        checkpoint *= 10
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Requests and bytes of a cold page load, with and without the asset build.
+
+Run from the repository root:
+
+    python benchmarks/bench_assets.py
+
+Renders the game page through the Flask test client and fetches every
+asset it references, plus every card image the page shows over a session
+(each of the 53 is its own request without the build), accepting gzip
+like a browser. Asset names come from assets.py's manifest when built, and
+are the plain static/ files otherwise. Also reports which responses a
+browser may reuse without asking the server again.
+"""
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import assets  # noqa: E402
+from _common import import_app  # noqa: E402
+
+blackjack_app = import_app()
+
+URL_PATTERN = re.compile(r'(?:src|href)="(/[^"]+)"')
+
+
+def page_load(client, built):
+    """(requests, bytes transferred, responses cached as immutable) of one cold load"""
+    blackjack_app.asset_manifest.clear()
+    if built:
+        blackjack_app.asset_manifest.update(
+            assets.load_manifest(blackjack_app.app.static_folder, blackjack_app.ASSET_DIRECTORY))
+    page = client.get('/')
+    urls = list(dict.fromkeys(URL_PATTERN.findall(page.get_data(as_text=True))))
+    if not built:
+        static = blackjack_app.app.static_folder
+        urls += ['/static/' + os.path.relpath(path, static).replace(os.sep, '/')
+                 for path in assets.card_image_paths(static).values()]
+    transferred, immutable = len(page.data), 0
+    for url in urls:
+        response = client.get(url, headers={'Accept-Encoding': 'gzip, deflate, br'})
+        transferred += len(response.data)
+        immutable += 'immutable' in response.headers.get('Cache-Control', '')
+        response.close()
+    return 1 + len(urls), transferred, immutable
+
+
+def main():
+    client = blackjack_app.app.test_client()
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        results = [(label, page_load(client, built)) for label, built in (('static/ as is', False),
+                                                                         ('asset build', True))]
+    finally:
+        sys.stdout = stdout
+    print(f"{'':<16}{'requests':>10}{'bytes':>12}{'immutable':>11}")
+    for label, (requests, transferred, immutable) in results:
+        print(f"{label:<16}{requests:>10}{transferred:>12,}{immutable:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark of batch auto-play against playing each action over HTTP.
+
+Run from the repository root:
+
+    python benchmarks/bench_autoplay.py [--rounds 100000] [--http-rounds 2000]
+
+Plays --http-rounds rounds of basic strategy on a table through the Flask
+test client, one request per action (/deal, /hit, /stand, /double, /split,
+/dealer_step), the way a bot has to, and the same rounds with one
+/autoplay request from the same seeded shoes; both must end with the same
+bank. Then --rounds rounds are played with a single /autoplay request,
+with and without the per-round log, and rounds per second are printed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers  # noqa: E402
+import strategy  # noqa: E402
+from _common import import_app  # noqa: E402
+
+blackjack_app = import_app({'STATE_DATABASE': None, 'HAND_LOG_DIRECTORY': None})
+
+ROUTES = {'H': '/hit', 'S': '/stand', 'D': '/double', 'P': '/split'}
+BANKROLL = 10 ** 9
+
+
+def play_http(client, rounds, seed):
+    """Final bank and request count after `rounds` rounds played one action per request"""
+    basic = strategy.load('basic')
+    table = helpers.get_table('autoplay_http', blackjack_app.MQTT_TOPIC_PREFIX)
+    table.rng = random.Random(seed)
+    helpers.build_shoe(table)
+    table.game_state['bank'] = BANKROLL
+    base = '/table/autoplay_http'
+    requests = 0
+    for _ in range(rounds):
+        client.post(base + '/deal')
+        requests += 1
+        while table.game_state['game_status'] == 'playing':
+            client.post(base + ROUTES[strategy.next_action(basic, table)])
+            requests += 1
+        while table.game_state['game_status'] == 'dealer_turn':
+            client.post(base + '/dealer_step')
+            requests += 1
+    return table.game_state['bank'], requests
+
+
+def autoplay(client, **options):
+    start = time.perf_counter()
+    results = client.post('/autoplay', json=options).get_json()
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rounds', type=int, default=100000)
+    parser.add_argument('--http-rounds', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    blackjack_app.DEALER_STEP_INTERVAL = 3600.0  # The benchmark steps the dealer itself
+    client = blackjack_app.app.test_client()
+
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')  # Routes print every card
+    try:
+        start = time.perf_counter()
+        http_bank, requests = play_http(client, args.http_rounds, args.seed)
+        http_elapsed = time.perf_counter() - start
+        same_seed, _ = autoplay(client, rounds=args.http_rounds, seed=args.seed, bankroll=BANKROLL)
+        batch, batch_elapsed = autoplay(client, rounds=args.rounds, bankroll=BANKROLL)
+        logged, logged_elapsed = autoplay(client, rounds=args.rounds, bankroll=BANKROLL, log=True)
+    finally:
+        sys.stdout = stdout
+
+    print(f"HTTP, one request per action: {args.http_rounds} rounds, {requests} requests, "
+          f"{args.http_rounds / http_elapsed:,.0f} rounds/s")
+    print(f"same seeded shoes through /autoplay end with the same bank: {same_seed['bank'] == http_bank}")
+    for label, results, elapsed in (('/autoplay', batch, batch_elapsed),
+                                    ('/autoplay with log', logged, logged_elapsed)):
+        print(f"{label:<20}{results['rounds']} rounds in {elapsed:.2f} s, {results['rounds'] / elapsed:,.0f} rounds/s, "
+              f"{results['units_per_round']:+.4f} units per round")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Micro-benchmark of the card representation.
+
+Run from the repository root:
+
+    python benchmarks/bench_cards.py [--repeat 5]
+
+Times building and shuffling a shoe, dealing from it, hand evaluation and
+the split check of update_hand_options, for the previous representation
+(card-name strings, hands re-scanned on every change; reproduced below)
+and the current one (integer card codes, incremental helpers.Hand).
+Shuffling dominates build_shoe in both, since random.shuffle works
+element by element; the per-card operations are where the codes pay off.
+"""
+import argparse
+import io
+import contextlib
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers  # noqa: E402
+from _common import best  # noqa: E402
+
+
+# --- Previous representation: a list of card-name strings ---
+def legacy_build_shoe():
+    one_deck = []
+    for suit in helpers.CARD_SUITS:
+        for rank in helpers.CARD_RANKS:
+            one_deck.append(f"{rank}{suit}")
+    shoe = one_deck * helpers.NUMBER_OF_DECKS
+    random.shuffle(shoe)
+    return shoe
+
+def legacy_hand_value(hand):
+    value = 0
+    aces = 0
+    for card in hand:
+        rank = card[:-1]
+        value += helpers.CARD_VALUES[rank]
+        if rank == 'A':
+            aces += 1
+    while value > 21 and aces > 0:
+        value -= 10
+        aces -= 1
+    return value
+
+def legacy_can_split(hand):
+    return helpers.CARD_VALUES[hand[0][:-1]] == helpers.CARD_VALUES[hand[1][:-1]]
+
+def legacy_composition(shoe):
+    counts = {}
+    for card in shoe:
+        counts[card[:-1]] = counts.get(card[:-1], 0) + 1
+    return counts
+
+
+# --- Current representation: a bytearray of card codes ---
+def current_build_shoe():
+    shoe = helpers._build_shoe_internal()
+    random.shuffle(shoe)
+    return bytearray(shoe)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    legacy_hand = ['AS', '7D', '3C']
+    current_hand = helpers.Hand(helpers.CARD_CODES[card] for card in legacy_hand)
+    five = helpers.CARD_CODES['5H']
+    legacy_pair = ['8S', '8D']
+    current_pair = helpers.Hand(helpers.CARD_CODES[card] for card in legacy_pair)
+    legacy_shoe = legacy_build_shoe()
+    legacy_state = {'cards_remaining': len(legacy_shoe)}
+    table = helpers.Table('bench', 'bench')
+    with contextlib.redirect_stdout(io.StringIO()):
+        helpers.build_shoe(table)
+
+    def legacy_deal():
+        # The previous helpers.deal_card, minus its prints
+        with table.lock:
+            if len(legacy_shoe) < (52 * helpers.NUMBER_OF_DECKS * 0.25):
+                legacy_shoe[:] = legacy_build_shoe()
+            card = legacy_shoe.pop()
+            legacy_state['cards_remaining'] = len(legacy_shoe)
+            return card
+
+    def current_deal():
+        return helpers.deal_card(table)
+
+    def legacy_hit():
+        legacy_hand.append('5H')
+        value = legacy_hand_value(legacy_hand)
+        legacy_hand.pop()
+        return value
+
+    def current_hit():
+        current_hand.append(five)
+        value = current_hand.value
+        current_hand.pop()
+        return value
+
+    rows = [
+        ('build + shuffle shoe', lambda: legacy_build_shoe(), lambda: current_build_shoe(), 2000),
+        ('deal_card', legacy_deal, current_deal, 200000),
+        ('hand value (3 cards)', lambda: legacy_hand_value(legacy_hand),
+         lambda: current_hand.value, 500000),
+        ('hit + value + undo', legacy_hit, current_hit, 500000),
+        ('can split check', lambda: legacy_can_split(legacy_pair),
+         lambda: current_pair.pair_value != 0, 500000),
+        ('shoe composition', lambda: legacy_composition(legacy_shoe),
+         lambda: list(table.rank_counts), 20000),
+    ]
+
+    print(f"{'operation':<22}{'strings (us)':>14}{'codes (us)':>14}{'speedup':>10}")
+    with contextlib.redirect_stdout(io.StringIO()):  # deal_card logs every reshuffle
+        results = [(name, best(old, number, args.repeat), best(new, number, args.repeat))
+                   for name, old, new, number in rows]
+    for name, old, new in results:
+        print(f"{name:<22}{old:>14.3f}{new:>14.3f}{old / new:>9.1f}x")
+
+    print(f"shoe memory: {sys.getsizeof(legacy_shoe) + sum(map(sys.getsizeof, set(legacy_shoe)))} bytes"
+          f" as strings, {sys.getsizeof(table.shoe)} bytes as codes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+Delivery check of the MQTT connection manager through a broker outage and
+broker/topic switches.
+
+Run from the repository root:
+
+    python benchmarks/bench_connections.py [--tables 8] [--hands 300] [--qos 1]
+
+Starts two minimal MQTT brokers on localhost (CONNECT, PUBLISH, PINGREQ
+and DISCONNECT only; enough for paho to publish to), points every table at
+the first one with the binary wire format, and plays hands on all tables
+from one thread each through the Flask test client. Meanwhile the first
+broker goes down for --outage seconds (open connections are cut and new
+ones refused), and half of the tables are then moved to the second broker
+and a new topic with /update_mqtt. Once the publishers have drained, every
+card event each table sent is looked up among the frames the brokers
+received, by table id and sequence number, and the /update_mqtt latency,
+lost and duplicated events and reconnects are printed. At QoS 0 a frame
+written to the socket just as the broker cuts it is gone for good; at QoS
+1 and 2 paho sends it again, so it may arrive twice.
+"""
+import argparse
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers  # noqa: E402
+import wire  # noqa: E402
+from _common import import_app  # noqa: E402
+
+blackjack_app = import_app({'STATE_DATABASE': None, 'HAND_LOG_DIRECTORY': None})
+
+
+class MiniBroker:
+    """Accepts MQTT 3.1.1 publishers and records every frame published to it"""
+
+    def __init__(self):
+        self.frames = []  # (topic, payload)
+        self.connects = 0
+        self._refuse_until = 0.0
+        self._clients = []
+        self._lock = threading.Lock()
+        self._server = socket.create_server(('127.0.0.1', 0))
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def outage(self, seconds):
+        """Cut every connection and refuse new ones for `seconds`"""
+        self._refuse_until = time.monotonic() + seconds
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for sock in clients:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def _accept(self):
+        while True:
+            sock, _ = self._server.accept()
+            threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def _serve(self, sock):
+        reader = sock.makefile('rb')
+        try:
+            while True:
+                header = reader.read(1)
+                if not header:
+                    return
+                length, shift = 0, 0
+                while True:
+                    byte = reader.read(1)[0]
+                    length |= (byte & 0x7F) << shift
+                    shift += 7
+                    if not byte & 0x80:
+                        break
+                body = reader.read(length)
+                kind = header[0] >> 4
+                if kind == 1:  # CONNECT
+                    if time.monotonic() < self._refuse_until:
+                        sock.sendall(b'\x20\x02\x00\x03')  # Server unavailable
+                        return
+                    with self._lock:
+                        self._clients.append(sock)
+                        self.connects += 1
+                    sock.sendall(b'\x20\x02\x00\x00')
+                elif kind == 3:  # PUBLISH
+                    qos = (header[0] >> 1) & 3
+                    topic_length, = struct.unpack_from('>H', body)
+                    topic = body[2:2 + topic_length].decode()
+                    offset = 2 + topic_length
+                    if qos:
+                        packet_id = body[offset:offset + 2]
+                        offset += 2
+                    with self._lock:
+                        self.frames.append((topic, body[offset:]))
+                    if qos == 1:
+                        sock.sendall(b'\x40\x02' + packet_id)
+                    elif qos == 2:
+                        sock.sendall(b'\x50\x02' + packet_id)  # PUBREC; PUBREL comes back as kind 6
+                elif kind == 6:  # PUBREL
+                    sock.sendall(b'\x70\x02' + body[:2])
+                elif kind == 12:  # PINGREQ
+                    sock.sendall(b'\xd0\x00')
+                elif kind == 14:  # DISCONNECT
+                    return
+        except (OSError, IndexError):
+            return
+        finally:
+            sock.close()
+
+
+def update_mqtt(client, table_id, broker, topic, qos):
+    start = time.perf_counter()
+    response = client.post(f'/table/{table_id}/update_mqtt', json={
+        'broker': '127.0.0.1', 'port': broker.port, 'topic': topic, 'qos': qos, 'wire_format': wire.BINARY})
+    assert response.status_code == 200, response.get_json()
+    return time.perf_counter() - start
+
+
+def play(table_id, hands, think):
+    client = blackjack_app.app.test_client()
+    table = helpers.tables[table_id]
+    base = f'/table/{table_id}'
+    for _ in range(hands):
+        table.game_state['bank'] = helpers.STARTING_BANK
+        state = client.post(base + '/deal').get_json()
+        while state.get('game_status') == 'playing':
+            hand = state['player_hands'][state['active_hand_index']]
+            state = client.post(base + ('/hit' if hand['value'] < 17 else '/stand')).get_json()
+        while state.get('game_status') == 'dealer_turn':
+            state = client.post(base + '/dealer_step').get_json()
+        time.sleep(think)
+
+
+def drained(timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = [s for s in blackjack_app.mqtt_connections.stats().values() if s['broker'] == '127.0.0.1']
+        revealing = any(table.reveals_pending for table in helpers.tables.values())
+        if not revealing and all(s['connected'] and s['queue_depth'] == 0 and s['inflight'] == 0 for s in stats):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tables', type=int, default=8)
+    parser.add_argument('--hands', type=int, default=300, help='Hands per table')
+    parser.add_argument('--think', type=float, default=0.01, help='Seconds between hands')
+    parser.add_argument('--qos', type=int, default=1, choices=(0, 1, 2))
+    parser.add_argument('--outage', type=float, default=1.5, help='Seconds the first broker is down')
+    args = parser.parse_args()
+
+    blackjack_app.DEALER_STEP_INTERVAL = 3600.0  # The players step the dealer themselves
+    helpers.DEALER_REVEAL_DELAY = blackjack_app.SPLIT_CARD_DELAY = 0.0  # No paced reveals piling up
+    first, second = MiniBroker(), MiniBroker()
+    client = blackjack_app.app.test_client()
+    table_ids = [f'conn{number}' for number in range(args.tables)]
+
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')  # Routes print every card
+    try:
+        for table_id in table_ids:
+            helpers.get_table(table_id, blackjack_app.MQTT_TOPIC_PREFIX)
+            update_mqtt(client, table_id, first, f'bench/{table_id}', args.qos)
+        drained(10.0)
+
+        players = [threading.Thread(target=play, args=(table_id, args.hands, args.think))
+                   for table_id in table_ids]
+        started = time.perf_counter()
+        for player in players:
+            player.start()
+        time.sleep(0.5)
+        first.outage(args.outage)
+        time.sleep(args.outage / 2)
+        switch_latencies = [update_mqtt(client, table_id, second, f'bench/moved/{table_id}', args.qos)
+                            for table_id in table_ids[::2]]
+        for player in players:
+            player.join()
+        played = time.perf_counter() - started
+        complete = drained(30.0)
+    finally:
+        sys.stdout = stdout
+
+    received = {}
+    for broker in (first, second):
+        for topic, payload in broker.frames:
+            frame = wire.decode(payload)
+            events = max(1, len(frame.cards))
+            for seq in range(frame.seq, frame.seq + events):
+                key = (frame.table_id, seq)
+                received[key] = received.get(key, 0) + 1
+    sent = sum(helpers.tables[table_id].next_seq for table_id in table_ids)
+    lost = sum(1 for table_id in table_ids for seq in range(helpers.tables[table_id].next_seq)
+               if (table_id, seq) not in received)
+    duplicated = sum(count - 1 for count in received.values())
+
+    print(f"{args.tables} tables x {args.hands} hands in {played:.1f} s at QoS {args.qos}, "
+          f"first broker down for {args.outage:.1f} s")
+    print(f"/update_mqtt switching {len(switch_latencies)} tables to the second broker: "
+          f"mean {sum(switch_latencies) / len(switch_latencies) * 1000:.2f} ms, "
+          f"max {max(switch_latencies) * 1000:.2f} ms")
+    print(f"card events sent {sent}, lost {lost}, duplicated {duplicated}"
+          + ('' if complete else ' (publishers had not drained after 30 s)'))
+    for name, stats in blackjack_app.mqtt_connections.stats().items():
+        if name.startswith('127.0.0.1'):
+            print(f"  {name:<18} connects {stats['connects']}, disconnects {stats['disconnects']}, "
+                  f"queued {stats['queued']}, dropped {stats['dropped']}, retried {stats['retried']}")
+    print(f"broker connections accepted: first {first.connects}, second {second.connects}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Throughput benchmark for the Hi-Lo counting service.
+
+Run from the repository root:
+
+    python benchmarks/bench_counter.py [--tables 500] [--shoes 4]
+
+Deals real shuffled shoes for many tables (with a "0" at every shuffle, as
+the /shuffle route sends), interleaves their card messages and feeds them
+to counter.CountingService through a fake MQTT client, the way paho's
+network thread would. Every table's final count is checked against a count
+made directly from the dealt cards, and the time to collect one snapshot
+per table is reported.
+"""
+import argparse
+import collections
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import counter  # noqa: E402
+import helpers  # noqa: E402
+
+PREFIX = 'bench/blkjck_'
+
+Message = collections.namedtuple('Message', 'topic payload')
+
+
+class FakeMQTTClient:
+    """Stands in for paho: records subscriptions and publishes, never touches a broker"""
+
+    def __init__(self):
+        self.on_message = None
+        self.on_publish = None
+        self.subscriptions = []
+        self.published = []
+
+    def subscribe(self, topic, qos=0):
+        self.subscriptions.append(topic)
+        return 0, 1
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.published.append((topic, payload))
+        return None
+
+    def deliver(self, topic, payload):
+        self.on_message(self, None, Message(topic, payload))
+
+
+def deal_messages(tables, shoes, seed):
+    """Card messages of `shoes` shoes per table, interleaved, plus the expected final counts"""
+    rng = random.Random(seed)
+    streams = {}
+    expected = {}
+    for table in range(tables):
+        topic = f"{PREFIX}table{table}"
+        payloads = []
+        for _ in range(shoes):
+            shoe = helpers.card_names(helpers._build_shoe_internal())
+            rng.shuffle(shoe)
+            # Deal to the reshuffle point, like helpers.deal_card
+            dealt = shoe[:int(len(shoe) * 0.75)]
+            payloads.append(b'0')
+            payloads.extend(card.encode() for card in dealt)
+        streams[topic] = payloads
+        running = sum(counter.HI_LO_TAGS[ord(card[0])] for card in dealt)
+        expected[topic] = (running, len(dealt))
+
+    messages = []
+    cursors = {topic: 0 for topic in streams}
+    while cursors:
+        for topic in list(cursors):
+            index = cursors[topic]
+            messages.append((topic, streams[topic][index]))
+            if index + 1 == len(streams[topic]):
+                del cursors[topic]
+            else:
+                cursors[topic] = index + 1
+    return messages, expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tables', type=int, default=500)
+    parser.add_argument('--shoes', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    messages, expected = deal_messages(args.tables, args.shoes, args.seed)
+    client = FakeMQTTClient()
+    service = counter.CountingService(client, PREFIX)
+    service.start()
+    service.stop()  # Snapshots are collected by hand below
+
+    deliver = client.deliver
+    start = time.perf_counter()
+    for topic, payload in messages:
+        deliver(topic, payload)
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    snapshots = service.collect_snapshots()
+    snapshot_time = time.perf_counter() - start
+
+    wrong = [topic for topic, (running, dealt) in expected.items()
+             if (service.counts[topic].running, service.counts[topic].dealt) != (running, dealt)]
+
+    print(f"{args.tables} tables, {len(messages)} messages (subscribed to {client.subscriptions[0]})")
+    print(f"  counting     : {len(messages) / elapsed:12,.0f} messages/s"
+          f"  ({elapsed / len(messages) * 1e6:.2f} us each)")
+    print(f"  snapshots    : {len(snapshots)} in {snapshot_time * 1000:.2f} ms, e.g. {snapshots[0][1]!r}")
+    print(f"  counts match : {args.tables - len(wrong)}/{args.tables}")
+
+
+if __name__ == '__main__':
+    main()
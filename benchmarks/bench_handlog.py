@@ -0,0 +1,120 @@
+"""
+Benchmark of the hand history log.
+
+Run from the repository root:
+
+    python benchmarks/bench_handlog.py [--hands 200000]
+
+Plays hands through the helpers actions with basic strategy twice, once
+without a hand log and once with one, and compares the time per action
+(what /deal, /hit, /stand and friends spend under the table lock). The
+recorded log is then read back: a pure-Python replay of every round and
+the numpy statistics (win rate by total, EV by true count), both through
+mmap, plus a seek to a round near the end through the index records.
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import handlog  # noqa: E402
+import helpers  # noqa: E402
+import strategy  # noqa: E402
+
+
+def play(table, hands, seed):
+    """Play `hands` rounds; returns (actions, seconds spent inside them)"""
+    random.seed(seed)
+    strat = strategy.load('basic')
+    send = lambda table, message, delay=0.0: None  # noqa: E731
+    game_state = table.game_state
+    actions = 0
+    elapsed = 0.0
+    clock = time.perf_counter
+    with contextlib.redirect_stdout(io.StringIO()):
+        helpers.build_shoe(table)
+        for _ in range(hands):
+            game_state['bank'] = helpers.STARTING_BANK
+            start = clock()
+            helpers.start_hand(table, send)
+            elapsed += clock() - start
+            actions += 1
+            while game_state['game_status'] == 'playing':
+                choice = strategy.next_action(strat, table)
+                start = clock()
+                if choice == 'H':
+                    helpers.hit(table, send)
+                elif choice == 'D':
+                    helpers.double_down(table, send)
+                elif choice == 'P':
+                    helpers.split_hand(table, send)
+                else:
+                    helpers.stand(table)
+                elapsed += clock() - start
+                actions += 1
+            if game_state['game_status'] == 'dealer_turn':
+                start = clock()
+                helpers.dealer_plays(table, send)
+                elapsed += clock() - start
+                actions += 1
+    return actions, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--hands', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='handlog-')
+    try:
+        actions, plain = play(helpers.Table('bench', 'bench'), args.hands, args.seed)
+
+        table = helpers.Table('bench', 'bench')
+        table.hand_log = handlog.open_log(directory, 'bench')
+        _, logged = play(table, args.hands, args.seed)
+        table.hand_log.close()
+        path = table.hand_log.directory
+        size = sum(os.path.getsize(segment) for segment in handlog.segment_paths(path))
+
+        print(f"{args.hands} hands, {actions} actions")
+        print(f"  per action   : {plain / actions * 1e6:.2f} us without log,"
+              f" {logged / actions * 1e6:.2f} us with log")
+        print(f"  log          : {table.hand_log.records} records, {size / 1e6:.1f} MB"
+              f" in {len(handlog.segment_paths(path))} segment(s)")
+
+        start = time.perf_counter()
+        replayed = sum(1 for _ in handlog.rounds(path))
+        replay_time = time.perf_counter() - start
+        print(f"  replay       : {replayed} rounds in {replay_time:.2f} s"
+              f" ({replayed / replay_time:,.0f} rounds/s)")
+
+        try:
+            start = time.perf_counter()
+            stats = handlog.statistics(path)
+            stats_time = time.perf_counter() - start
+        except ImportError:
+            print("  statistics   : skipped, numpy is not installed")
+        else:
+            ev = sum(row['ev'] * row['rounds'] for row in stats['by_true_count'].values()) / stats['rounds']
+            print(f"  statistics   : {stats['records']} records in {stats_time:.3f} s"
+                  f" ({stats['records'] / stats_time:,.0f} records/s), EV {ev * 100:+.2f}%")
+
+        target = table.round_id - 10
+        start = time.perf_counter()
+        found, _ = next(handlog.rounds(path, target))
+        seek_time = time.perf_counter() - start
+        print(f"  seek         : round {found} in {seek_time * 1000:.2f} ms")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Micro-benchmark of the metrics instrumentation.
+
+Run from the repository root:
+
+    python benchmarks/bench_metrics.py [--repeat 5]
+
+Times the guard every instrumented hot path runs while collection is off
+(a check of metrics.enabled), deal_card with collection off and on, the
+cost of recording a counter increment and a histogram observation, and
+rendering a /metrics page.
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers  # noqa: E402
+import metrics  # noqa: E402
+from _common import best  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    table = helpers.Table('bench', 'bench')
+    with contextlib.redirect_stdout(io.StringIO()):
+        helpers.build_shoe(table)
+    counter = metrics.Counter('bench_total', 'Benchmark counter')
+    histogram = metrics.Histogram('bench_seconds', 'Benchmark histogram', ('route',))
+    child = histogram.labels('deal')
+
+    def guard():
+        if metrics.enabled:
+            counter.inc()
+
+    rows = []
+    with contextlib.redirect_stdout(io.StringIO()):  # deal_card logs every reshuffle
+        metrics.enabled = False
+        rows.append(('guard, collection off', best(guard, 1000000, args.repeat, 1e9)))
+        rows.append(('deal_card, collection off', best(lambda: helpers.deal_card(table), 200000, args.repeat, 1e9)))
+        metrics.enabled = True
+        rows.append(('deal_card, collection on', best(lambda: helpers.deal_card(table), 200000, args.repeat, 1e9)))
+        rows.append(('Counter.inc', best(counter.inc, 500000, args.repeat, 1e9)))
+        rows.append(('Histogram child observe', best(lambda: child.observe(0.0003), 500000, args.repeat, 1e9)))
+        rows.append(('Histogram.labels().observe',
+                     best(lambda: histogram.labels('deal').observe(0.0003), 500000, args.repeat, 1e9)))
+        for route in range(20):
+            histogram.labels(f'route{route}').observe(0.001)
+        rows.append(('render /metrics page', best(metrics.render, 200, args.repeat, 1e9)))
+
+    print(f"{'operation':<30}{'ns':>12}")
+    for name, ns in rows:
+        print(f"{name:<30}{ns:>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark of the Discord alert relay against a local webhook stand-in.
+
+Run from the repository root:
+
+    python benchmarks/bench_relay.py [--tables 8] [--devices 2] [--handshake-ms 100]
+
+Starts a local HTTP server in place of Discord that limits each webhook
+to 5 calls per 2 seconds (answering 429 beyond that, as Discord does)
+and spends --handshake-ms on every new connection, standing in for TLS
+setup. --devices counter devices per table then each report the same
+alerts for their table (shuffle, hot, cold, hot again), every table at
+the same moments. First each device posts its alerts itself, one new
+connection per alert like the firmware used to; then they go through
+relay.AlertRelay. Prints webhook calls, connections, 429s and how many
+of the distinct alerts reached the stand-in.
+"""
+import argparse
+import http.client
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import relay  # noqa: E402
+
+WEBHOOK_PATH = '/api/webhooks/1/token'
+ALERTS = (('shuffle', '0'), ('hot', '5'), ('cold', '0'), ('hot', '5'))
+ALERT_SPACING = 0.3  # Seconds between a table's alerts
+
+
+class StandIn(http.server.ThreadingHTTPServer):
+    """Webhook stand-in: records what it accepted and rate limits like Discord"""
+
+    daemon_threads = True
+
+    def __init__(self, handshake):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.handshake = handshake
+        self.lock = threading.Lock()
+        self.calls = []  # Monotonic times of calls within the rate limit window
+        self.requests = self.rate_limited = self.connections = 0
+        self.received = []  # (table, kind) of every embed accepted
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}{WEBHOOK_PATH}'
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+        time.sleep(self.server.handshake)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        now = time.monotonic()
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.calls = [at for at in self.server.calls if now - at < relay.RATE_LIMIT_WINDOW]
+            limited = len(self.server.calls) >= relay.RATE_LIMIT_REQUESTS
+            if limited:
+                self.server.rate_limited += 1
+                retry_after = self.server.calls[0] + relay.RATE_LIMIT_WINDOW - now
+            else:
+                self.server.calls.append(now)
+                self.server.received.extend((embed['title'], embed['description']) for embed in body['embeds'])
+        if limited:
+            reply = json.dumps({'message': 'You are being rate limited.', 'retry_after': retry_after}).encode()
+            self.send_response(429)
+        else:
+            reply = b''
+            self.send_response(204)
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def fire(tables, devices, report):
+    """Have every device report every table's alerts at the same moments; report(kind, table, value, device)"""
+    def device(table, name):
+        for kind, value in ALERTS:
+            report(kind, table, value, name)
+            time.sleep(ALERT_SPACING)
+
+    threads = [threading.Thread(target=device, args=(f'table{t}', f'Player{t}-{d}'))
+               for t in range(tables) for d in range(devices)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_direct(server, tables, devices):
+    """Every alert posted by its device on a new connection; rate limited ones are lost"""
+    host = server.url.split('/')[2]
+
+    def post(kind, table, value, name):
+        alert = relay.Alert(kind, table, value, name, time.time())
+        connection = http.client.HTTPConnection(host, timeout=10)
+        body = relay.webhook_body([alert])
+        connection.request('POST', WEBHOOK_PATH, body,
+                           {'Content-Type': 'application/json', 'Connection': 'close'})
+        connection.getresponse().read()
+        connection.close()
+
+    fire(tables, devices, post)
+
+
+def run_relay(server, tables, devices):
+    """Every alert published to the relay, which batches, deduplicates and retries"""
+    alert_relay = relay.AlertRelay(None, {None: server.url}, batch_delay=0.25)
+    alert_relay.start()
+    fire(tables, devices, lambda kind, table, value, name: alert_relay.handle(
+        relay.ALERT_PREFIX + table, f'{kind},{table},{value},{name}'.encode()))
+    while alert_relay.pending():
+        time.sleep(0.05)
+    alert_relay.stop()
+    return alert_relay.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tables', type=int, default=8)
+    parser.add_argument('--devices', type=int, default=2, help='Devices reporting each table')
+    parser.add_argument('--handshake-ms', type=float, default=100.0)
+    args = parser.parse_args()
+
+    distinct = args.tables * len(set(ALERTS))
+    print(f"{args.tables} tables x {args.devices} devices, {len(ALERTS)} alerts each, "
+          f"{distinct} distinct alerts (table, kind, count)")
+    print(f"{'':<10}{'seconds':>9}{'calls':>7}{'conns':>7}{'429s':>6}{'delivered':>11}{'distinct':>10}")
+    for label, run in (('direct', run_direct), ('relay', run_relay)):
+        server = StandIn(args.handshake_ms / 1000)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        start = time.perf_counter()
+        run(server, args.tables, args.devices)
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        print(f"{label:<10}{elapsed:>9.2f}{server.requests:>7}{server.connections:>7}{server.rate_limited:>6}"
+              f"{len(server.received):>11}{len(set(server.received)):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+"""
+Load test of the game routes with per-route latency percentiles.
+
+Run from the repository root:
+
+    python benchmarks/bench_routes.py [--mode client|http|both] [--clients 16] [--hands 200]
+                                      [--output results.json] [--compare baseline.json]
+
+Every client plays its own table through /set_bet, /deal, /hit, /stand,
+/double, /split and /dealer_step: it splits pairs and doubles 9-11
+whenever the state allows it, hits below 17 and stands otherwise, then
+steps the dealer itself (the server-driven dealer turn is pushed far
+enough out not to interfere). Clients run concurrently, either through
+the Flask test client ("client") or over real HTTP to a threaded local
+werkzeug server ("http", one keep-alive connection per client). MQTT
+publishes go to an in-process fake client instead of a broker.
+
+Throughput and p50/p95/p99 latency are printed per route. --output saves
+them as JSON; --compare loads an earlier --output and flags every route
+whose p50/p95/p99 grew or whose throughput fell by more than --threshold,
+exiting with status 1 if any did.
+"""
+import argparse
+import builtins
+import functools
+import http.client
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers  # noqa: E402
+from _common import import_app  # noqa: E402
+
+blackjack_app = import_app({'HAND_LOG_DIRECTORY': None})
+
+ROUTES = ('/set_bet', '/deal', '/hit', '/stand', '/double', '/split', '/dealer_step')
+PERCENTILES = (50, 95, 99)
+
+
+class FakeMQTTClient:
+    """Counts publishes in place of paho so the load test never touches a broker"""
+
+    def __init__(self):
+        self.published = 0
+        self._lock = threading.Lock()
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        with self._lock:
+            self.published += 1
+        return None
+
+
+class TestClientTransport:
+    """POSTs through the Flask test client, in-process"""
+
+    def __init__(self):
+        self.client = blackjack_app.app.test_client()
+
+    def post(self, path, body=None):
+        response = self.client.post(path, json=body)
+        return response.status_code, response.get_json()
+
+    def close(self):
+        pass
+
+
+class HTTPTransport:
+    """POSTs over one keep-alive HTTP connection to the local server"""
+
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+
+    def post(self, path, body=None):
+        payload = json.dumps(body if body is not None else {})
+        self.connection.request('POST', path, payload, {'Content-Type': 'application/json'})
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def close(self):
+        self.connection.close()
+
+
+def choose(state):
+    """The next player route for a state, or None once the player is done"""
+    if state.get('game_status') != 'playing':
+        return None
+    hand = state['player_hands'][state['active_hand_index']]
+    if state['can_split']:
+        return '/split'
+    if state['can_double'] and 9 <= hand['value'] <= 11:
+        return '/double'
+    return '/hit' if hand['value'] < 17 else '/stand'
+
+
+def play(transport, base, hands, latencies, errors):
+    """Play `hands` hands on one table, recording each request's latency by route"""
+    clock = time.perf_counter
+
+    def post(route, body=None):
+        start = clock()
+        status, state = transport.post(base + route, body)
+        latencies[route].append(clock() - start)
+        if status >= 400:
+            errors[route] = errors.get(route, 0) + 1
+        return state
+
+    for _ in range(hands):
+        post('/set_bet', {'amount': helpers.MIN_BET})
+        state = post('/deal')
+        if 'error' in state:
+            transport.post(base + '/reset_bank')
+            continue
+        route = choose(state)
+        while route is not None:
+            state = post(route)
+            route = choose(state)
+        while state.get('game_status') == 'dealer_turn':
+            state = post('/dealer_step')
+
+
+def run(mode, clients, hands, port=None):
+    """Run one load test; returns per-route results and the overall rate"""
+    results = [({route: [] for route in ROUTES}, {}) for _ in range(clients)]
+    barrier = threading.Barrier(clients + 1)
+
+    def worker(index):
+        transport = HTTPTransport(port) if mode == 'http' else TestClientTransport()
+        table_id = f'load_{mode}_{index}'
+        latencies, errors = results[index]
+        barrier.wait()
+        try:
+            play(transport, f'/table/{table_id}', hands, latencies, errors)
+        finally:
+            transport.close()
+
+    for index in range(clients):
+        helpers.get_table(f'load_{mode}_{index}', blackjack_app.MQTT_TOPIC_PREFIX)
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    routes = {}
+    for route in ROUTES:
+        samples = sorted(sample for latencies, _ in results for sample in latencies[route])
+        if not samples:
+            continue
+        routes[route] = {
+            'requests': len(samples),
+            'errors': sum(errors.get(route, 0) for _, errors in results),
+            'throughput': len(samples) / elapsed,
+            'mean_ms': sum(samples) / len(samples) * 1000,
+            'max_ms': samples[-1] * 1000,
+        }
+        for p in PERCENTILES:
+            # Nearest-rank percentile
+            routes[route][f'p{p}_ms'] = samples[max(0, -(-len(samples) * p // 100) - 1)] * 1000
+    total = sum(row['requests'] for row in routes.values())
+    return {'seconds': elapsed, 'requests': total, 'throughput': total / elapsed, 'routes': routes}
+
+
+def start_server():
+    """Serve the app on a free local port from a background thread"""
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, blackjack_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='http-server', daemon=True).start()
+    return server
+
+
+def print_results(mode, result, file):
+    print = functools.partial(builtins.print, file=file)  # noqa: A001
+    print(f"\n{mode}: {result['requests']} requests in {result['seconds']:.2f} s"
+          f" ({result['throughput']:,.0f} req/s)")
+    print(f"  {'route':<13}{'requests':>9}{'errors':>7}{'req/s':>9}"
+          + ''.join(f"{f'p{p} ms':>9}" for p in PERCENTILES) + f"{'max ms':>9}")
+    for route, row in result['routes'].items():
+        print(f"  {route:<13}{row['requests']:>9}{row['errors']:>7}{row['throughput']:>9,.0f}"
+              + ''.join(f"{row[f'p{p}_ms']:>9.3f}" for p in PERCENTILES) + f"{row['max_ms']:>9.2f}")
+
+
+def compare(current, baseline, threshold):
+    """Regressions of current against baseline, as printable lines"""
+    regressions = []
+    for mode, result in current['modes'].items():
+        base = baseline.get('modes', {}).get(mode)
+        if base is None:
+            continue
+        for route, row in result['routes'].items():
+            old = base['routes'].get(route)
+            if old is None:
+                continue
+            for p in PERCENTILES:
+                key = f'p{p}_ms'
+                if row[key] > old[key] * (1 + threshold):
+                    regressions.append(f"{mode} {route} {key}: {old[key]:.3f} -> {row[key]:.3f}")
+            if row['throughput'] < old['throughput'] * (1 - threshold):
+                regressions.append(f"{mode} {route} req/s: {old['throughput']:,.0f}"
+                                   f" -> {row['throughput']:,.0f}")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mode', choices=('client', 'http', 'both'), default='both')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--hands', type=int, default=200, help='Hands per client')
+    parser.add_argument('--output', help='Save the results as JSON')
+    parser.add_argument('--compare', help='Results JSON of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative change that counts as a regression')
+    args = parser.parse_args()
+
+    fake_client = FakeMQTTClient()
+    blackjack_app.default_connection.use_client(fake_client)
+    blackjack_app.DEALER_STEP_INTERVAL = 3600.0  # The clients step the dealer themselves
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # No access log line per request
+
+    modes = ('client', 'http') if args.mode == 'both' else (args.mode,)
+    results = {
+        'revision': git_revision(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'clients': args.clients,
+        'hands': args.hands,
+        'modes': {},
+    }
+    server = start_server() if 'http' in modes else None
+    # Route handlers print every card, and paced reveals keep printing for a
+    # while after the run; the report goes to the real stdout instead
+    report, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        for mode in modes:
+            results['modes'][mode] = run(mode, args.clients, args.hands,
+                                         server.server_port if server else None)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print = functools.partial(builtins.print, file=report)  # noqa: A001
+    print(f"{args.clients} clients x {args.hands} hands, {fake_client.published} MQTT publishes")
+    for mode, result in results['modes'].items():
+        print_results(mode, result, report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        print(f"\nCompared with {args.compare} ({baseline.get('revision')}),"
+              f" threshold {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  REGRESSION {line}")
+        if not regressions:
+            print("  no regressions")
+        else:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
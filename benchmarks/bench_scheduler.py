@@ -0,0 +1,61 @@
+"""
+Benchmark for the timed-event scheduler that paces card reveals.
+
+Run from the repository root:
+
+    python benchmarks/bench_scheduler.py [--events 20000] [--window 1.0]
+
+Schedules many reveals spread over a time window and reports the cost of
+scheduling one event, how late events fire, and whether they fired in
+due-time order.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scheduler  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--window', type=float, default=1.0)
+    args = parser.parse_args()
+
+    lateness = []
+    fired = []
+    done = threading.Event()
+
+    def reveal(due):
+        lateness.append(time.monotonic() - due)
+        fired.append(due)
+        if len(fired) == args.events:
+            done.set()
+
+    base = time.monotonic() + 0.1
+    dues = [base + random.random() * args.window for _ in range(args.events)]
+
+    start = time.perf_counter()
+    for due in dues:
+        scheduler.call_at(due, reveal, due)
+    schedule_cost = (time.perf_counter() - start) / args.events
+    peak_pending = scheduler.pending()
+
+    done.wait(args.window + 10)
+    lateness.sort()
+
+    print(f"{args.events} reveals over {args.window:.1f} s (peak pending: {peak_pending})")
+    print(f"  schedule cost : {schedule_cost * 1e6:8.2f} us/event")
+    print(f"  lateness p50  : {statistics.median(lateness) * 1000:8.3f} ms")
+    print(f"  lateness p99  : {lateness[int(len(lateness) * 0.99) - 1] * 1000:8.3f} ms")
+    print(f"  in order      : {fired == sorted(fired)}")
+
+
+if __name__ == '__main__':
+    main()
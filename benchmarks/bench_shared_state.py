@@ -0,0 +1,118 @@
+"""
+Check of several worker processes playing one table through a shared store.
+
+Run from the repository root:
+
+    python benchmarks/bench_shared_state.py [--workers 4] [--actions 300] [--backend shared]
+
+Starts --workers processes that each set up app.py with its table store
+on one temporary SQLite file, and have them all play the same table at
+once through the Flask test client: each reads /state and posts whatever
+it allows (/deal, /stand, /dealer_step, or /reset_bank when broke). Every
+action that succeeds must land on its own revision, and the table saved
+at the end must hold every round dealt; a lost update shows up as two
+workers handed the same revision, or as fewer rounds saved than dealt.
+--backend local runs the same with the per-process store, to show what
+goes wrong without sharing.
+"""
+import argparse
+import collections
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TABLE_ID = 'shared_check'
+BASE = f'/table/{TABLE_ID}'
+
+
+def worker(backend, path, actions, barrier, results):
+    """Play `actions` actions on the shared table and put what happened on `results`"""
+    sys.stdout = open(os.devnull, 'w')  # Routes print every card
+    from _common import NullMQTTClient, import_app
+    blackjack_app = import_app({'STATE_DATABASE': path, 'STATE_BACKEND': backend, 'HAND_LOG_DIRECTORY': None})
+    import helpers
+
+    blackjack_app.default_connection.use_client(NullMQTTClient())
+    blackjack_app.DEALER_STEP_INTERVAL = 3600.0  # The workers step the dealer themselves
+    table_store = blackjack_app.table_store
+    client = blackjack_app.app.test_client()
+
+    revisions, statuses, deals = [], collections.Counter(), 0
+    barrier.wait()
+    started = time.perf_counter()
+    for _ in range(actions):
+        state = client.get(BASE + '/state').get_json()
+        if state['game_status'] == 'playing':
+            route = '/stand'
+        elif state['game_status'] == 'dealer_turn':
+            route = '/dealer_step'
+        else:
+            route = '/deal' if state['bank'] >= helpers.MIN_BET else '/reset_bank'
+        response = client.post(BASE + route)
+        statuses[response.status_code] += 1
+        if response.status_code == 200:
+            revisions.append(response.get_json()['revision'])
+            deals += route == '/deal'
+    elapsed = time.perf_counter() - started
+    table_store.flush()
+    results.put({'revisions': revisions, 'statuses': dict(statuses), 'deals': deals,
+                 'elapsed': elapsed, 'store': table_store.stats()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--actions', type=int, default=300, help='Actions per worker')
+    parser.add_argument('--backend', choices=('shared', 'local'), default='shared')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')  # Fresh interpreters, like separate server workers
+    directory = tempfile.mkdtemp(prefix='shared-')
+    path = os.path.join(directory, 'shared.db')
+    try:
+        barrier = context.Barrier(args.workers)
+        results = context.Queue()
+        processes = [context.Process(target=worker, args=(args.backend, path, args.actions, barrier, results))
+                     for _ in range(args.workers)]
+        for process in processes:
+            process.start()
+        runs = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        import store
+        reader = store.SharedTableStore(path)
+        saved = reader.load(TABLE_ID)
+        reader.close()
+    finally:
+        shutil.rmtree(directory)
+
+    revisions = [revision for run in runs for revision in run['revisions']]
+    duplicated = sum(count - 1 for count in collections.Counter(revisions).values())
+    statuses = sum((collections.Counter(run['statuses']) for run in runs), collections.Counter())
+    deals = sum(run['deals'] for run in runs)
+    actions = args.workers * args.actions
+    elapsed = max(run['elapsed'] for run in runs)
+
+    print(f"{args.workers} workers x {args.actions} actions on one table, {args.backend} store")
+    print("responses: " + ', '.join(f"{status}: {count}" for status, count in sorted(statuses.items())))
+    print(f"{actions / elapsed:,.0f} actions/s over all workers")
+    if args.backend == 'shared':
+        conflicts = sum(run['store']['conflicts'] for run in runs)
+        reloads = sum(run['store']['reloads'] for run in runs)
+        print(f"write conflicts retried: {conflicts}, reloads of changes made by other workers: {reloads}")
+    print(f"revisions handed to more than one action: {duplicated}")
+    print(f"rounds dealt {deals}, rounds saved {saved['round_id'] if saved else 0}")
+    lost = duplicated or saved is None or saved['round_id'] != deals
+    print("lost updates: " + ("YES" if lost else "none"))
+    return 1 if lost and args.backend == 'shared' else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
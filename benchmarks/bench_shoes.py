@@ -0,0 +1,122 @@
+"""
+Benchmark of reshuffles with and without the background shoe factory.
+
+Run from the repository root:
+
+    python benchmarks/bench_shoes.py [--hands 3000] [--think 0.002]
+
+Plays hands on one table through the Flask test client (/deal, /hit below
+17, /stand, /dealer_step), first shuffling each new shoe inside the
+request that crosses the reshuffle point, then taking it from a
+shoes.ShoeFactory. Latency percentiles of /deal and /hit are printed,
+then those of just the requests that replaced the shoe, and of the
+deal_card calls inside them without Flask around them. --think pauses between
+hands, the way real players leave the server idle between requests.
+Finally two seeded factories are checked to deal identical shoes.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers  # noqa: E402
+import shoes  # noqa: E402
+from _common import NullMQTTClient, import_app, percentile  # noqa: E402
+
+blackjack_app = import_app({'HAND_LOG_DIRECTORY': None})
+
+
+def play(table_id, hands, think):
+    """Latencies by route, and the latencies of requests that replaced the shoe"""
+    client = blackjack_app.app.test_client()
+    table = helpers.get_table(table_id, blackjack_app.MQTT_TOPIC_PREFIX)
+    base = f'/table/{table_id}'
+    latencies = {'/deal': [], '/hit': []}
+    reshuffles = []
+
+    def post(route):
+        shoe_id = table.shoe_id
+        start = time.perf_counter()
+        state = client.post(base + route).get_json()
+        elapsed = time.perf_counter() - start
+        if route in latencies:
+            latencies[route].append(elapsed)
+        if table.shoe_id != shoe_id:
+            reshuffles.append(elapsed)
+        return state
+
+    for _ in range(hands):
+        table.game_state['bank'] = helpers.STARTING_BANK
+        state = post('/deal')
+        while state.get('game_status') == 'playing':
+            hand = state['player_hands'][state['active_hand_index']]
+            state = post('/hit' if hand['value'] < 17 else '/stand')
+        while state.get('game_status') == 'dealer_turn':
+            state = post('/dealer_step')
+        time.sleep(think)
+    return latencies, reshuffles
+
+
+def time_reshuffles(shoes_dealt, think):
+    """Microseconds taken by the deal_card calls that replaced the shoe"""
+    table = helpers.Table('shoes_deal_card', '')
+    helpers.build_shoe(table)
+    timings = []
+    for _ in range(shoes_dealt):
+        shoe_id = table.shoe_id
+        while table.shoe_id == shoe_id:
+            start = time.perf_counter()
+            helpers.deal_card(table)
+            elapsed = time.perf_counter() - start
+        timings.append(elapsed * 1e6)
+        time.sleep(think)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--hands', type=int, default=3000)
+    parser.add_argument('--think', type=float, default=0.002, help='Seconds between hands')
+    args = parser.parse_args()
+
+    blackjack_app.default_connection.use_client(NullMQTTClient())
+    blackjack_app.DEALER_STEP_INTERVAL = 3600.0  # The benchmark steps the dealer itself
+    factory = helpers.shoe_factory
+
+    results = []
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')  # Routes print every card
+    try:
+        helpers.shoe_factory = None
+        results.append(('shuffle in request', play('shoes_inline', args.hands, args.think)))
+        inline_deals = time_reshuffles(args.hands // 10, args.think)
+        helpers.shoe_factory = factory
+        results.append(('shoe factory', play('shoes_factory', args.hands, args.think)))
+        factory_deals = time_reshuffles(args.hands // 10, args.think)
+    finally:
+        sys.stdout = stdout
+
+    print(f"{args.hands} hands, {args.think * 1000:.1f} ms between hands (times in ms)")
+    print(f"{'':<20}{'route':<8}{'p50':>8}{'p99':>8}{'p99.9':>8}{'max':>8}")
+    for label, (latencies, _) in results:
+        for route, samples in latencies.items():
+            row = [percentile(samples, 50), percentile(samples, 99), percentile(samples, 99.9), max(samples)]
+            print(f"{label:<20}{route:<8}" + ''.join(f"{value * 1000:>8.3f}" for value in row))
+    print("requests that replaced the shoe:")
+    for label, (_, reshuffles) in results:
+        print(f"  {label:<18}{len(reshuffles):>5}  p50 {percentile(reshuffles, 50) * 1000:.3f}"
+              f"  mean {sum(reshuffles) / len(reshuffles) * 1000:.3f}  max {max(reshuffles) * 1000:.3f}")
+    print("deal_card calls that replaced the shoe (us):")
+    for label, timings in (('shuffle in request', inline_deals), ('shoe factory', factory_deals)):
+        print(f"  {label:<18}{len(timings):>5}  p50 {percentile(timings, 50):.1f}"
+              f"  p99 {percentile(timings, 99):.1f}")
+    print(f"shoe factory: {factory.stats()}")
+
+    first, second = (shoes.ShoeFactory(helpers._build_shoe_internal(), seed=42) for _ in range(2))
+    same = all(first.take('table1') == second.take('table1') for _ in range(20))
+    print(f"seeded factories deal identical shoes: {same}")
+
+
+if __name__ == '__main__':
+    main()
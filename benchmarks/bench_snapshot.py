@@ -0,0 +1,199 @@
+"""
+Benchmark and round-trip check of table snapshots (GET /snapshot, POST /restore).
+
+Run from the repository root:
+
+    python benchmarks/bench_snapshot.py [--requests 2000] [--forks 20000] [--seed 1]
+
+Plays --requests random requests on a table with a seeded RNG through the
+Flask test client (/set_bet, /deal, /hit, /stand, /double, /split,
+/dealer_step, /shuffle, /reset_bank, /state, /advice), and after every one
+checks that its GET /snapshot blob survives snapshot.fork and dump
+unchanged and that POSTing it to another table's /restore gives that
+table the same snapshot (revisions aside). The same requests are then
+replayed on a third table restored from the first snapshot: it must end
+exactly where the first table did. Prints the time to dump, load and fork
+a snapshot and its size, then forks --forks copies of a dealt hand, plays
+each action out once per copy on a reshuffled rest of the shoe and
+compares the Monte Carlo EVs with advisor.advise.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import advisor  # noqa: E402
+import helpers  # noqa: E402
+import snapshot  # noqa: E402
+import strategy  # noqa: E402
+from _common import NullMQTTClient, import_app  # noqa: E402
+
+blackjack_app = import_app({'STATE_DATABASE': None, 'HAND_LOG_DIRECTORY': None})
+
+REVISION = slice(34, 38)  # Bytes of the revision in a snapshot: header, bank, bet, shoe id, round id, sequence number
+BETS = (10, 25, 50, 100, 1000, 5000)
+
+
+def without_revision(blob):
+    return blob[:REVISION.start] + blob[REVISION.stop:]
+
+
+def random_requests(rng, count):
+    """(method, route, JSON body) of `count` requests, valid or not for the state they meet"""
+    routes = (['/deal', '/hit', '/stand', '/double', '/split', '/dealer_step'] * 4 +
+              ['/set_bet', '/shuffle', '/reset_bank', '/state', '/advice'])
+    requests = []
+    for _ in range(count):
+        route = rng.choice(routes)
+        if route == '/set_bet':
+            requests.append(('POST', route, {'amount': rng.choice(BETS)}))
+        elif route in ('/state', '/advice'):
+            requests.append(('GET', route, None))
+        else:
+            requests.append(('POST', route, None))
+    return requests
+
+
+def send(client, table_id, request):
+    method, route, body = request
+    return client.open(f'/table/{table_id}{route}', method=method, json=body).status_code
+
+
+def check_routes(client, requests, seed):
+    """Play the requests on snap_a, mirroring every snapshot to snap_b; replay them on snap_c"""
+    table = helpers.get_table('snap_a', blackjack_app.MQTT_TOPIC_PREFIX)
+    table.rng = random.Random(seed)
+    helpers.build_shoe(table)
+    client.post('/table/snap_a/reset_bank')
+    first = client.get('/table/snap_a/snapshot').data
+
+    failures = 0
+    statuses = {}
+    for request in requests:
+        status = send(client, 'snap_a', request)
+        statuses[status] = statuses.get(status, 0) + 1
+        blob = client.get('/table/snap_a/snapshot').data
+        if snapshot.dump(snapshot.fork(blob)) != blob:
+            failures += 1
+        client.post('/table/snap_b/restore', data=blob)
+        if without_revision(client.get('/table/snap_b/snapshot').data) != without_revision(blob):
+            failures += 1
+    last = client.get('/table/snap_a/snapshot').data
+
+    client.post('/table/snap_c/restore', data=first)
+    for request in requests:
+        send(client, 'snap_c', request)
+    replayed = without_revision(client.get('/table/snap_c/snapshot').data) == without_revision(last)
+    return failures, statuses, replayed, last
+
+
+def redeal_hole_card(table, rng):
+    """Put the dealer's hole card back in the shoe, shuffle it and deal a new one, as the player sees it"""
+    shoe = table.shoe + bytes([table.game_state['dealer_hand'][0]])
+    rng.shuffle(shoe)
+    up = table.game_state['dealer_hand'][1]
+    table.game_state['dealer_hand'] = helpers.Hand([shoe.pop(), up])
+    helpers._set_shoe(table, shoe)
+
+
+def play_out(table, action, basic):
+    """Take `action` on the active (only) hand and finish the round; returns the net in units of the bet"""
+    state = table.game_state
+    bet = state['player_hands'][0]['bet']
+    bank = state['bank'] + bet  # The bet is out of the bank while the hand is played
+    if action == 'stand':
+        helpers.stand(table)
+    elif action == 'double':
+        helpers.double_down(table, strategy.no_send)
+    else:
+        helpers.hit(table, strategy.no_send)
+    strategy.play_hand(basic, table)
+    return (state['bank'] - bank) / bet
+
+
+def dealt_position(seed):
+    """Snapshot of a private table at the first dealt hand that can double but not split"""
+    table = helpers.Table('fork_source', '')
+    table.rng = random.Random(seed)
+    helpers.build_shoe(table)
+    while True:
+        helpers.start_hand(table, strategy.no_send)
+        state = table.game_state
+        if state['game_status'] == 'playing' and state['can_double'] and not state['can_split']:
+            return table, snapshot.dump(table)
+        strategy.play_hand(strategy.load('basic'), table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--forks', type=int, default=20000, help='Forks per action')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    blackjack_app.default_connection.use_client(NullMQTTClient())
+    blackjack_app.DEALER_STEP_INTERVAL = 3600.0  # The benchmark steps the dealer itself
+    blackjack_app.SPLIT_CARD_DELAY = helpers.DEALER_REVEAL_DELAY = 0  # No reveals left printing afterwards
+    client = blackjack_app.app.test_client()
+
+    requests = random_requests(random.Random(args.seed), args.requests)
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')  # Routes print every card
+    try:
+        failures, statuses, replayed, blob = check_routes(client, requests, args.seed)
+        table, dealt = dealt_position(args.seed)
+    finally:
+        sys.stdout = stdout
+
+    print(f"{args.requests} requests on snap_a (status codes {dict(sorted(statuses.items()))}): "
+          f"{failures} snapshot mismatches")
+    print(f"replayed on snap_c from the first snapshot, ends identical: {replayed}")
+
+    source, target = snapshot.fork(blob), helpers.Table('load_target', '')
+    no_rng = snapshot.fork(blob)
+    no_rng.rng = None
+    timings = (('dump', lambda: snapshot.dump(source)),
+               ('load', lambda: snapshot.load(target, blob)),
+               ('fork', lambda: snapshot.fork(blob)))
+    print(f"snapshot of {len(blob)} bytes ({len(snapshot.dump(no_rng))} without the RNG state), "
+          f"{len(source.shoe)} cards left in the shoe")
+    for label, call in timings:
+        seconds = min(timeit.repeat(call, number=1000, repeat=5)) / 1000
+        print(f"  {label:<6}{seconds * 1e6:>8.1f} us")
+
+    state = table.game_state
+    hand = state['player_hands'][0]['hand']
+    up = helpers.CARD_CODE_VALUES[state['dealer_hand'][1]]
+    advice = advisor.advise(table)
+    basic = strategy.load('basic')
+    rng = random.Random(args.seed)
+    print(f"\n{args.forks} forks per action of {hand.value}{' soft' if hand.soft else ''} against {up}")
+    print(f"{'action':<10}{'monte carlo':>12}{'+-':>7}{'advisor':>9}{'forks/s':>10}")
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        results = []
+        for action in ('stand', 'hit', 'double'):
+            total = squares = 0.0
+            start = time.perf_counter()
+            for _ in range(args.forks):
+                fork = snapshot.fork(dealt)
+                redeal_hole_card(fork, rng)
+                net = play_out(fork, action, basic)
+                total += net
+                squares += net * net
+            elapsed = time.perf_counter() - start
+            mean = total / args.forks
+            error = ((squares / args.forks - mean * mean) / args.forks) ** 0.5
+            results.append((action, mean, error, advice['ev'][action], args.forks / elapsed))
+    finally:
+        sys.stdout = stdout
+    for action, mean, error, ev, rate in results:
+        print(f"{action:<10}{mean:>+12.4f}{error:>7.4f}{ev:>+9.4f}{rate:>10,.0f}")
+    print("(after a hit the advisor plays on composition-dependently, the forks with basic strategy)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Start-up time of the app, from launching Python to serving requests.
+
+Run from the repository root:
+
+    python benchmarks/bench_startup.py [--runs 5]
+
+Starts a fresh interpreter per run, in an empty temporary directory, that
+imports app.py, calls create_app(), serves GET /state through the Flask
+test client, then polls GET /ready until start-up has finished. Median
+times from launching the process are printed, next to what the blocking
+broker connect that start-up used to make (a TCP connect
+to MQTT_BROKER) costs from this machine.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import contextlib, io, json, sys, time
+started = float(sys.argv[1])
+sys.path.insert(0, sys.argv[2])
+marks = {'interpreter': time.time() - started}
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+    marks['import app'] = time.time() - started
+    app.create_app()
+    marks['create_app'] = time.time() - started
+    client = app.app.test_client()
+    client.get('/state')
+    marks['first request'] = time.time() - started
+    while client.get('/ready').status_code != 200:
+        time.sleep(0.001)
+    marks['ready'] = time.time() - started
+print(json.dumps({'marks': marks, 'broker': [app.MQTT_BROKER, app.MQTT_PORT]}))
+"""
+
+
+def run_once():
+    # In an empty directory, so the app starts with a fresh blackjack.db and hand_logs/
+    with tempfile.TemporaryDirectory() as work:
+        output = subprocess.run([sys.executable, '-c', CHILD, repr(time.time()), ROOT], cwd=work,
+                                capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def blocking_connect(broker, port, timeout=10.0):
+    """Seconds a synchronous TCP connect to the broker takes, and whether it worked"""
+    start = time.perf_counter()
+    try:
+        socket.create_connection((broker, port), timeout=timeout).close()
+        ok = True
+    except OSError:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    print(f"{args.runs} runs, median seconds from launching the process:")
+    for mark in runs[0]['marks']:
+        print(f"  {mark:<16}{statistics.median(run['marks'][mark] for run in runs):>8.3f}")
+    broker, port = runs[0]['broker']
+    elapsed, ok = blocking_connect(broker, port)
+    print(f"a blocking connect to {broker}:{port} takes {elapsed:.3f} s here"
+          f" ({'connected' if ok else 'failed'}); start-up no longer waits for it")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark of the write-behind table store.
+
+Run from the repository root:
+
+    python benchmarks/bench_store.py [--tables 20] [--hands 100]
+
+Plays hands round-robin over many tables through the Flask test client
+(/deal, /hit below 17, /stand, /dealer_step), first without persistence
+and then with a store.TableStore on a temporary SQLite file. It prints
+per-request latency for both runs, the cost of TableStore.save on its
+own, and how many saves the batching folded into each row written. A
+second store is then opened on the same file to check that every table
+comes back exactly as it was left.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers  # noqa: E402
+import store  # noqa: E402
+from _common import NullMQTTClient, import_app, percentile  # noqa: E402
+
+blackjack_app = import_app({'HAND_LOG_DIRECTORY': None})
+
+
+def play(prefix, tables, hands):
+    """Request latencies of `hands` hands on each of `tables` tables"""
+    client = blackjack_app.app.test_client()
+    latencies = []
+
+    def post(path):
+        start = time.perf_counter()
+        state = client.post(path).get_json()
+        latencies.append(time.perf_counter() - start)
+        return state
+
+    for _ in range(hands):
+        for number in range(tables):
+            base = f'/table/{prefix}{number}'
+            state = post(base + '/deal')
+            if 'error' in state:
+                client.post(base + '/reset_bank')
+                continue
+            while state.get('game_status') == 'playing':
+                hand = state['player_hands'][state['active_hand_index']]
+                state = post(base + ('/hit' if hand['value'] < 17 else '/stand'))
+            while state.get('game_status') == 'dealer_turn':
+                state = post(base + '/dealer_step')
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tables', type=int, default=20)
+    parser.add_argument('--hands', type=int, default=100, help='Hands per table')
+    args = parser.parse_args()
+
+    blackjack_app.default_connection.use_client(NullMQTTClient())
+    blackjack_app.DEALER_STEP_INTERVAL = 3600.0  # The benchmark steps the dealer itself
+    directory = tempfile.mkdtemp(prefix='store-')
+    path = os.path.join(directory, 'bench.db')
+
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')  # Routes print every card
+    try:
+        blackjack_app.table_store = helpers.table_store = None
+        plain = play('plain', args.tables, args.hands)
+        table_store = store.TableStore(path)
+        blackjack_app.table_store = helpers.table_store = table_store
+        stored = play('stored', args.tables, args.hands)
+        table_store.flush()
+        stats = table_store.stats()
+
+        table = helpers.tables['stored0']
+        table.revision += 1  # Force a save each call
+        save_ns = min(timeit.repeat(lambda: (table_store._saved_revisions.pop('stored0', None),
+                                             table_store.save(table)), number=20000, repeat=5)) / 20000 * 1e9
+        table_store.close()
+
+        reopened = store.TableStore(path)
+        mismatched = []
+        for number in range(args.tables):
+            table_id = f'stored{number}'
+            restored = helpers.Table(table_id, '')
+            helpers.restore_table(restored, reopened.load(table_id))
+            original = helpers.tables[table_id]
+            if (json.dumps(helpers.public_state(restored.game_state), sort_keys=True) !=
+                    json.dumps(helpers.public_state(original.game_state), sort_keys=True)
+                    or restored.shoe != original.shoe):
+                mismatched.append(table_id)
+        reopened.close()
+    finally:
+        sys.stdout = stdout
+        shutil.rmtree(directory)
+
+    print(f"{args.tables} tables x {args.hands} hands, {len(stored)} requests (times in ms)")
+    print(f"{'':<16}{'p50':>8}{'p95':>8}{'p99':>8}{'mean':>8}")
+    for label, samples in (('no store', plain), ('with store', stored)):
+        print(f"{label:<16}" + ''.join(f"{percentile(samples, p) * 1000:>8.3f}" for p in (50, 95, 99))
+              + f"{sum(samples) / len(samples) * 1000:>8.3f}")
+    print(f"TableStore.save: {save_ns / 1000:.2f} us per call")
+    print(f"saves {stats['saves']}, coalesced {stats['coalesced']}, rows written {stats['rows_written']}"
+          f" in {stats['batches']} transactions")
+    print(f"restored tables matching: {args.tables - len(mismatched)}/{args.tables}")
+
+
+if __name__ == '__main__':
+    main()
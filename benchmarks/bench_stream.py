@@ -0,0 +1,81 @@
+"""
+Fan-out benchmark for the per-table state stream.
+
+Run from the repository root:
+
+    python benchmarks/bench_stream.py [--subscribers 2000] [--events 20]
+
+Attaches many idle subscribers to one table's channel, then publishes
+state changes and reports how long it takes until every subscriber has
+received each event. All subscribers receive the very same frame object,
+so a change is serialized once no matter how many are watching.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import events  # noqa: E402
+import helpers  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--subscribers', type=int, default=2000)
+    parser.add_argument('--events', type=int, default=20)
+    args = parser.parse_args()
+
+    threading.stack_size(256 * 1024)
+    channel = events.Channel()
+    state = helpers.Table('bench', 'bench').game_state
+    channel.publish(json.dumps(state))
+
+    received = [0] * (args.events + 1)
+    frames = [set() for _ in range(args.events + 1)]
+    lock = threading.Lock()
+    all_received = threading.Event()
+    ready = threading.Barrier(args.subscribers + 1)
+
+    def subscriber():
+        stream = channel.listen(channel.event_id)
+        next(stream)  # retry hint
+        ready.wait()
+        for _ in range(args.events):
+            frame = next(stream)
+            with lock:
+                event = int(frame.split(b'\n', 1)[0][4:]) - 1
+                # The frame stays referenced by the channel until the next event
+                frames[event].add(id(frame))
+                received[event] += 1
+                if received[event] == args.subscribers:
+                    all_received.set()
+
+    threads = [threading.Thread(target=subscriber, daemon=True) for _ in range(args.subscribers)]
+    for t in threads:
+        t.start()
+    ready.wait()
+    time.sleep(0.2)
+
+    fan_out = []
+    for i in range(args.events):
+        all_received.clear()
+        state['message'] = f"event {i}"
+        start = time.perf_counter()
+        channel.publish(json.dumps(state))
+        all_received.wait(30)
+        fan_out.append(time.perf_counter() - start)
+
+    print(f"{args.subscribers} subscribers, {args.events} events")
+    print(f"  fan-out to all  : median {statistics.median(fan_out) * 1000:8.2f} ms"
+          f"  max {max(fan_out) * 1000:8.2f} ms")
+    print(f"  per subscriber  : {statistics.median(fan_out) / args.subscribers * 1e6:8.2f} us")
+    print(f"  frame objects   : {max(len(f) for f in frames)} per event")
+
+
+if __name__ == '__main__':
+    main()
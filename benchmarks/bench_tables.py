@@ -0,0 +1,183 @@
+"""
+Concurrency benchmark for the multi-table engine.
+
+Run from the repository root:
+
+    python benchmarks/bench_tables.py [--tables 200] [--threads 8] [--hands 50] [--hold-ms 5]
+
+Two measurements are printed:
+
+1. Isolation: one table's lock is held (as a slow request would hold it)
+   while requests are timed on that table and on a different table.
+   Requests on the other table must not wait for it.
+2. Throughput: worker threads play hands through the Flask test client,
+   either all on one shared table or spread over many tables, first as
+   the routes are and then with every request holding its table's lock
+   --hold-ms longer, as a request blocked on I/O would.
+
+Requests that only use the CPU cannot run in parallel under the GIL,
+whatever locks they take, so without the hold spreading the tables gains
+nothing: requests/s come out about the same (either can be ahead from
+run to run), with a longer tail, as every thread is runnable at once and
+they queue for the GIL instead of one table lock. The shared table shows
+more hands/s because its workers get in each other's way: requests are
+rejected (4xx) when another worker's hand is in a different phase, and
+hands are cut short, so compare requests/s and the share rejected. With
+the hold, a shared table serves one request at a time while spread
+tables overlap the waits; that is the gain per-table locks are for.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers  # noqa: E402
+from _common import NullMQTTClient, import_app, percentile  # noqa: E402
+
+blackjack_app = import_app()
+
+
+def play_hand(client, base):
+    """Play one hand (bet, deal, stand, dealer steps); returns (latency, rejected) per request"""
+    requests = []
+
+    def post(path, **kwargs):
+        start = time.perf_counter()
+        response = client.post(base + path, **kwargs)
+        requests.append((time.perf_counter() - start, response.status_code >= 400))
+        return response.get_json()
+
+    post('/set_bet', json={'amount': helpers.MIN_BET})
+    state = post('/deal')
+    if state.get('error'):
+        post('/reset_bank')
+        return requests
+
+    while state.get('game_status') == 'playing':
+        state = post('/stand')
+    while state.get('game_status') == 'dealer_turn':
+        state = post('/dealer_step')
+    return requests
+
+
+def bench_isolation(hold_seconds=0.5, requests=20):
+    """Time /state on a busy table and on an idle one while the busy table is locked"""
+    client = blackjack_app.app.test_client()
+    busy = helpers.get_table('bench_busy', blackjack_app.MQTT_TOPIC_PREFIX)
+    helpers.get_table('bench_idle', blackjack_app.MQTT_TOPIC_PREFIX)
+
+    held = threading.Event()
+
+    def hold_lock():
+        with busy.lock:
+            held.set()
+            time.sleep(hold_seconds)
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    held.wait()
+
+    idle_latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client.get('/table/bench_idle/state')
+        idle_latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    client.get('/table/bench_busy/state')
+    busy_latency = time.perf_counter() - start
+    holder.join()
+
+    print(f"Isolation (busy table locked for {hold_seconds * 1000:.0f} ms):")
+    print(f"  other table  /state  mean {statistics.mean(idle_latencies) * 1000:8.3f} ms"
+          f"  max {max(idle_latencies) * 1000:8.3f} ms")
+    print(f"  locked table /state       {busy_latency * 1000:8.3f} ms")
+
+
+def bench_throughput(table_ids, threads, hands, hold=0.0):
+    """
+    Play `hands` hands on each of `threads` workers, round-robin over
+    table_ids, every request holding its table's lock `hold` seconds more.
+    Returns requests/s, hands/s, share of requests rejected, p50 and p99.
+    """
+    # One hand on every table first: a table's first round sets up its
+    # statistics and state caches, which would be timed for few hands per table
+    client = blackjack_app.app.test_client()
+    for table_id in table_ids:
+        play_hand(client, f'/table/{table_id}')
+
+    finish_action = blackjack_app.finish_action
+    if hold:
+        def slow_finish_action(table):
+            finish_action(table)
+            time.sleep(hold)  # Still under the table lock, see run_action
+        blackjack_app.finish_action = slow_finish_action
+
+    all_requests = []
+    requests_lock = threading.Lock()
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(worker_index):
+        client = blackjack_app.app.test_client()
+        local = []
+        barrier.wait()
+        for hand in range(hands):
+            table_id = table_ids[(worker_index + hand * threads) % len(table_ids)]
+            local.extend(play_hand(client, f'/table/{table_id}'))
+        with requests_lock:
+            all_requests.extend(local)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    try:
+        for w in workers:
+            w.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        blackjack_app.finish_action = finish_action
+
+    latencies = [latency for latency, _ in all_requests]
+    rejected = sum(rejected for _, rejected in all_requests) / len(all_requests)
+    return (len(all_requests) / elapsed, threads * hands / elapsed, rejected,
+            percentile(latencies, 50), percentile(latencies, 99))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tables', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--hands', type=int, default=50)
+    parser.add_argument('--hold-ms', type=float, default=5.0, help='Extra lock hold per request in the second run')
+    args = parser.parse_args()
+
+    blackjack_app.default_connection.use_client(NullMQTTClient())
+    blackjack_app.DEALER_STEP_INTERVAL = 3600.0  # The workers step the dealer themselves
+    bench_isolation()
+
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')  # Routes print every card
+    try:
+        results = []
+        for hold_ms in (0.0, args.hold_ms):
+            for label, table_ids in (('1 shared table', ['bench_shared']),
+                                     (f'{args.tables} tables', [f'bench_{i}' for i in range(args.tables)])):
+                results.append((hold_ms, label, bench_throughput(table_ids, args.threads, args.hands, hold_ms / 1000)))
+    finally:
+        sys.stdout = stdout
+
+    print(f"\nThroughput ({args.threads} threads x {args.hands} hands):")
+    print(f"  {'lock hold':>9}  {'tables':>16}{'requests/s':>12}{'hands/s':>10}{'rejected':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for hold_ms, label, (request_rate, hand_rate, rejected, p50, p99) in results:
+        print(f"  {hold_ms:>6.1f} ms  {label:>16}{request_rate:>12.1f}{hand_rate:>10.1f}{rejected:>10.1%}"
+              f"{p50 * 1000:>9.3f}{p99 * 1000:>9.3f}")
+    print(f"  active tables: {len(helpers.tables)}")
+
+
+if __name__ == '__main__':
+    main()
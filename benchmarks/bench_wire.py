@@ -0,0 +1,146 @@
+"""
+Benchmark of the card-event wire formats.
+
+Run from the repository root:
+
+    python benchmarks/bench_wire.py [--hands 20000]
+
+Plays hands through the helpers actions with basic strategy and records
+the card events each action sends, grouped the way app.py publishes them
+(paced dealer reveals on their own). The events are then sent as
+
+  text       one MQTT message per card, "AH" / "0" (what the devices read)
+  coalesced  one comma-separated text message per action ("AH,TD")
+  binary     wire.py frames with table id, shoe id and sequence numbers
+
+and encode/decode throughput and bytes on the wire are compared. Wire
+bytes count the whole MQTT 3.1.1 PUBLISH packet at QoS 0: fixed header,
+remaining length, topic and payload.
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers  # noqa: E402
+import strategy  # noqa: E402
+import wire  # noqa: E402
+
+TABLE_ID = 'table1'
+TOPIC = 'ece508/blkjck_' + TABLE_ID
+
+
+def record_batches(hands, seed):
+    """Card events of `hands` hands, as lists of (shoe_id, seq, message) per publish"""
+    random.seed(seed)
+    table = helpers.Table(TABLE_ID, TOPIC)
+    batches = []
+    action = []
+    paced = []
+
+    def send(table, message, delay=0.0):
+        # Like app.send_to_arduino: once a reveal is paced, later ones queue behind it
+        event = (table.shoe_id, table.next_seq, message)
+        table.next_seq += 1
+        if delay or paced:
+            paced.append([event])
+        else:
+            action.append(event)
+
+    def end_action():
+        if action:
+            batches.append(list(action))
+            action.clear()
+        batches.extend(paced)
+        paced.clear()
+
+    strat = strategy.load('basic')
+    with contextlib.redirect_stdout(io.StringIO()):
+        helpers.build_shoe(table)
+        send(table, wire.SHUFFLE_MESSAGE)
+        end_action()
+        game_state = table.game_state
+        for _ in range(hands):
+            game_state['bank'] = helpers.STARTING_BANK
+            helpers.start_hand(table, send)
+            end_action()
+            while game_state['game_status'] == 'playing':
+                choice = strategy.next_action(strat, table)
+                if choice == 'H':
+                    helpers.hit(table, send)
+                elif choice == 'D':
+                    helpers.double_down(table, send)
+                elif choice == 'P':
+                    helpers.split_hand(table, send, 0.5)
+                else:
+                    helpers.stand(table)
+                end_action()
+            while game_state['game_status'] == 'dealer_turn':
+                helpers.dealer_step(table, send)
+                end_action()
+    return batches
+
+
+def publish_size(payload):
+    """Bytes of a QoS 0 MQTT PUBLISH packet carrying payload on TOPIC"""
+    remaining = 2 + len(TOPIC.encode()) + len(payload)
+    length_bytes = 1 if remaining < 128 else 2 if remaining < 16384 else 3
+    return 1 + length_bytes + remaining
+
+
+def encoders():
+    """Format name -> function turning one batch into the list of payloads sent"""
+    return {
+        'text': lambda batch: [message.encode() for _, _, message in batch],
+        'coalesced': lambda batch: [','.join(messages).encode()
+                                    for messages in wire.text_batches([message for _, _, message in batch])],
+        'binary': lambda batch: wire.encode_events(TABLE_ID, batch),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--hands', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    batches = record_batches(args.hands, args.seed)
+    events = sum(len(batch) for batch in batches)
+    print(f"{args.hands} hands, {events} card events in {len(batches)} publishes")
+    print(f"{'format':<11}{'messages':>10}{'payload B':>11}{'wire B':>10}{'B/event':>9}"
+          f"{'encode ev/s':>14}{'decode ev/s':>14}")
+
+    for name, encode in encoders().items():
+        start = time.perf_counter()
+        payloads = [payload for batch in batches for payload in encode(batch)]
+        encode_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        decoded = [wire.decode(payload) for payload in payloads]
+        decode_time = time.perf_counter() - start
+
+        cards = sum(len(frame.cards) + frame.shuffle for frame in decoded)
+        assert cards == events, (name, cards, events)
+        payload_bytes = sum(len(payload) for payload in payloads)
+        wire_bytes = sum(publish_size(payload) for payload in payloads)
+        print(f"{name:<11}{len(payloads):>10}{payload_bytes:>11}{wire_bytes:>10}"
+              f"{wire_bytes / events:>9.1f}{events / encode_time:>14,.0f}{events / decode_time:>14,.0f}")
+
+    tracker = wire.SequenceTracker()
+    frames = [wire.decode(frame) for batch in batches for frame in wire.encode_events(TABLE_ID, batch)]
+    in_order = all(tracker.check(frame) for frame in frames)
+    dropped = frames[:len(frames) // 2] + frames[len(frames) // 2 + 1:]
+    gaps = wire.SequenceTracker()
+    for frame in dropped:
+        gaps.check(frame)
+    print(f"binary sequence check: in order {in_order}, gaps {tracker.gaps};"
+          f" with one frame dropped: gaps {gaps.gaps}, events lost {gaps.lost}")
+
+
+if __name__ == '__main__':
+    main()
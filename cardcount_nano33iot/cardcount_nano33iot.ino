@@ -12,7 +12,6 @@
 #include <Adafruit_GFX.h>
 #include <Adafruit_SSD1306.h>
 #include <WiFiNINA.h>
-#include <WiFiSSLClient.h>
 #include <Arduino_JSON.h>
 #include <ArduinoMqttClient.h>
 
@@ -23,10 +22,6 @@
 const char teamNumber[11] = "Team8";
 const char* wifi_ssid = "GuestZ";               // REPLACE
 const char* wifi_pass = "rooster65";            // REPLACE
-
-const char webhookHost[] = "discord.com";
-const int webhookPort = 443;
-const char webhookPath[] = "/api/webhooks/1434709618071703612/7Amx_ltzl0QsI4aSBa1_XJqNyuelmp4YTuAcucVVK9jL5yPut61slkljkB7F3-Aqn9An";
 //*************************************************************
 
 // MQTT Configuration
@@ -34,10 +29,12 @@ const char webhookPath[] = "/api/webhooks/1434709618071703612/7Amx_ltzl0QsI4aSBa
 const char mqttBroker[] = "broker.hivemq.com";
 const int mqttPort = 1883;
 const char subTopic[] = "ece508/blkjck_table1";
+// Alerts go to relay.py, which posts them to Discord: "<kind>,<table>,<value>,<device>"
+const char alertTopic[] = "ece508/blkjck_alerts/table1";
+const char tableName[] = "table1";
+const char deviceName[] = "Player1 (Arduino Nano 33 IoT)";
 //*************************************************************
 
-WiFiSSLClient client;
-
 int statusWiFi = WL_IDLE_STATUS;
 
 #define I2C_ADDRESS 0x3C
@@ -142,19 +139,8 @@ void setup() {
      Serial.println("Subscribed!");
   }
 
-  // Send Discord connection notification
-  long color;
-  String content;
-  String message;
-
-
-  color = 2483968; // Green
-  content = ""; // Ping Users or Roles
-  message = String("Connected to Discord Server\\n\\n MQTT Configuration: \\n") +
-          "`" + String(mqttBroker) + "` \\n `" + String(mqttPort) + "` \\n `" + String(subTopic) + "`";
-
-
-  sendDiscordNotification(buildJsonPayload(message, color, content));
+  // Connection notification
+  sendAlert("connected", "");
 }
 
 
@@ -173,11 +159,6 @@ void onMqttMessage(int messageSize) {
   
   if (msgString.length() > 0) {
     char card = msgString.charAt(0);
-    
-    // Local variables for Discord message
-    long color;
-    String content;
-    String message;
 
     // Hi-Lo
     // A, K, Q, J, T  = -1
@@ -196,10 +177,7 @@ void onMqttMessage(int messageSize) {
         coldAlertSent = true; // Set to true to prevent "back to 0" alert
 
         // Send Shuffle Notification
-        color = 0; // Black
-        content = "";
-        message = "Dealer shuffeled cards! Table's count is reset.";
-        sendDiscordNotification(buildJsonPayload(message, color, content));
+        sendAlert("shuffle", "0");
         break; 
         
       case 'A':
@@ -251,10 +229,7 @@ void onMqttMessage(int messageSize) {
       hotAlertSent = true;
       coldAlertSent = false;
 
-      color = 16732672; // Red Orange
-      content = "<@&1434702820430581892> please join the table.";
-      message = "The running count is __**+5**__! 🔥";
-      sendDiscordNotification(buildJsonPayload(message, color, content)); 
+      sendAlert("hot", String(runningCount));
     }
 
     // Cold alert
@@ -262,10 +237,7 @@ void onMqttMessage(int messageSize) {
       coldAlertSent = true;
       hotAlertSent = false;
 
-      color = 3325951; // Blue
-      content = "";
-      message = "The running count is back to __**0**__. 🥶";
-      sendDiscordNotification(buildJsonPayload(message, color, content));
+      sendAlert("cold", String(runningCount));
     }
   
   } 
@@ -301,53 +273,11 @@ void loop() {
   }
 }
 
-String buildJsonPayload(const String& message, long color, const String& content) {
-  
-
-  convHHMMSS(millis() / 1000, tmpBuffer);
-  String timestampedMessage = message  + "\\n\\n" + "-# Uptime: " + tmpBuffer;
-
-  return "{"
-         "\"content\":\"" + content + "\","
-         "\"embeds\":[{"
-         "\"description\":\"" + timestampedMessage + "\"," // Use the new message
-         "\"color\":" + String(color) + ","
-         "\"author\":{"
-         "\"name\":\"Player1 (Arduino Nano 33 IoT)\","
-         "\"icon_url\":\"https://media.discordapp.net/attachments/1435025106564022465/1436926911988105368/zC60TAAAAAZJREFUAwBJUcPv7WJDOgAAAABJRU5ErkJggg.png?ex=69120ab8&is=6910b938&hm=55dfaa1e127e035e815e00293841f1249d3954615cb62c400133f0f4d0860d06&=&format=webp&quality=lossless\""
-  
-         "}"
-         "}],"
-         "\"username\":\"Le Chiffre\","
-         "\"allowed_mentions\":{\"parse\":[\"roles\"]},"
-         "\"attachments\":[]"
-         "}";
-}
-
-void sendDiscordNotification(String jsonPayload) {
-  Serial.println("Sending Discord notification...");
-
-  if (client.connect(webhookHost, webhookPort)) {
-    client.println("POST " + String(webhookPath) + " HTTP/1.1");
-    client.println("Host: " + String(webhookHost));
-    client.println("Content-Type: application/json");
-    client.println("Content-Length: " + String(jsonPayload.length()));
-    client.println("Connection: close");
-    client.println();
-    client.println(jsonPayload); // Send the payload
-
-    delay(250);
-
-    while (client.available()) {
-      String line = client.readStringUntil('\r');
-      Serial.print(line);
-    }
-
-    client.stop();
-    Serial.println("Discord notification sent!");
-  } else {
-    Serial.println("Failed to connect to Discord webhook");
-  }
+// Publish an alert for relay.py; one short MQTT message instead of an HTTPS call per alert
+void sendAlert(const char* kind, const String& value) {
+  mqttClient.beginMessage(alertTopic);
+  mqttClient.print(String(kind) + "," + tableName + "," + value + "," + deviceName);
+  mqttClient.endMessage();
 }
 
 void displayTextOLED(String oledline[]) {
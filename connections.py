@@ -0,0 +1,150 @@
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+import publisher
+
+# --- MQTT Connections ---
+# One long-lived paho client per broker, shared by every table that sends
+# its cards there; a table's topic is just part of each message, so any
+# number of tables multiplex over one connection. Clients connect and
+# reconnect in paho's network thread, waiting from RECONNECT_MIN_DELAY up
+# to RECONNECT_MAX_DELAY seconds between attempts, so no request ever waits
+# on a broker. While a connection is down its Publisher keeps the frames
+# queued (up to BUFFER_SIZE batches) and sends them in order once it is back.
+#
+# Moving a table to another topic or broker only changes where its next
+# frames go: frames already queued keep their topic and connection and are
+# still delivered. Tables acquire() the connection they use and release()
+# it when they move; once the last table has left a broker, its connection
+# sends what it still has queued (for up to DRAIN_TIMEOUT seconds) and is
+# closed on a background thread.
+
+KEEPALIVE = 60
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+BUFFER_SIZE = 10000  # Batches each connection holds while its broker is unreachable
+DRAIN_TIMEOUT = 30.0  # Seconds a connection no table uses gets to send its queued frames
+
+class Connection:
+    """A paho client kept connected to one broker, and the Publisher that sends through it"""
+
+    def __init__(self, broker, port, qos=0, coalesce=False):
+        self.broker = broker
+        self.port = port
+        self.connects = 0     # Successful (re)connections
+        self.disconnects = 0  # Connections lost after being established
+        self.last_error = None
+        self.users = 0  # Tables that acquired the connection (see ConnectionManager)
+        self.client = mqtt.Client(f"flask_blackjack_{time.time()}")
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.reconnect_delay_set(RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY)
+        self.publisher = publisher.Publisher(self.client, qos=qos, max_queue=BUFFER_SIZE,
+                                             coalesce=coalesce, connected=False)
+        self._loop_running = False
+
+    @property
+    def connected(self):
+        return self.publisher.connected
+
+    def start(self):
+        """Connect in the background and keep reconnecting after every drop"""
+        try:
+            self.client.connect_async(self.broker, self.port, KEEPALIVE)
+            self.client.loop_start()
+            self._loop_running = True
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"MQTT connection to {self.broker}:{self.port} failed: {e}")
+
+    def use_client(self, client):
+        """Send through `client` instead, treating it as connected (for tests and benchmarks)"""
+        self.close()
+        self.publisher.use_client(client)
+        self.publisher.set_connected(True)
+
+    def stats(self):
+        stats = self.publisher.stats()
+        stats.update(broker=self.broker, port=self.port, connects=self.connects,
+                     disconnects=self.disconnects, last_error=self.last_error)
+        return stats
+
+    def retire(self):
+        """Send what is still queued, then close; runs on its own thread"""
+        def run():
+            self.publisher.stop(DRAIN_TIMEOUT)
+            self.close()
+            print(f"MQTT connection to {self.broker}:{self.port} closed, no table uses it")
+        threading.Thread(target=run, name='mqtt-retire', daemon=True).start()
+
+    def close(self):
+        self.publisher.set_connected(False)
+        if self._loop_running:
+            self._loop_running = False
+            self.client.disconnect()
+            self.client.loop_stop()
+
+    def _on_connect(self, client, userdata, flags, rc):
+        """paho callback: a connection attempt finished"""
+        if rc != 0:
+            self.last_error = mqtt.connack_string(rc)
+            print(f"MQTT connection to {self.broker}:{self.port} refused: {self.last_error}")
+            return
+        self.connects += 1
+        self.last_error = None
+        self.publisher.set_connected(True)
+        print(f"MQTT connected to {self.broker}:{self.port}")
+
+    def _on_disconnect(self, client, userdata, rc):
+        """paho callback: the connection closed; paho's loop reconnects unless we asked for it"""
+        if not self.publisher.connected:
+            return
+        self.publisher.set_connected(False)
+        self.disconnects += 1
+        if rc != 0:
+            self.last_error = mqtt.error_string(rc)
+            print(f"MQTT connection to {self.broker}:{self.port} lost ({self.last_error}), reconnecting")
+
+class ConnectionManager:
+    """Connections by (broker, port), opened on first use and retired when no table uses them any more"""
+
+    def __init__(self, qos=0, coalesce=False):
+        self.qos = qos
+        self.coalesce = coalesce
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, broker, port):
+        """The connection to a broker for one more table, connecting in the background if it is new"""
+        key = (broker, port)
+        with self._lock:
+            connection = self._connections.get(key)
+            if connection is None:
+                connection = Connection(broker, port, self.qos, self.coalesce)
+                connection.start()
+                self._connections[key] = connection
+            connection.users += 1
+        return connection
+
+    def release(self, connection):
+        """A table stopped using the connection; retire it if that was the last one"""
+        with self._lock:
+            connection.users -= 1
+            key = (connection.broker, connection.port)
+            if connection.users > 0 or self._connections.get(key) is not connection:
+                return
+            del self._connections[key]
+        connection.retire()
+
+    def connections(self):
+        return list(self._connections.values())
+
+    def stats(self):
+        """Stats of every connection, keyed by "broker:port\""""
+        return {f"{c.broker}:{c.port}": c.stats() for c in self.connections()}
+
+    def close(self):
+        for connection in self.connections():
+            connection.close()
@@ -0,0 +1,197 @@
+"""
+Hi-Lo counting service for the blackjack tables.
+
+Subscribes to the tables' card topics, keeps the running and true count of
+every table the same way the counter devices do (cardcount_*.ino), and
+publishes a compact snapshot per table so the devices only have to show it:
+
+    python counter.py [--broker broker.hivemq.com] [--prefix ece508/blkjck_]
+
+Snapshots go to "<table topic>/count" as "running,true,dealt", e.g.
+"5,1.23,120", at most once per --interval seconds and only for tables whose
+count changed. Binary frames (wire.py) are understood too: a new shoe id
+resets the count even without a "0", and sequence gaps are counted.
+"""
+import argparse
+import struct
+import threading
+import time
+
+import helpers
+import publisher
+import scheduler
+import wire
+
+# --- Hi-Lo Counting ---
+# Tags by the first byte of a card message, like the devices' switch:
+# 2-6 count +1, A and ten-valued cards -1, 7-9 nothing. "0" means the
+# dealer shuffled and resets the count; anything else is ignored.
+SHUFFLE = b'0'[0]
+HI_LO_TAGS = [None] * 256
+for _rank, _tag in zip(helpers.CARD_RANKS, helpers.RANK_HI_LO):
+    HI_LO_TAGS[ord(_rank)] = _tag
+del _rank, _tag
+CODE_TAGS = helpers.CARD_CODE_HI_LO
+
+SNAPSHOT_INTERVAL = 1.0
+SNAPSHOT_SUFFIX = '/count'
+
+class TableCount:
+    """Running count and cards dealt for one table's shoe"""
+
+    __slots__ = ('running', 'dealt', 'changed', 'shoe_id')
+
+    def __init__(self):
+        self.running = 0
+        self.dealt = 0
+        self.changed = True
+        self.shoe_id = None
+
+    def reset(self):
+        self.running = 0
+        self.dealt = 0
+
+    def true_count(self, decks=helpers.NUMBER_OF_DECKS):
+        """Running count per deck remaining, or 0 once the shoe is used up"""
+        decks_remaining = (decks * 52 - self.dealt) / 52
+        return self.running / decks_remaining if decks_remaining > 0 else 0.0
+
+    def snapshot(self, decks=helpers.NUMBER_OF_DECKS):
+        return f"{self.running},{self.true_count(decks):.2f},{self.dealt}"
+
+class CountingService:
+    """
+    Counts every table whose topic starts with `prefix`. Call `start()` to
+    subscribe and begin publishing snapshots; any object with paho's
+    subscribe/publish/on_message interface will do as the client.
+    """
+
+    def __init__(self, client, prefix, interval=SNAPSHOT_INTERVAL, decks=helpers.NUMBER_OF_DECKS):
+        self.client = client
+        self.prefix = prefix
+        self.interval = interval
+        self.decks = decks
+        self.counts = {}  # card topic -> TableCount
+        self.messages = 0
+        self.snapshots = 0
+        self.malformed = 0  # Binary frames dropped because they did not decode
+        self.sequence = wire.SequenceTracker()
+        self._lock = threading.Lock()
+        self._publisher = publisher.Publisher(client)
+        self._running = False
+        client.on_message = self._on_message
+
+    @property
+    def subscription(self):
+        """Topic filter covering every table topic under the prefix's parent level"""
+        parent, _, _ = self.prefix.rpartition('/')
+        return f"{parent}/+" if parent else '+'
+
+    def start(self):
+        self.client.subscribe(self.subscription)
+        self._running = True
+        scheduler.call_later(self.interval, self._publish_snapshots)
+
+    def stop(self):
+        self._running = False
+
+    def _on_message(self, client, userdata, message):
+        topic = message.topic
+        if not topic.startswith(self.prefix):
+            return
+        self.handle(topic, message.payload)
+
+    def handle(self, topic, payload):
+        """Count one message: a card name, "0", comma-separated cards (coalesced) or a binary frame"""
+        with self._lock:
+            count = self.counts.get(topic)
+            if count is None:
+                count = self.counts[topic] = TableCount()
+            self.messages += 1
+            if payload and payload[0] == wire.VERSION:
+                try:
+                    self._handle_frame(count, wire.decode(payload))
+                except (struct.error, IndexError, ValueError) as e:
+                    # Anyone can publish under the prefix; drop the frame, not the callback
+                    self.malformed += 1
+                    print(f"Dropped a malformed frame on {topic}: {e}")
+                return
+            for card in payload.split(b',') if b',' in payload else (payload,):
+                card = card.strip()
+                if not card:
+                    continue
+                if card[0] == SHUFFLE:
+                    count.reset()
+                else:
+                    tag = HI_LO_TAGS[card[0]]
+                    if tag is None:
+                        continue
+                    count.running += tag
+                    count.dealt += 1
+            count.changed = True
+
+    def _handle_frame(self, count, frame):
+        """Must be called with self._lock held; an unknown card code raises IndexError before anything changes"""
+        running = sum(CODE_TAGS[code] for code in frame.cards)
+        if not self.sequence.check(frame):
+            return  # A repeat, or older than what was already counted
+        if frame.shuffle or frame.shoe_id != count.shoe_id:
+            count.reset()
+            count.shoe_id = frame.shoe_id
+        count.running += running
+        count.dealt += len(frame.cards)
+        count.changed = True
+
+    def collect_snapshots(self):
+        """(topic, payload) for every table that changed since the last call"""
+        with self._lock:
+            changed = [(topic, count) for topic, count in self.counts.items() if count.changed]
+            snapshots = []
+            for topic, count in changed:
+                count.changed = False
+                snapshots.append((topic + SNAPSHOT_SUFFIX, count.snapshot(self.decks)))
+        return snapshots
+
+    def _publish_snapshots(self):
+        """Scheduler callback: publish changed counts, then run again after `interval`"""
+        if not self._running:
+            return
+        for topic, payload in self.collect_snapshots():
+            self._publisher.publish(topic, payload)
+            self.snapshots += 1
+        scheduler.call_later(self.interval, self._publish_snapshots)
+
+    def stats(self):
+        return {
+            'tables': len(self.counts),
+            'messages': self.messages,
+            'snapshots': self.snapshots,
+            'malformed_frames': self.malformed,
+            'sequence_gaps': self.sequence.gaps,
+            'events_lost': self.sequence.lost,
+            'stale_frames': self.sequence.stale,
+            'publisher': self._publisher.stats(),
+        }
+
+def main():
+    import paho.mqtt.client as mqtt
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--broker', default='broker.hivemq.com')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--prefix', default='ece508/blkjck_', help='Card topic prefix of the tables')
+    parser.add_argument('--interval', type=float, default=SNAPSHOT_INTERVAL,
+                        help='Seconds between count snapshots')
+    args = parser.parse_args()
+
+    client = mqtt.Client("blackjack_counter_" + str(time.time()))
+    service = CountingService(client, args.prefix, args.interval)
+    # Subscribe again on every (re)connect; the broker forgets clean sessions
+    client.on_connect = lambda client, userdata, flags, rc: client.subscribe(service.subscription)
+    client.connect(args.broker, args.port, 60)
+    service.start()
+    print(f"Counting {service.subscription} on {args.broker}:{args.port}")
+    client.loop_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import threading
+
+# --- Server-Sent Events ---
+# Each table has one Channel holding the latest state as an already
+# formatted SSE frame. A change is serialized once and every subscriber
+# streams the same bytes; idle subscribers just wait on the condition.
+# Subscribers that fall behind skip straight to the newest state.
+
+KEEPALIVE_SECONDS = 15.0
+
+class Channel:
+    """Latest serialized state of one table, fanned out to every subscriber"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self.event_id = 0
+        self.frame = None
+        self.subscribers = 0
+
+    def publish(self, data):
+        """Store a JSON string as the newest event and wake all subscribers"""
+        with self._condition:
+            self.event_id += 1
+            self.frame = f"id: {self.event_id}\ndata: {data}\n\n".encode()
+            self._condition.notify_all()
+
+    def listen(self, last_event_id=0):
+        """
+        Generator of SSE frames for one subscriber, starting with the newest
+        event unless the client already has it. Sends a comment line as a
+        keep-alive so dead connections are noticed.
+        """
+        with self._condition:
+            self.subscribers += 1
+        try:
+            yield b"retry: 2000\n\n"
+            while True:
+                with self._condition:
+                    if self.event_id == last_event_id:
+                        self._condition.wait(KEEPALIVE_SECONDS)
+                    frame = self.frame if self.event_id != last_event_id else None
+                    last_event_id = self.event_id
+                yield frame if frame is not None else b": keep-alive\n\n"
+        finally:
+            with self._condition:
+                self.subscribers -= 1
@@ -0,0 +1,398 @@
+"""
+Append-only hand history for the blackjack tables.
+
+Every card dealt, player action and settlement of a table is recorded as
+a fixed-size binary record in `<directory>/<table id>/`, split into
+segment files of SEGMENT_RECORDS records. Routes only queue a tuple;
+a background writer packs and appends them every FLUSH_INTERVAL seconds.
+
+Replay and statistics read the segments through mmap:
+
+    python handlog.py stats hand_logs/table1
+    python handlog.py replay hand_logs/table1 --round 1234
+
+Statistics (win rate by player total, EV by true count) require numpy.
+"""
+import argparse
+import atexit
+import collections
+import mmap
+import os
+import struct
+import threading
+import time
+
+# --- Record Format ---
+# Records are 16 bytes, little-endian:
+#
+#   offset  size  field
+#   0       1     kind (see below)
+#   1       1     code: card code, action or outcome
+#   2       1     hand: player hand index, or DEALER
+#   3       1     value: the hand's value after the event (before it, for actions)
+#   4       4     round: number of the round on this table, counting up
+#   8       4     amount: bet or net result in dollars (signed)
+#   12      2     cards left in the shoe when the record was made
+#   14      2     Hi-Lo running count of the shoe at that time (signed)
+#
+# Every INDEX_INTERVAL-th record of a segment, starting with the first, is
+# an INDEX record holding the round of the record after it, the unix time
+# it was written and (in the cards field) the interval itself, so a reader
+# can find a round by bisecting segments and index records without
+# scanning everything in between.
+
+RECORD = struct.Struct('<BBBBIiHh')
+RECORD_SIZE = RECORD.size
+VERSION = 1
+
+INDEX = 0     # code: VERSION, amount: unix time, cards: the index interval
+ROUND = 1     # A round starts; amount: the bet, shoe fields from before the deal
+CARD = 2      # A card went to `hand`
+ACTION = 3    # The player acted on `hand`; amount: the hand's bet afterwards
+SETTLE = 4    # `hand` was settled; code: outcome, amount: net win or loss
+SHUFFLE = 5   # The table started a new shoe
+KIND_NAMES = ('index', 'round', 'card', 'action', 'settle', 'shuffle')
+
+DEALER = 255
+HIT, STAND, DOUBLE, SPLIT = range(4)
+ACTION_NAMES = ('hit', 'stand', 'double', 'split')
+LOSE, PUSH, WIN, BLACKJACK = range(4)
+OUTCOME_NAMES = ('lose', 'push', 'win', 'blackjack')
+
+SEGMENT_RECORDS = 1 << 20  # 16 MiB segment files
+INDEX_INTERVAL = 4096  # At most 65535, it is stored in 16 bits
+FLUSH_INTERVAL = 0.5
+SEGMENT_SUFFIX = '.hlog'
+
+# --- Writing ---
+
+class HandLog:
+    """
+    Hand history of one table. `append(record)` only queues a tuple in
+    RECORD order, so it is safe and cheap to call from request handlers
+    while holding the table lock; the shared writer thread does the packing
+    and file I/O.
+    """
+
+    def __init__(self, directory, segment_records=SEGMENT_RECORDS, index_interval=INDEX_INTERVAL):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.index_interval = index_interval
+        self.records = 0  # Written so far by this process, index records included
+        self._queue = collections.deque()
+        # deque.append is atomic, so producers need no lock, and binding it
+        # directly saves a Python call per record
+        self.append = self._queue.append
+        self._write_lock = threading.Lock()
+        self._closed = False
+
+        # Nothing is created or held open until there is something to write:
+        # flush() opens the current segment, appends and closes it again, and
+        # leaves a new log's shuffle records queued until its first round, so
+        # a table that is only ever looked at costs no directory and no fd
+        paths = segment_paths(directory) if os.path.isdir(directory) else []
+        self._started = bool(paths)
+        self._segment = len(paths) - 1 if paths else 0
+        self._file = None  # Only open inside flush()
+        self._position = 0  # Records in the current segment, known once it has been opened
+        self.last_round = 0
+        if paths:
+            with open(paths[-1], 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size >= RECORD_SIZE:
+                    f.seek(size - size % RECORD_SIZE - RECORD_SIZE)
+                    self.last_round = RECORD.unpack(f.read(RECORD_SIZE))[4]
+
+    def pending(self):
+        return len(self._queue)
+
+    def flush(self):
+        """Write every queued record (called by the writer thread and on exit)"""
+        with self._write_lock:
+            queue = self._queue
+            if not queue or self._closed:
+                return
+            if not self._started:
+                if all(record[0] == SHUFFLE for record in queue):
+                    return
+                self._started = True
+            self._open_segment(self._segment)
+            try:
+                pack = RECORD.pack
+                chunk = bytearray()
+                for _ in range(len(queue)):
+                    record = queue.popleft()
+                    if self._position == self.segment_records:
+                        self._file.write(chunk)
+                        chunk = bytearray()
+                        self._open_segment(self._segment + 1)
+                    if self._position % self.index_interval == 0:
+                        chunk += pack(INDEX, VERSION, 0, 0, record[4], int(time.time()),
+                                      self.index_interval, 0)
+                        self._position += 1
+                        self.records += 1
+                    chunk += pack(*record)
+                    self._position += 1
+                    self.records += 1
+                self._file.write(chunk)
+            finally:
+                self._file.close()
+                self._file = None
+
+    def close(self):
+        self.flush()
+        with _logs_lock:
+            if self in _logs:
+                _logs.remove(self)
+        with self._write_lock:
+            self._closed = True
+
+    def _open_segment(self, segment):
+        """Must be called with self._write_lock held"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        os.makedirs(self.directory, exist_ok=True)
+        self._segment = segment
+        path = os.path.join(self.directory, f"{segment:06d}{SEGMENT_SUFFIX}")
+        self._file = open(path, 'ab')
+        size = self._file.tell()
+        if size % RECORD_SIZE:
+            # A record cut short by a crash; drop it so the segment stays aligned
+            self._file.truncate(size - size % RECORD_SIZE)
+            self._file.seek(0, os.SEEK_END)
+        self._position = self._file.tell() // RECORD_SIZE
+
+_logs = []
+_logs_lock = threading.Lock()
+_writer = None
+
+def open_log(directory, table_id, **options):
+    """The hand log for a table under `directory`, flushed by the shared writer thread"""
+    global _writer
+
+    log = HandLog(os.path.join(directory, table_id), **options)
+    with _logs_lock:
+        _logs.append(log)
+        if _writer is None:
+            _writer = threading.Thread(target=_run, name='hand-log', daemon=True)
+            _writer.start()
+    return log
+
+def flush_all():
+    with _logs_lock:
+        logs = list(_logs)
+    for log in logs:
+        try:
+            log.flush()
+        except OSError as e:
+            print(f"Hand log {log.directory} write failed: {e}")
+
+def _run():
+    """Writer loop: flush every open log each FLUSH_INTERVAL seconds"""
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        flush_all()
+
+atexit.register(flush_all)
+
+# --- Reading ---
+
+def segment_paths(directory):
+    """A table log's segment files in order"""
+    names = sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+    return [os.path.join(directory, name) for name in names]
+
+def _map(path):
+    """A read-only mmap of a segment, or None if it is empty"""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < RECORD_SIZE:
+            return None
+        return mmap.mmap(f.fileno(), size - size % RECORD_SIZE, access=mmap.ACCESS_READ)
+
+def records(directory, start=None):
+    """
+    Every record of a table log as a tuple in RECORD order, index records
+    included. With `start`, begin at the index record nearest before round
+    `start` instead of the beginning.
+    """
+    paths = segment_paths(directory)
+    first_segment, first_record = _seek(paths, start) if start is not None else (0, 0)
+    for number, path in enumerate(paths[first_segment:], first_segment):
+        mapped = _map(path)
+        if mapped is None:
+            continue
+        # Left to the garbage collector to unmap: the caller may stop early
+        # while the iterator still holds the buffer
+        offset = first_record * RECORD_SIZE if number == first_segment else 0
+        yield from RECORD.iter_unpack(memoryview(mapped)[offset:])
+
+def _seek(paths, round_id):
+    """(segment, record) of the last index record before round_id"""
+    heads = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            head = f.read(RECORD_SIZE)
+        heads.append(RECORD.unpack(head) if len(head) == RECORD_SIZE else None)
+    segment = max(0, _bisect_before([head[4] if head else 0 for head in heads], round_id))
+
+    mapped = _map(paths[segment]) if paths else None
+    if mapped is None:
+        return segment, 0
+    with mapped:
+        positions = range(0, len(mapped) // RECORD_SIZE, heads[segment][6])
+        rounds = [RECORD.unpack_from(mapped, position * RECORD_SIZE)[4] for position in positions]
+    return segment, positions[max(0, _bisect_before(rounds, round_id))]
+
+def _bisect_before(sorted_rounds, round_id):
+    """Index of the last entry below round_id (entries are the round of the following record)"""
+    low, high = 0, len(sorted_rounds)
+    while low < high:
+        middle = (low + high) // 2
+        if sorted_rounds[middle] < round_id:
+            low = middle + 1
+        else:
+            high = middle
+    return low - 1
+
+def rounds(directory, start=None):
+    """Replay a table log as (round, [records]) per round, without index records"""
+    current = None
+    batch = []
+    for record in records(directory, start):
+        kind, round_id = record[0], record[4]
+        if kind == INDEX or (start is not None and round_id < start):
+            continue
+        if round_id != current:
+            if batch:
+                yield current, batch
+            current, batch = round_id, []
+        batch.append(record)
+    if batch:
+        yield current, batch
+
+def describe(record):
+    """A readable line for one record"""
+    kind, code, hand, value, round_id, amount, cards_left, count = record
+    who = 'dealer' if hand == DEALER else f"hand {hand + 1}"
+    if kind == CARD:
+        import helpers
+        detail = f"{helpers.CARD_NAMES[code]} to {who}, value {value}"
+    elif kind == ACTION:
+        detail = f"{ACTION_NAMES[code]} on {who} at {value}, bet {amount}"
+    elif kind == SETTLE:
+        detail = f"{who} {OUTCOME_NAMES[code]} with {value}, net {amount:+d}"
+    elif kind == ROUND:
+        detail = f"bet {amount}"
+    else:
+        detail = ''
+    return f"{round_id:>8} {KIND_NAMES[kind]:<8}{detail:<40} shoe {cards_left:>3} count {count:+d}"
+
+# --- Statistics ---
+
+def record_array(directory):
+    """All records of a table log as one numpy structured array"""
+    import numpy as np
+
+    dtype = np.dtype([('kind', 'u1'), ('code', 'u1'), ('hand', 'u1'), ('value', 'u1'),
+                      ('round', '<u4'), ('amount', '<i4'), ('cards_left', '<u2'), ('count', '<i2')])
+    arrays = []
+    for path in segment_paths(directory):
+        mapped = _map(path)
+        if mapped is not None:
+            # Copy out of the map so it can be closed; one pass at memory speed
+            arrays.append(np.frombuffer(mapped, dtype=dtype).copy())
+            mapped.close()
+    return np.concatenate(arrays) if arrays else np.zeros(0, dtype=dtype)
+
+def statistics(directory, max_true_count=6):
+    """
+    Win rate by the player's final total and EV per dollar bet by the true
+    count at the start of the round (Hi-Lo running count per deck left,
+    truncated toward zero and clipped to +-max_true_count).
+    """
+    import numpy as np
+
+    data = record_array(directory)
+    settles = data[data['kind'] == SETTLE]
+    starts = data[data['kind'] == ROUND]
+
+    by_total = {}
+    totals = np.minimum(settles['value'], 22)  # Every bust total counts as 22
+    won = np.isin(settles['code'], (WIN, BLACKJACK))
+    pushed = settles['code'] == PUSH
+    for total in np.unique(totals):
+        mask = totals == total
+        by_total['bust' if total == 22 else int(total)] = {
+            'hands': int(mask.sum()),
+            'win_rate': float(won[mask].mean()),
+            'push_rate': float(pushed[mask].mean()),
+        }
+
+    # Net result of every round, matched to its ROUND record by round number
+    order = np.argsort(starts['round'], kind='stable')
+    starts = starts[order]
+    position = np.searchsorted(starts['round'], settles['round'])
+    position = np.minimum(position, max(len(starts) - 1, 0))
+    matched = len(starts) > 0
+    if matched:
+        matched = starts['round'][position] == settles['round']
+    net = np.zeros(len(starts), dtype=np.int64)
+    np.add.at(net, position[matched], settles['amount'][matched])
+    # Rounds abandoned by a new deal before they were settled say nothing about EV
+    settled = np.zeros(len(starts), dtype=bool)
+    settled[position[matched]] = True
+    starts, net = starts[settled], net[settled]
+
+    decks_left = np.maximum(starts['cards_left'], 1) / 52
+    true_counts = np.clip(np.trunc(starts['count'] / decks_left), -max_true_count, max_true_count)
+    by_true_count = {}
+    for true_count in np.unique(true_counts):
+        mask = true_counts == true_count
+        by_true_count[int(true_count)] = {
+            'rounds': int(mask.sum()),
+            'ev': float(net[mask].sum() / max(starts['amount'][mask].sum(), 1)),
+        }
+
+    return {
+        'records': len(data),
+        'rounds': len(starts),
+        'hands': len(settles),
+        'by_total': by_total,
+        'by_true_count': by_true_count,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    stats_parser = commands.add_parser('stats', help='Win rate by total and EV by true count')
+    stats_parser.add_argument('directory', help='One table log, e.g. hand_logs/table1')
+    replay_parser = commands.add_parser('replay', help='Print the records of some rounds')
+    replay_parser.add_argument('directory')
+    replay_parser.add_argument('--round', type=int, default=None, help='First round to print')
+    replay_parser.add_argument('--count', type=int, default=10, help='Rounds to print')
+    args = parser.parse_args()
+
+    if args.command == 'replay':
+        for number, (_, batch) in enumerate(rounds(args.directory, args.round)):
+            if number == args.count:
+                break
+            for record in batch:
+                print(describe(record))
+        return
+
+    start = time.perf_counter()
+    stats = statistics(args.directory)
+    elapsed = time.perf_counter() - start
+    print(f"{stats['records']} records, {stats['rounds']} rounds, {stats['hands']} hands"
+          f" read in {elapsed:.2f} s")
+    print(f"{'total':>6}{'hands':>10}{'win %':>8}{'push %':>8}")
+    for total, row in stats['by_total'].items():
+        print(f"{total:>6}{row['hands']:>10}{row['win_rate'] * 100:>8.1f}{row['push_rate'] * 100:>8.1f}")
+    print(f"{'TC':>6}{'rounds':>10}{'EV %':>8}")
+    for true_count, row in stats['by_true_count'].items():
+        print(f"{true_count:>+6}{row['rounds']:>10}{row['ev'] * 100:>8.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,11 @@
+import collections
+import json
 import random
 import threading
-import time
+import events
+import handlog
+import metrics
+import statediff
 
 # --- Card Configuration ---
 CARD_RANKS = ['A', 'K', 'Q', 'J', 'T', '9', '8', '7', '6', '5', '4', '3', '2']
@@ -9,22 +14,177 @@ CARD_VALUES = {
     'A': 11, 'K': 10, 'Q': 10, 'J': 10, 'T': 10,
     '9': 9, '8': 8, '7': 7, '6': 6, '5': 5, '4': 4, '3': 3, '2': 2
 }
+# Cards are coded 0-51, suit by suit in CARD_RANKS order, so a shoe is a
+# bytearray and a card's rank, value and name are table lookups. Names are
+# only produced where cards leave the server: state JSON and MQTT messages.
+CARD_NAMES = [f"{rank}{suit}" for suit in CARD_SUITS for rank in CARD_RANKS]
+CARD_CODES = {name: code for code, name in enumerate(CARD_NAMES)}
+CARD_CODE_RANKS = bytes(code % len(CARD_RANKS) for code in range(len(CARD_NAMES)))
+_RANK_TRANSLATION = CARD_CODE_RANKS.ljust(256, b'\xff')  # bytes.translate table: card code -> rank
+CARD_CODE_VALUES = bytes(CARD_VALUES[CARD_RANKS[rank]] for rank in CARD_CODE_RANKS)
+# Hi-Lo tags: 2-6 count +1, aces and ten-valued cards -1, 7-9 nothing
+RANK_HI_LO = tuple(1 if CARD_VALUES[rank] <= 6 else -1 if CARD_VALUES[rank] >= 10 else 0
+                   for rank in CARD_RANKS)
+CARD_CODE_HI_LO = tuple(RANK_HI_LO[rank] for rank in CARD_CODE_RANKS)
+ACE = 11
 NUMBER_OF_DECKS = 6
 MIN_BET = 10
 STARTING_BANK = 1000
+DEALER_REVEAL_DELAY = 2.0  # Seconds between dealer cards shown on the physical table
+DEALER_STANDS_ON = 17  # Dealer draws below this value and stands on it, soft or hard
+
+# --- Tables ---
+DEFAULT_TABLE_ID = 'table1'
+MAX_TABLE_ID_LENGTH = 32
+STATE_HISTORY = 32  # Past revisions kept per table to answer patch requests
+
+class Table:
+    """One independent blackjack table with its own state, shoe, lock and MQTT topic"""
+
+    def __init__(self, table_id, topic):
+        self.table_id = table_id
+        self.topic = topic
+        self.lock = threading.RLock()
+        # Monotonic time of the last card reveal queued for the physical table
+        self.reveal_at = 0.0
+        self.reveals_pending = 0
+        # MQTT card events produced by the current request, published when it
+        # ends, and its paced reveals as (due, event), scheduled when it ends
+        self.outbox = []
+        self.paced = []
+        # Sequence number of the next card event sent to the table, and the
+        # wire format its topic uses (None: the app's default)
+        self.next_seq = 0
+        self.wire_format = None
+        # connections.Connection to the broker the topic lives on, acquired
+        # for this table, or None for the app's default; and the QoS of its
+        # cards, or None for the connection's default
+        self.connection = None
+        self.qos = None
+        # State change stream for server-sent events
+        self.channel = events.Channel()
+        self.dealer_turn_scheduled = False
+        self.streamed_revision = 0
+        # Versioned state: the revision increases whenever the serialized state changes
+        self.revision = 0
+        self.state_body = None  # game_state as JSON, without the revision
+        self.state_json = None  # Response body for the current revision
+        self.history = collections.deque(maxlen=STATE_HISTORY)
+        self.shoe = bytearray()
+        self.shoe_id = 0  # Counts up each time a shoe is built for this table
+        self.rng = None  # random.Random shuffling this table's shoes instead of the shoe factory
+        self.log_shoes = True  # Print every shoe built; off for private tables playing many rounds
+        # Cards of each rank (indexed like CARD_RANKS) left in the shoe
+        self.rank_counts = [0] * len(CARD_RANKS)
+        self.running_count = 0  # Hi-Lo count of the cards dealt from the shoe
+        # Hand history (handlog.HandLog), or None; rounds are numbered for it
+        self.hand_log = None
+        self.round_id = 0
+        # Session statistics (analytics.SessionStats) settled rounds are
+        # recorded in, or None; the true count the current round was dealt
+        # at, and rounds settled by the current request, recorded when it ends
+        self.stats = None
+        self.round_true_count = 0.0
+        self.settled_rounds = []
+        self.game_state = {}
+        reset_game_state(self)
+
+CARDS_DEALT = metrics.Counter('blackjack_cards_dealt_total', 'Cards dealt from the shoes of all tables')
+SHOES_BUILT = metrics.Counter('blackjack_shoes_built_total', 'Shoes built, by cause', ('cause',))
+
+tables = {}
+tables_lock = threading.Lock()
+hand_log_directory = None  # Set to keep a hand history for every table created afterwards
+shoe_factory = None  # A shoes.ShoeFactory to take shuffled shoes from; None shuffles on the spot
+table_store = None  # A store.TableStore new tables are restored from; None starts them fresh
+session_stats = None  # An analytics.SessionStats tables created afterwards record their rounds in
+mqtt_connections = None  # The connections.ConnectionManager tables on their own broker take connections from
+
+def is_valid_table_id(table_id):
+    """Table ids are short and limited to letters, digits, '-' and '_'"""
+    return (0 < len(table_id) <= MAX_TABLE_ID_LENGTH and
+            all(c.isascii() and (c.isalnum() or c in '-_') for c in table_id))
+
+def get_table(table_id, topic_prefix):
+    """Return the table for table_id, creating it with a fresh shoe on first use"""
+    table = tables.get(table_id)
+    if table is None:
+        # Only table creation takes the registry lock; lookups stay lock-free
+        with tables_lock:
+            table = tables.get(table_id)
+            if table is None:
+                table = Table(table_id, topic_prefix + table_id)
+                if hand_log_directory is not None:
+                    table.hand_log = handlog.open_log(hand_log_directory, table_id)
+                    table.round_id = table.hand_log.last_round
+                table.stats = session_stats
+                saved = table_store.load(table_id) if table_store is not None else None
+                if saved is not None:
+                    restore_table(table, saved)
+                else:
+                    build_shoe(table)
+                table.game_state['cards_remaining'] = len(table.shoe)
+                commit_state(table)
+                tables[table_id] = table
+    return table
+
+def restore_table(table, saved):
+    """Put a table back as store.TableStore saved it: its MQTT settings, public state and shoe"""
+    with table.lock:
+        round_id = table.round_id
+        load_saved_state(table, saved)
+        table.round_id = max(round_id, table.round_id)
+    state = table.game_state
+    print(f"[{table.table_id}] Restored: {state['game_status']}, bank ${state['bank']},"
+          f" {len(table.shoe)} cards in the shoe")
+
+def load_saved_state(table, saved):
+    """Replace the table's MQTT settings, state, shoe and revision with a saved row; hold the table's lock"""
+    state = json.loads(saved['state'])
+    mqtt = json.loads(saved['mqtt'])
+    table.topic = saved['topic']
+    table.qos = mqtt.get('qos')
+    table.wire_format = mqtt.get('wire_format')
+    set_broker(table, tuple(mqtt['broker']) if mqtt.get('broker') else None)
+    state['dealer_hand'] = Hand(CARD_CODES[name] for name in state['dealer_hand'])
+    for hand in state['player_hands']:
+        hand['hand'] = Hand(CARD_CODES[name] for name in hand['hand'])
+    _set_shoe(table, bytearray(saved['shoe']))
+    table.shoe_id = saved['shoe_id']
+    table.round_id = saved['round_id']
+    table.next_seq = saved['next_seq']
+    table.game_state.clear()
+    table.game_state.update(state)
+    # Revisions this table went through since may not be the saved ones
+    table.history.clear()
+    _set_revision(table, saved['revision'], saved['state'])
+
+def table_broker(table):
+    """(broker, port) of the table's own MQTT connection, or None if it uses the app's default"""
+    connection = table.connection
+    return None if connection is None else (connection.broker, connection.port)
+
+def set_broker(table, broker):
+    """
+    Send the table's cards through its own broker, a (broker, port) pair
+    taken from mqtt_connections, or the app's default with None; the
+    connection it used before is released. Hold the table's lock.
+    """
+    if broker == table_broker(table):
+        return
+    old_connection = table.connection
+    table.connection = None if broker is None or mqtt_connections is None else mqtt_connections.acquire(*broker)
+    if old_connection is not None:
+        mqtt_connections.release(old_connection)
 
 # --- Game State ---
-game_state = {}
-current_shoe = []
-shoe_lock = threading.Lock()
-
-def reset_game_state():
-    """Helper to initialize or reset the game state"""
-    global game_state
-    game_state = {
+def reset_game_state(table):
+    """Helper to initialize or reset the game state of a table"""
+    table.game_state.clear()
+    table.game_state.update({
         'player_hands': [],
         'active_hand_index': -1,
-        'dealer_hand': [],
+        'dealer_hand': Hand(),
         'dealer_value': 0,
         'dealer_hidden': True,
         'game_status': 'waiting',
@@ -33,68 +193,428 @@ def reset_game_state():
         'can_double': False,
         'current_bet': MIN_BET,
         'bank': STARTING_BANK,
-        'cards_remaining': len(current_shoe)
-    }
+        'cards_remaining': len(table.shoe)
+    })
+
+def card_names(cards):
+    """Names of a list of card codes"""
+    return [CARD_NAMES[card] for card in cards]
+
+def log_event(table, kind, code=0, hand=0, value=0, amount=0):
+    """Record an event in the table's hand history, if it keeps one (see handlog.py)"""
+    if table.hand_log is not None:
+        table.hand_log.append((kind, code, hand, value, table.round_id, amount,
+                               len(table.shoe), table.running_count))
+
+def log_card(table, hand_index, hand):
+    """Record the card just added to `hand`; hand_index is handlog.DEALER for the dealer"""
+    if table.hand_log is not None:
+        table.hand_log.append((handlog.CARD, hand[-1], hand_index, hand.value, table.round_id, 0,
+                               len(table.shoe), table.running_count))
+
+def record_round(table, settled):
+    """Keep a settled round, (outcome, bet, net, value) per hand, for the table's session statistics"""
+    if table.stats is not None:
+        table.settled_rounds.append((table.round_true_count, settled))
+
+def record_stats(table):
+    """Record the rounds the current request settled in the table's session statistics"""
+    for true_count, settled in table.settled_rounds:
+        table.stats.record(table.table_id, true_count, settled)
+    table.settled_rounds = []
+
+def public_state(game_state):
+    """The game state as served to clients, with card names instead of codes"""
+    state = dict(game_state)
+    state['dealer_hand'] = card_names(game_state['dealer_hand'])
+    state['player_hands'] = [dict(hand, hand=card_names(hand['hand']))
+                             for hand in game_state['player_hands']]
+    return state
+
+def commit_state(table):
+    """
+    Serialize the table's state and bump its revision if it changed since
+    the last commit. Returns the JSON for the current revision, which is
+    cached so unchanged tables are serialized only once.
+    """
+    body = json.dumps(public_state(table.game_state), sort_keys=True, separators=(',', ':'))
+    if body != table.state_body:
+        _set_revision(table, table.revision + 1, body)
+    return table.state_json
+
+def touch_state(table):
+    """
+    Give the table a new revision of the same state, for a change that is
+    saved with the state but not part of it (its MQTT settings); hold the
+    table's lock.
+    """
+    commit_state(table)
+    _set_revision(table, table.revision + 1, table.state_body)
+
+def _set_revision(table, revision, body):
+    """Make `body` (a commit_state serialization) the table's state at `revision`"""
+    table.revision = revision
+    table.state_body = body
+    table.state_json = f'{body[:-1]},"revision":{revision}}}'
+    table.history.append((revision, json.loads(body)))
+
+def state_patch(table, since):
+    """
+    JSON Patch operations from revision `since` to the current revision,
+    or None if that revision is too old (or unknown) to diff against.
+    """
+    for revision, snapshot in table.history:
+        if revision == since:
+            return statediff.diff(snapshot, table.history[-1][1])
+    return None
+
+# --- Hands ---
+# A hand's value follows from its hard total (every ace counted as 1) and
+# whether it holds an ace: one ace counts as 11 whenever that keeps the hand
+# at 21 or under. Both are kept as cards come and go, and the value is read
+# from a table indexed by [holds an ace][hard total].
+CARD_CODE_HARD_VALUES = bytes(1 if value == ACE else value for value in CARD_CODE_VALUES)
+MAX_HARD_TOTAL = 31  # A hard 20 hitting a ten is 30; the dealer stops drawing sooner
+HAND_VALUES = (
+    tuple(range(MAX_HARD_TOTAL + 1)),
+    tuple(total + 10 if total + 10 <= 21 else total for total in range(MAX_HARD_TOTAL + 1)),
+)
+
+class Hand:
+    """The card codes of one hand, with O(1) value, bust, blackjack and soft queries"""
+
+    __slots__ = ('cards', 'hard_total', 'aces')
+
+    def __init__(self, cards=()):
+        self.cards = []
+        self.hard_total = 0
+        self.aces = 0
+        for card in cards:
+            self.append(card)
+
+    def append(self, card):
+        self.cards.append(card)
+        self.hard_total += CARD_CODE_HARD_VALUES[card]
+        self.aces += CARD_CODE_VALUES[card] == ACE
+
+    def pop(self):
+        """Remove and return the last card, as a split does"""
+        card = self.cards.pop()
+        self.hard_total -= CARD_CODE_HARD_VALUES[card]
+        self.aces -= CARD_CODE_VALUES[card] == ACE
+        return card
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __iter__(self):
+        return iter(self.cards)
+
+    def __getitem__(self, index):
+        return self.cards[index]
+
+    @property
+    def value(self):
+        return HAND_VALUES[self.aces > 0][self.hard_total]
+
+    @property
+    def soft(self):
+        """True if an ace is counted as 11"""
+        return self.value != self.hard_total
+
+    @property
+    def is_bust(self):
+        return self.hard_total > 21
 
-def calculate_hand_value(hand):
-    """Calculate the value of a hand, adjusting for aces"""
-    value = 0
-    aces = 0
+    @property
+    def is_blackjack(self):
+        return len(self.cards) == 2 and self.value == 21
+
+    @property
+    def is_soft_17(self):
+        return self.value == 17 and self.hard_total == 7
+
+    @property
+    def pair_value(self):
+        """Value of the cards if the hand is two cards of equal value, otherwise 0"""
+        if len(self.cards) == 2:
+            value = CARD_CODE_VALUES[self.cards[0]]
+            if value == CARD_CODE_VALUES[self.cards[1]]:
+                return value
+        return 0
+
+def _build_shoe_internal():
+    """
+    Internal helper to build shoe without locking. Returns a list of card
+    codes: shuffling a list is faster than shuffling the bytearray in place.
+    """
+    return list(range(len(CARD_NAMES))) * NUMBER_OF_DECKS
+
+def _set_shoe(table, shoe):
+    """Make a partly dealt `shoe` the table's, recounting its ranks; hold the table's lock"""
+    ranks = shoe.translate(_RANK_TRANSLATION)
+    counts = [ranks.count(rank) for rank in range(len(CARD_RANKS))]
+    table.shoe = shoe
+    table.rank_counts = counts
+    # A full shoe counts to zero, so the dealt cards count minus what is left
+    table.running_count = -sum(map(int.__mul__, RANK_HI_LO, counts))
+
+def load_shoe(table, shoe):
+    """Make `shoe` (a bytearray of card codes, dealt from the end) the table's shoe"""
+    with table.lock:
+        _set_shoe(table, shoe)
+        table.shoe_id += 1
+        table.game_state['cards_remaining'] = len(table.shoe)
+        log_event(table, handlog.SHUFFLE)
+
+def _shuffled_shoe(table):
+    """A new shuffled shoe for the table, from its own RNG or else the shoe factory if there is one"""
+    if table.rng is None and shoe_factory is not None:
+        return shoe_factory.take(table.table_id)
+    new_shoe = _build_shoe_internal()
+    (table.rng or random).shuffle(new_shoe)
+    return bytearray(new_shoe)
+
+def build_shoe(table):
+    """Creates a new, shuffled shoe for a table"""
+    new_shoe = _shuffled_shoe(table)
     
-    for card in hand:
-        rank = card[:-1]
-        value += CARD_VALUES[rank]
-        if rank == 'A':
-            aces += 1
+    with table.lock:
+        table.shoe = new_shoe
+        table.shoe_id += 1
+        table.rank_counts = [len(CARD_SUITS) * NUMBER_OF_DECKS] * len(CARD_RANKS)
+        table.running_count = 0
+        table.game_state['cards_remaining'] = len(table.shoe)
+        log_event(table, handlog.SHUFFLE)
+        if metrics.enabled:
+            SHOES_BUILT.labels('shuffle').inc()
+        if table.log_shoes:
+            print(f"[{table.table_id}] Shoe created with {len(table.shoe)} cards")
+
+def true_count(table):
+    """Hi-Lo running count per deck left in the table's shoe"""
+    return table.running_count / (max(len(table.shoe), 1) / 52)
+
+def deal_card(table, send_func=None):
+    """
+    Deal a single card from the table's shoe. A shoe rebuilt first because
+    penetration ran low is announced through `send_func`, as /shuffle does.
+    """
+    with table.lock:
+        if len(table.shoe) < (52 * NUMBER_OF_DECKS * 0.25):
+            if table.log_shoes:
+                print(f"[{table.table_id}] Shoe penetration low, rebuilding...")
+            table.shoe = _shuffled_shoe(table)
+            table.shoe_id += 1
+            table.rank_counts = [len(CARD_SUITS) * NUMBER_OF_DECKS] * len(CARD_RANKS)
+            table.running_count = 0
+            log_event(table, handlog.SHUFFLE)
+            if metrics.enabled:
+                SHOES_BUILT.labels('penetration').inc()
+            if table.log_shoes:
+                print(f"[{table.table_id}] Shoe rebuilt with {len(table.shoe)} cards")
+            if send_func is not None:
+                send_func(table, "0")  # Shuffle signal, so counters start the new shoe from zero
+        
+        card = table.shoe.pop()
+        table.rank_counts[CARD_CODE_RANKS[card]] -= 1
+        table.running_count += CARD_CODE_HI_LO[card]
+        if metrics.enabled:
+            CARDS_DEALT.inc()
+        table.game_state['cards_remaining'] = len(table.shoe)
+        return card
+
+# --- Player Actions ---
+# Each action mutates the table's state the way the matching route does;
+# the routes only validate the request first. `send_func(table, message,
+# delay=0.0)` publishes revealed cards to the physical table.
+
+def start_hand(table, send_func):
+    """Take the bet and deal the opening cards (player, dealer hole, player, dealer up)"""
+    game_state = table.game_state
+    
+    if game_state['current_bet'] > game_state['bank']:
+        game_state['current_bet'] = min(
+            game_state['bank'], game_state['current_bet']
+        )
     
-    while value > 21 and aces > 0:
-        value -= 10
-        aces -= 1
+    # Deduct bet from bank
+    game_state['bank'] -= game_state['current_bet']
     
-    return value
+    # Reset game state but keep bank
+    bank_backup = game_state['bank']
+    current_bet_backup = game_state['current_bet']
+    reset_game_state(table)
+    game_state['bank'] = bank_backup
+    game_state['current_bet'] = current_bet_backup
+    
+    game_state['player_hands'] = [{
+        'hand': Hand(), 
+        'value': 0, 
+        'status': 'playing', 
+        'bet': game_state['current_bet']
+    }]
+    game_state['active_hand_index'] = 0
+    game_state['game_status'] = 'playing'
+    table.round_id += 1
+    table.round_true_count = true_count(table)
+    log_event(table, handlog.ROUND, amount=current_bet_backup)
 
-def _build_shoe_internal():
-    """Internal helper to build shoe without locking"""
-    one_deck = []
-    for suit in CARD_SUITS:
-        for rank in CARD_RANKS:
-            one_deck.append(f"{rank}{suit}")
+    # Each card goes out as it is dealt, so it carries the id of the shoe it came from
+    active_hand = game_state['player_hands'][0]
     
-    return one_deck * NUMBER_OF_DECKS
+    card1 = deal_card(table, send_func)
+    active_hand['hand'].append(card1)
+    log_card(table, 0, active_hand['hand'])
+    send_func(table, CARD_NAMES[card1])
+    
+    card2 = deal_card(table, send_func)
+    game_state['dealer_hand'].append(card2)
+    log_card(table, handlog.DEALER, game_state['dealer_hand'])
+    
+    card3 = deal_card(table, send_func)
+    active_hand['hand'].append(card3)
+    log_card(table, 0, active_hand['hand'])
+    send_func(table, CARD_NAMES[card3])
+    
+    card4 = deal_card(table, send_func)
+    game_state['dealer_hand'].append(card4)
+    log_card(table, handlog.DEALER, game_state['dealer_hand'])
+    send_func(table, CARD_NAMES[card4])
+    
+    active_hand['value'] = active_hand['hand'].value
+    game_state['dealer_value'] = CARD_CODE_VALUES[card4]
+    
+    if active_hand['value'] == 21:
+        active_hand['status'] = 'blackjack'
+        game_state['message'] = "Blackjack! Let's see what the dealer has..."
+        game_state['active_hand_index'] = -1
+        dealer_plays(table, send_func)
+    else:
+        game_state['message'] = f"Your turn for Hand 1 (Bet: ${game_state['current_bet']})"
+        update_hand_options(table)
 
-def build_shoe():
-    """Creates a new, shuffled shoe"""
-    global current_shoe
+def hit(table, send_func):
+    """Player hits - deal another card to the active hand"""
+    game_state = table.game_state
+    active_hand = game_state['player_hands'][game_state['active_hand_index']]
+    log_event(table, handlog.ACTION, handlog.HIT, game_state['active_hand_index'],
+              active_hand['value'], active_hand['bet'])
+
+    new_card = deal_card(table, send_func)
+    active_hand['hand'].append(new_card)
+    active_hand['value'] = active_hand['hand'].value
+    log_card(table, game_state['active_hand_index'], active_hand['hand'])
     
-    new_shoe = _build_shoe_internal()
+    send_func(table, CARD_NAMES[new_card])
+    
+    game_state['can_double'] = False
+    game_state['can_split'] = False
+    
+    if active_hand['value'] > 21:
+        active_hand['status'] = 'bust'
+        game_state['message'] = f"Hand {game_state['active_hand_index'] + 1} busts!"
+        move_to_next_hand(table)
+    elif active_hand['value'] == 21:
+        active_hand['status'] = 'stood'
+        game_state['message'] = f"Hand {game_state['active_hand_index'] + 1} has 21!"
+        move_to_next_hand(table)
+
+def stand(table):
+    """Player stands on the active hand"""
+    game_state = table.game_state
+    active_hand = game_state['player_hands'][game_state['active_hand_index']]
+    active_hand['status'] = 'stood'
+    log_event(table, handlog.ACTION, handlog.STAND, game_state['active_hand_index'],
+              active_hand['value'], active_hand['bet'])
+    
+    game_state['message'] = f"Hand {game_state['active_hand_index'] + 1} stands."
+    move_to_next_hand(table)
+
+def double_down(table, send_func):
+    """Player doubles the active hand's bet, takes one card and stands"""
+    game_state = table.game_state
+    active_hand = game_state['player_hands'][game_state['active_hand_index']]
+    
+    # Deduct additional bet from bank
+    game_state['bank'] -= active_hand['bet']
+    active_hand['bet'] *= 2
+    log_event(table, handlog.ACTION, handlog.DOUBLE, game_state['active_hand_index'],
+              active_hand['value'], active_hand['bet'])
+    
+    new_card = deal_card(table, send_func)
+    active_hand['hand'].append(new_card)
+    active_hand['value'] = active_hand['hand'].value
+    log_card(table, game_state['active_hand_index'], active_hand['hand'])
+    send_func(table, CARD_NAMES[new_card])
+    
+    game_state['can_double'] = False
+    game_state['can_split'] = False
+    
+    if active_hand['value'] > 21:
+        active_hand['status'] = 'bust'
+        game_state['message'] = f"Hand {game_state['active_hand_index'] + 1} busts on double!"
+    else:
+        active_hand['status'] = 'stood'
+        game_state['message'] = f"Hand {game_state['active_hand_index'] + 1} doubles and stands."
     
-    with shoe_lock:
-        current_shoe = new_shoe
-        random.shuffle(current_shoe)
-        print(f"Shoe created with {len(current_shoe)} cards")
-
-def deal_card():
-    """Deal a single card from the shoe"""
-    global current_shoe
-    global game_state
-    
-    with shoe_lock:
-        if len(current_shoe) < (52 * NUMBER_OF_DECKS * 0.25):
-            print("Shoe penetration low, rebuilding...")
-            # Rebuild directly without releasing/reacquiring lock
-            new_shoe = _build_shoe_internal()
-            current_shoe = new_shoe
-            random.shuffle(current_shoe)
-            print(f"Shoe rebuilt with {len(current_shoe)} cards")
+    move_to_next_hand(table)
+
+def split_hand(table, send_func, card_delay=0.0):
+    """Player splits the active pair; the second hand's card is revealed `card_delay` seconds later"""
+    game_state = table.game_state
+    
+    # Deduct additional bet from bank
+    game_state['bank'] -= game_state['current_bet']
         
-        card = current_shoe.pop()
-        if 'cards_remaining' in game_state:
-            game_state['cards_remaining'] = len(current_shoe)
-        return card
+    active_hand = game_state['player_hands'][game_state['active_hand_index']]
+    log_event(table, handlog.ACTION, handlog.SPLIT, game_state['active_hand_index'],
+              active_hand['value'], active_hand['bet'])
+    card_to_move = active_hand['hand'].pop()
+    
+    active_hand['value'] = active_hand['hand'].value
+    
+    split_cards = Hand([card_to_move])
+    new_hand = {
+        'hand': split_cards,
+        'value': split_cards.value,
+        'status': 'pending',
+        'bet': game_state['current_bet']
+    }
+    
+    game_state['player_hands'].insert(game_state['active_hand_index'] + 1, new_hand)
+    
+    new_card_1 = deal_card(table, send_func)
+    active_hand['hand'].append(new_card_1)
+    active_hand['value'] = active_hand['hand'].value
+    log_card(table, game_state['active_hand_index'], active_hand['hand'])
+    send_func(table, CARD_NAMES[new_card_1])
+    
+    new_card_2 = deal_card(table, send_func)
+    new_hand['hand'].append(new_card_2)
+    new_hand['value'] = new_hand['hand'].value
+    log_card(table, game_state['active_hand_index'] + 1, new_hand['hand'])
+    send_func(table, CARD_NAMES[new_card_2], card_delay)
+    
+    is_ace_split = (CARD_CODE_VALUES[active_hand['hand'][0]] == ACE)
+    
+    if is_ace_split:
+        active_hand['status'] = 'stood'
+        new_hand['status'] = 'stood'
+        game_state['message'] = "Split Aces! Each hand gets one card and stands."
+        move_to_next_hand(table)
+    else:
+        update_hand_options(table)
+        
+        if active_hand['value'] == 21:
+            active_hand['status'] = 'stood'
+            move_to_next_hand(table)
+        else:
+            game_state['message'] = f"Split! Your turn for Hand {game_state['active_hand_index'] + 1}"
 
-def update_hand_options():
+def update_hand_options(table):
     """Updates can_split and can_double for the active hand."""
-    global game_state
+    game_state = table.game_state
     
     if game_state['game_status'] != 'playing' or game_state['active_hand_index'] == -1:
         game_state['can_split'] = False
@@ -107,32 +627,30 @@ def update_hand_options():
         # Can only double if player has enough money
         game_state['can_double'] = game_state['bank'] >= active_hand['bet']
         
-        rank1 = active_hand['hand'][0][:-1]
-        rank2 = active_hand['hand'][1][:-1]
         # Can only split if player has enough money
-        game_state['can_split'] = (CARD_VALUES[rank1] == CARD_VALUES[rank2] and 
+        game_state['can_split'] = (active_hand['hand'].pair_value != 0 and 
                                     game_state['bank'] >= game_state['current_bet'])
     else:
         game_state['can_double'] = False
         game_state['can_split'] = False
 
-def move_to_next_hand():
+def move_to_next_hand(table):
     """Moves focus to the next hand, or triggers dealer's turn if all hands are played."""
-    global game_state
+    game_state = table.game_state
     
     game_state['active_hand_index'] += 1
     
     if game_state['active_hand_index'] < len(game_state['player_hands']):
         active_hand = game_state['player_hands'][game_state['active_hand_index']]
         
-        if active_hand['value'] == 21 and len(active_hand['hand']) == 2:
+        if active_hand['hand'].is_blackjack:
             active_hand['status'] = 'blackjack'
             game_state['message'] = f"Hand {game_state['active_hand_index'] + 1} has Blackjack!"
-            move_to_next_hand()
+            move_to_next_hand(table)
         else:
             active_hand['status'] = 'playing'
             game_state['message'] = f"Your turn for Hand {game_state['active_hand_index'] + 1}"
-            update_hand_options()
+            update_hand_options(table)
             
     else:
         all_busted = all(hand['status'] == 'bust' for hand in game_state['player_hands'])
@@ -144,47 +662,98 @@ def move_to_next_hand():
             game_state['dealer_hidden'] = False
             
             final_messages = []
+            settled = []
             for i, p_hand in enumerate(game_state['player_hands']):
                 p_hand['status'] = 'lose'
+                log_event(table, handlog.SETTLE, handlog.LOSE, i, p_hand['value'], -p_hand['bet'])
+                settled.append((handlog.LOSE, p_hand['bet'], -p_hand['bet'], p_hand['value']))
                 final_messages.append(f"Hand {i + 1} busts (-${p_hand['bet']})")
             
             game_state['message'] = ". ".join(final_messages) + f". Bank: ${game_state['bank']}"
+            record_round(table, settled)
         else:
             game_state['game_status'] = 'dealer_turn'
             game_state['can_split'] = False
             game_state['can_double'] = False
             game_state['message'] = "Dealer's turn..."
 
-def dealer_plays(send_func):
+def dealer_plays(table, send_func):
     """
     Logic for the dealer's turn.
-    Accepts a function `send_func` to send MQTT messages.
+    Accepts a function `send_func(table, message, delay)` to send MQTT messages.
+    The whole turn is resolved immediately; only the reveals on the physical
+    table are paced, `DEALER_REVEAL_DELAY` seconds apart.
     """
-    global game_state
+    game_state = table.game_state
     
     game_state['dealer_hidden'] = False
-    game_state['dealer_value'] = calculate_hand_value(game_state['dealer_hand'])
+    game_state['dealer_value'] = game_state['dealer_hand'].value
+    
+    send_func(table, CARD_NAMES[game_state['dealer_hand'][0]], 0.0)
+    
+    while game_state['dealer_value'] < DEALER_STANDS_ON:
+        new_card = deal_card(table, send_func)
+        game_state['dealer_hand'].append(new_card)
+        game_state['dealer_value'] = game_state['dealer_hand'].value
+        log_card(table, handlog.DEALER, game_state['dealer_hand'])
+        send_func(table, CARD_NAMES[new_card], DEALER_REVEAL_DELAY)
     
-    send_func(game_state['dealer_hand'][0])
+    determine_winners(table)
+
+def dealer_step(table, send_func):
+    """
+    Performs one step of the dealer's turn: reveal the hole card, or draw
+    one card while under 17. Settles the hand once the dealer is done.
+    Accepts a function `send_func(table, message)` to send MQTT messages.
+    """
+    game_state = table.game_state
     
-    while game_state['dealer_value'] < 17:
-        time.sleep(1.0)
-        new_card = deal_card()
+    # Step 1: Reveal hidden card if it's the first step
+    if game_state['dealer_hidden']:
+        game_state['dealer_hidden'] = False
+        game_state['dealer_value'] = game_state['dealer_hand'].value
+        send_func(table, CARD_NAMES[game_state['dealer_hand'][0]]) # Reveal hole card
+        game_state['message'] = f"Dealer reveals. Value is {game_state['dealer_value']}"
+        
+        # After revealing, check if we're done (e.g., dealer has 17-21)
+        if game_state['dealer_value'] >= DEALER_STANDS_ON:
+            determine_winners(table)
+        return
+
+    # Step 2: Draw a card if under 17
+    if game_state['dealer_value'] < DEALER_STANDS_ON:
+        new_card = deal_card(table, send_func)
         game_state['dealer_hand'].append(new_card)
-        time.sleep(1.0)
-        game_state['dealer_value'] = calculate_hand_value(game_state['dealer_hand'])
-        send_func(new_card)
+        game_state['dealer_value'] = game_state['dealer_hand'].value
+        log_card(table, handlog.DEALER, game_state['dealer_hand'])
+        send_func(table, CARD_NAMES[new_card])
+        
+        if game_state['dealer_value'] > 21:
+            game_state['message'] = "Dealer busts!"
+        else:
+            game_state['message'] = f"Dealer hits. Value is {game_state['dealer_value']}"
+        
+        # After drawing, check if we're done
+        if game_state['dealer_value'] >= DEALER_STANDS_ON:
+            determine_winners(table) # This will set status to 'complete'
     
-    determine_winners()
+    # Dealer was already >= 17, so settle the hand
+    elif game_state['game_status'] != 'complete':
+        determine_winners(table)
 
-def determine_winners():
+def determine_winners(table):
     """Compares all player hands to the dealer's hand and updates bank."""
-    global game_state
+    game_state = table.game_state
     
     dealer_val = game_state['dealer_value']
     dealer_bust = dealer_val > 21
     final_messages = []
-    dealer_has_blackjack = dealer_val == 21 and len(game_state['dealer_hand']) == 2
+    dealer_has_blackjack = game_state['dealer_hand'].is_blackjack
+    settled = []  # (outcome, bet, net, value) per hand, for record_round
+    
+    def settle(outcome, value, net):
+        log_event(table, handlog.SETTLE, outcome, i, value, net)
+        settled.append((outcome, bet, net, value))
     
     for i, p_hand in enumerate(game_state['player_hands']):
         hand_num = i + 1
@@ -192,17 +761,20 @@ def determine_winners():
         
         if p_hand['status'] == 'bust':
             p_hand['status'] = 'lose'
+            settle(handlog.LOSE, p_hand['value'], -bet)
             final_messages.append(f"Hand {hand_num} busts (-${bet})")
         
         elif p_hand['status'] == 'blackjack':
             if dealer_has_blackjack:
                 p_hand['status'] = 'tie'
                 game_state['bank'] += bet
+                settle(handlog.PUSH, p_hand['value'], 0)
                 final_messages.append(f"Hand {hand_num} pushes (${bet})")
             else:
                 p_hand['status'] = 'win'
                 winnings = int(bet * 2.5)  # 3:2 payout for blackjack
                 game_state['bank'] += winnings
+                settle(handlog.BLACKJACK, p_hand['value'], winnings - bet)
                 final_messages.append(f"Hand {hand_num} BLACKJACK! (+${winnings - bet})")
         
         elif p_hand['status'] == 'stood':
@@ -210,18 +782,23 @@ def determine_winners():
             if dealer_bust:
                 p_hand['status'] = 'win'
                 game_state['bank'] += bet * 2
+                settle(handlog.WIN, hand_val, bet)
                 final_messages.append(f"Hand {hand_num} wins (+${bet})")
             elif hand_val > dealer_val:
                 p_hand['status'] = 'win'
                 game_state['bank'] += bet * 2
+                settle(handlog.WIN, hand_val, bet)
                 final_messages.append(f"Hand {hand_num} wins (+${bet})")
             elif hand_val < dealer_val:
                 p_hand['status'] = 'lose'
+                settle(handlog.LOSE, hand_val, -bet)
                 final_messages.append(f"Hand {hand_num} loses (-${bet})")
             else:
                 p_hand['status'] = 'tie'
                 game_state['bank'] += bet
+                settle(handlog.PUSH, hand_val, 0)
                 final_messages.append(f"Hand {hand_num} pushes (${bet})")
     
     game_state['game_status'] = 'complete'
-    game_state['message'] = ". ".join(final_messages) + f". Bank: ${game_state['bank']}"
\ No newline at end of file
+    game_state['message'] = ". ".join(final_messages) + f". Bank: ${game_state['bank']}"
+    record_round(table, settled)
\ No newline at end of file
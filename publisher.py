@@ -0,0 +1,261 @@
+import collections
+import queue
+import threading
+import time
+
+import metrics
+
+# --- MQTT Publisher ---
+# Request handlers hand their cards to a Publisher, which queues them and
+# lets a background worker talk to the broker. A single worker drains the
+# queue in order, so every topic sees its messages in the order they were
+# queued. With QoS 1/2 the worker stops sending once `max_inflight`
+# messages are waiting for an acknowledgement; the queue then fills up and
+# new publishes are dropped (and counted) instead of blocking requests.
+# While the client is disconnected the worker holds its batches back, so
+# the queue doubles as the buffer that is sent once the broker is back.
+
+COALESCE_SEPARATOR = ','
+_ERR_NO_CONN = 4  # paho.mqtt.client.MQTT_ERR_NO_CONN
+RETRY_INTERVAL = 0.1  # Seconds before resending a frame the client refused for lack of a connection
+STOP_POLL = 0.5  # Seconds between checks for stop() while waiting for the broker
+
+_Batch = collections.namedtuple('_Batch', 'topic payloads queued_at qos')
+
+PUBLISH_LATENCY = metrics.Histogram(
+    'mqtt_publish_latency_seconds',
+    'Time from queueing a card message to the broker (QoS 1/2) or socket (QoS 0) taking it')
+
+class Publisher:
+    """Bounded, ordered MQTT publish queue drained by a background worker"""
+
+    def __init__(self, client, qos=0, max_queue=1000, max_inflight=20,
+                 put_timeout=0.05, ack_timeout=10.0, coalesce=False, connected=True):
+        """Pass connected=False when the client connects later, and call set_connected() to follow it"""
+        self.client = client
+        self.qos = qos
+        self.max_inflight = max_inflight
+        self.put_timeout = put_timeout
+        self.ack_timeout = ack_timeout
+        self.coalesce = coalesce
+
+        self._queue = queue.Queue(max_queue)
+        self._lock = threading.Condition()
+        self._connected = threading.Event()
+        if connected:
+            self._connected.set()
+        self._inflight = {}       # mid -> (queued_at, sent_at, topic, payload, qos)
+        self._unsent = []         # (topic, payload, queued_at, qos) of QoS 0 frames a disconnect kept from the socket
+        self._stopping = threading.Event()
+        self._stop_at = None
+        self._early_acks = set()  # mids acknowledged before publish() returned
+        self._counters = {
+            'queued': 0,
+            'published': 0,
+            'acked': 0,
+            'dropped': 0,
+            'failed': 0,
+            'ack_timeouts': 0,
+            'retried': 0,
+        }
+        self._latency_total = 0.0
+        self._latency_count = 0
+        self._latency_max = 0.0
+
+        self.use_client(client)
+        self._worker = threading.Thread(target=self._run, name='mqtt-publisher', daemon=True)
+        self._worker.start()
+
+    def publish(self, topic, payloads, qos=None):
+        """
+        Queue one action's payloads for a topic, at `qos` or else the
+        publisher's default. They are sent in order, or text payloads as a
+        single comma-separated frame when coalescing is enabled (binary
+        frames already carry several cards).
+        Returns False if the queue stayed full and the batch was dropped.
+        """
+        if isinstance(payloads, (str, bytes)):
+            payloads = [payloads]
+        batch = _Batch(topic, list(payloads), time.monotonic(), self.qos if qos is None else qos)
+
+        try:
+            self._queue.put(batch, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self._counters['dropped'] += len(batch.payloads)
+            print(f"MQTT queue full, dropped {len(batch.payloads)} message(s) for {topic}")
+            return False
+
+        with self._lock:
+            self._counters['queued'] += len(batch.payloads)
+        return True
+
+    def use_client(self, client):
+        """Send through another client from the next frame on"""
+        self.client = client
+        client.on_publish = self._on_publish
+
+    def set_connected(self, connected):
+        """Resume sending, or hold frames in the queue until the client is connected again"""
+        if connected:
+            self._connected.set()
+            return
+        self._connected.clear()
+        with self._lock:
+            # paho discards QoS 0 frames it had not written to the socket
+            # yet; send them again, first thing after reconnecting
+            lost = [mid for mid, entry in self._inflight.items() if entry[4] == 0]
+            if lost:
+                for mid in lost:
+                    queued_at, _, topic, payload, qos = self._inflight.pop(mid)
+                    self._unsent.append((topic, payload, queued_at, qos))
+                self._counters['published'] -= len(lost)
+                self._counters['retried'] += len(lost)
+                self._lock.notify_all()
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    def stop(self, timeout):
+        """
+        Send what is queued for up to `timeout` seconds, drop whatever is
+        still left then, and end the worker. Blocks until it has ended.
+        """
+        self._stop_at = time.monotonic() + timeout
+        self._stopping.set()
+        self._queue.put(None)  # Wakes the worker once everything before it is sent
+        with self._lock:
+            self._lock.notify_all()
+        self._worker.join()
+
+    def _overdue(self):
+        return self._stopping.is_set() and time.monotonic() >= self._stop_at
+
+    def _drop(self, count):
+        with self._lock:
+            self._counters['dropped'] += count
+
+    def stats(self):
+        """Snapshot of queue depth, delivery counters and publish latency"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['queue_depth'] = self._queue.qsize()
+            stats['inflight'] = len(self._inflight) + len(self._unsent)
+            stats['connected'] = self._connected.is_set()
+            stats['qos'] = self.qos
+            stats['coalesce'] = self.coalesce
+            stats['latency_avg_ms'] = (self._latency_total / self._latency_count * 1000
+                                       if self._latency_count else 0.0)
+            stats['latency_max_ms'] = self._latency_max * 1000
+        return stats
+
+    def _record_latency(self, queued_at):
+        """Must be called with self._lock held"""
+        latency = time.monotonic() - queued_at
+        if metrics.enabled:
+            PUBLISH_LATENCY.observe(latency)
+        self._latency_total += latency
+        self._latency_count += 1
+        if latency > self._latency_max:
+            self._latency_max = latency
+
+    def _on_publish(self, client, userdata, mid):
+        """paho callback: the broker acknowledged (QoS 1/2) or the socket took (QoS 0) a message"""
+        with self._lock:
+            entry = self._inflight.pop(mid, None)
+            if entry is None:
+                self._early_acks.add(mid)
+                return
+            self._counters['acked'] += 1
+            self._record_latency(entry[0])
+            self._lock.notify_all()
+
+    def _wait_for_window(self):
+        """Block while too many QoS 1/2 messages are unacknowledged (backpressure)"""
+        with self._lock:
+            while len(self._inflight) >= self.max_inflight and not self._overdue():
+                now = time.monotonic()
+                expired = [mid for mid, entry in self._inflight.items()
+                           if now - entry[1] > self.ack_timeout]
+                for mid in expired:
+                    del self._inflight[mid]
+                    self._counters['ack_timeouts'] += 1
+                if expired:
+                    continue
+                self._lock.wait(STOP_POLL if self._stopping.is_set() else self.ack_timeout)
+
+    def _send(self, topic, payload, queued_at, qos):
+        """Publish one frame, after any that a dropped connection left unsent, and track its acknowledgement"""
+        frames = collections.deque([(topic, payload, queued_at, qos)])
+        while frames:
+            while not self._connected.wait(STOP_POLL):
+                if self._overdue():
+                    with self._lock:
+                        frames.extend(self._unsent)
+                        self._unsent = []
+                    self._drop(len(frames))
+                    return
+            with self._lock:
+                if self._unsent:
+                    frames.extendleft(reversed(self._unsent))
+                    self._unsent = []
+            topic, payload, queued_at, qos = frames[0]
+            self._wait_for_window()
+            try:
+                info = self.client.publish(topic, payload, qos=qos)
+            except Exception as e:
+                print(f"MQTT publish error: {e}")
+                frames.popleft()
+                with self._lock:
+                    self._counters['failed'] += 1
+                continue
+            if getattr(info, 'rc', 0) == _ERR_NO_CONN and qos == 0:
+                # The connection dropped before set_connected(False) arrived; paho
+                # does not keep QoS 0 messages, so try this one again shortly
+                with self._lock:
+                    self._counters['retried'] += 1
+                time.sleep(RETRY_INTERVAL)
+                continue
+            frames.popleft()
+            self._track(info, topic, payload, queued_at, qos)
+
+    def _track(self, info, topic, payload, queued_at, qos):
+        """Count a frame the client accepted and wait for its acknowledgement"""
+        with self._lock:
+            # Fake or minimal clients return nothing to track; count them as delivered
+            if info is None or getattr(info, 'mid', None) is None:
+                self._counters['published'] += 1
+                self._record_latency(queued_at)
+                return
+
+            if info.rc != 0 and qos == 0:
+                self._counters['failed'] += 1
+                return
+
+            self._counters['published'] += 1
+            if info.mid in self._early_acks:
+                self._early_acks.discard(info.mid)
+                self._counters['acked'] += 1
+                self._record_latency(queued_at)
+            elif qos == 0 and not self._connected.is_set():
+                # Disconnected while publishing: paho dropped the frame unsent
+                self._counters['published'] -= 1
+                self._counters['retried'] += 1
+                self._unsent.append((topic, payload, queued_at, qos))
+            else:
+                self._inflight[info.mid] = (queued_at, time.monotonic(), topic, payload, qos)
+
+    def _run(self):
+        """Worker loop: drain batches in queue order"""
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return  # stop()
+            if self._overdue():
+                self._drop(len(batch.payloads))
+            elif self.coalesce and len(batch.payloads) > 1 and isinstance(batch.payloads[0], str):
+                self._send(batch.topic, COALESCE_SEPARATOR.join(batch.payloads), batch.queued_at, batch.qos)
+            else:
+                for payload in batch.payloads:
+                    self._send(batch.topic, payload, batch.queued_at, batch.qos)
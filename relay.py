@@ -0,0 +1,346 @@
+"""
+Discord relay for the counter devices' alerts.
+
+Subscribes to the alert topics the devices publish to and posts the alerts
+to Discord webhooks, so a device only has to publish one short MQTT
+message instead of opening a TLS connection to Discord per alert:
+
+    python relay.py --webhook https://discord.com/api/webhooks/<id>/<token>
+                    [--webhook <channel>=<url> ...] [--broker broker.hivemq.com]
+
+Devices publish "<kind>,<table>,<value>,<device name>" to
+"<prefix><channel>", e.g. "hot,table1,5,Player1" to
+"ece508/blkjck_alerts/table1". Kinds are connected, shuffle, hot and cold.
+A channel's alerts go to its --webhook (or the one given without a
+channel); the same alert for the same table within --dedup seconds is sent
+once however many devices report it (a device's own "connected" alerts
+excepted), and alerts arriving together are posted as one message with an
+embed each.
+"""
+import argparse
+import collections
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+
+# --- Alert Relay ---
+# Devices publish alerts; the relay keeps a queue per channel (webhook).
+# The first alert in an empty queue starts a BATCH_DELAY timer, and when it
+# runs out everything queued goes out in one webhook call, up to
+# MAX_EMBEDS alerts per call. Calls per channel are limited to
+# RATE_LIMIT_REQUESTS per RATE_LIMIT_WINDOW seconds, and a 429 or an
+# exhausted X-RateLimit-Remaining holds the channel for as long as Discord
+# says. Webhook calls reuse one keep-alive connection per host.
+
+ALERT_PREFIX = 'ece508/blkjck_alerts/'
+BATCH_DELAY = 1.0
+MAX_EMBEDS = 10  # Discord's limit per message
+MAX_PENDING = 200  # Alerts queued per channel; older ones are dropped beyond this
+DEDUP_SECONDS = 30.0
+RATE_LIMIT_REQUESTS = 5
+RATE_LIMIT_WINDOW = 2.0
+RETRY_DELAY = 5.0  # Seconds before a batch that failed to send is tried again
+HTTP_TIMEOUT = 10.0
+USERNAME = 'Le Chiffre'
+
+# Embed colour and description per alert kind, as the devices wrote them
+ALERT_KINDS = {
+    'connected': (2483968, "{device} is counting this table."),
+    'shuffle': (0, "Dealer shuffled cards! Table's count is reset."),
+    'hot': (16732672, "The running count is __**+{value}**__! 🔥"),
+    'cold': (3325951, "The running count is back to __**{value}**__. 🥶"),
+}
+HOT = 'hot'
+PER_DEVICE_KINDS = ('connected',)  # About the device itself: never a duplicate of another device's
+
+Alert = collections.namedtuple('Alert', 'kind table value device received_at')
+
+def parse_alert(payload):
+    """An Alert from a device's "<kind>,<table>,<value>,<device>" payload, or None if malformed"""
+    try:
+        kind, table, value, device = payload.decode('utf-8').strip().split(',', 3)
+    except (UnicodeDecodeError, ValueError):
+        return None
+    if kind not in ALERT_KINDS or not table:
+        return None
+    return Alert(kind, table, value, device, time.time())
+
+def webhook_body(alerts, mention=None):
+    """The webhook JSON for a batch of alerts: one embed each, and the role mention if any is hot"""
+    embeds = []
+    for alert in alerts:
+        color, description = ALERT_KINDS[alert.kind]
+        embeds.append({
+            'title': alert.table,
+            'description': description.format(value=alert.value, device=alert.device),
+            'color': color,
+            'author': {'name': alert.device},
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(alert.received_at)),
+        })
+    body = {'username': USERNAME, 'embeds': embeds, 'allowed_mentions': {'parse': ['roles']}}
+    if mention and any(alert.kind == HOT for alert in alerts):
+        body['content'] = f"<@&{mention}> please join the table."
+    return json.dumps(body).encode('utf-8')
+
+class WebhookSession:
+    """HTTP(S) POSTs over one keep-alive connection per host, reopened when the server closes it"""
+
+    def __init__(self, timeout=HTTP_TIMEOUT):
+        self.timeout = timeout
+        self.connections = 0  # Connections opened
+        self.requests = 0
+        self._pool = {}  # (scheme, host) -> http.client connection
+
+    def post(self, url, body):
+        """POST a JSON body; returns (status, headers, response body). Raises OSError or HTTPException on failure."""
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        headers = {'Content-Type': 'application/json', 'Content-Length': str(len(body))}
+        for attempt in range(2):
+            connection = self._connection(parts.scheme, parts.netloc)
+            try:
+                connection.request('POST', path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                del self._pool[parts.scheme, parts.netloc]
+                if attempt:
+                    raise
+                continue  # A kept-alive connection the server has since closed: retry on a new one
+            self.requests += 1
+            if response.will_close:
+                connection.close()
+                del self._pool[parts.scheme, parts.netloc]
+            return response.status, response.headers, data
+
+    def _connection(self, scheme, netloc):
+        connection = self._pool.get((scheme, netloc))
+        if connection is None:
+            kind = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            connection = self._pool[scheme, netloc] = kind(netloc, timeout=self.timeout)
+            self.connections += 1
+        return connection
+
+    def close(self):
+        for connection in self._pool.values():
+            connection.close()
+        self._pool.clear()
+
+class _Channel:
+    """Queue, duplicate filter and rate limit state of one webhook"""
+
+    def __init__(self, url):
+        self.url = url
+        self.pending = collections.deque()
+        self.due = None  # When the pending batch goes out (monotonic), None if nothing is pending
+        self.recent = {}  # (kind, table, value, device) -> monotonic time last queued
+        self.sent_at = collections.deque(maxlen=RATE_LIMIT_REQUESTS)
+        self.blocked_until = 0.0
+
+    def ready_at(self):
+        """Earliest time the rate limits allow the next call"""
+        ready = self.blocked_until
+        if len(self.sent_at) == RATE_LIMIT_REQUESTS:
+            ready = max(ready, self.sent_at[0] + RATE_LIMIT_WINDOW)
+        return ready
+
+class AlertRelay:
+    """
+    Relays alerts from the topics under `prefix` to Discord webhooks.
+    `webhooks` maps channel names (the topic level after the prefix) to
+    webhook URLs; None maps any other channel. Call `start()` to subscribe
+    and run the sender thread; any object with paho's subscribe and
+    on_message interface will do as the client.
+    """
+
+    def __init__(self, client, webhooks, prefix=ALERT_PREFIX, mention=None, batch_delay=BATCH_DELAY,
+                 dedup_seconds=DEDUP_SECONDS, session=None):
+        self.client = client
+        self.webhooks = webhooks
+        self.prefix = prefix
+        self.mention = mention
+        self.batch_delay = batch_delay
+        self.dedup_seconds = dedup_seconds
+        self.session = session or WebhookSession()
+        self._channels = {}  # webhook URL -> _Channel; channels sharing a webhook share its limits
+        self._counters = dict.fromkeys(('received', 'malformed', 'unrouted', 'duplicates', 'dropped',
+                                        'sent', 'batches', 'rate_limited', 'failed'), 0)
+        self._condition = threading.Condition()
+        self._running = False
+        self._worker = None
+        if client is not None:
+            client.on_message = self._on_message
+
+    @property
+    def subscription(self):
+        return self.prefix + '+'
+
+    def start(self):
+        if self.client is not None:
+            self.client.subscribe(self.subscription)
+        self._running = True
+        self._worker = threading.Thread(target=self._run, name='alert-relay', daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._worker.join()
+        self.session.close()
+
+    def _on_message(self, client, userdata, message):
+        if message.topic.startswith(self.prefix):
+            self.handle(message.topic, message.payload)
+
+    def handle(self, topic, payload):
+        """Queue one alert published to `topic`, unless it is malformed, unrouted or a duplicate"""
+        alert = parse_alert(payload)
+        url = self.webhooks.get(topic[len(self.prefix):], self.webhooks.get(None))
+        now = time.monotonic()
+        with self._condition:
+            self._counters['received'] += 1
+            if alert is None or url is None:
+                self._counters['malformed' if alert is None else 'unrouted'] += 1
+                return
+            channel = self._channels.get(url)
+            if channel is None:
+                channel = self._channels[url] = _Channel(url)
+            key = (alert.kind, alert.table, alert.value,
+                   alert.device if alert.kind in PER_DEVICE_KINDS else None)
+            if now - channel.recent.get(key, -self.dedup_seconds) < self.dedup_seconds:
+                self._counters['duplicates'] += 1
+                return
+            channel.recent[key] = now
+            if len(channel.recent) > MAX_PENDING:
+                channel.recent = {key: at for key, at in channel.recent.items() if now - at < self.dedup_seconds}
+            if len(channel.pending) == MAX_PENDING:
+                channel.pending.popleft()
+                self._counters['dropped'] += 1
+            channel.pending.append(alert)
+            if channel.due is None:
+                channel.due = now + self.batch_delay
+                self._condition.notify()
+
+    def pending(self):
+        """Alerts waiting to be sent"""
+        with self._condition:
+            return sum(len(channel.pending) for channel in self._channels.values())
+
+    def _next_batch(self):
+        """(channel, alerts) due now, or the seconds until the next one is due (None: nothing pending)"""
+        now = time.monotonic()
+        wait = None
+        for channel in self._channels.values():
+            if channel.due is None:
+                continue
+            due = channel.ready_at()
+            if len(channel.pending) < MAX_EMBEDS:
+                due = max(due, channel.due)
+            if due <= now:
+                count = min(MAX_EMBEDS, len(channel.pending))
+                alerts = [channel.pending.popleft() for _ in range(count)]
+                channel.due = now + self.batch_delay if channel.pending else None
+                channel.sent_at.append(now)
+                return channel, alerts
+            wait = due - now if wait is None else min(wait, due - now)
+        return wait
+
+    def _run(self):
+        """Sender thread: post each channel's batch when it is due"""
+        while True:
+            with self._condition:
+                while True:
+                    if not self._running:
+                        return
+                    batch = self._next_batch()
+                    if isinstance(batch, tuple):
+                        break
+                    self._condition.wait(batch)
+            self._send(*batch)
+
+    def _send(self, channel, alerts):
+        """Post a batch; a rate-limited or failed batch goes back to the front of the queue"""
+        try:
+            status, headers, data = self.session.post(channel.url, webhook_body(alerts, self.mention))
+        except (OSError, http.client.HTTPException) as e:
+            print(f"Webhook call failed, retrying {len(alerts)} alert(s) in {RETRY_DELAY:.0f} s: {e}")
+            self._requeue(channel, alerts, RETRY_DELAY, 'failed')
+            return
+        if status == 429:
+            try:
+                retry_after = float(json.loads(data)['retry_after'])
+            except (ValueError, KeyError, TypeError):
+                retry_after = float(headers.get('Retry-After') or RETRY_DELAY)
+            self._requeue(channel, alerts, retry_after, 'rate_limited')
+            return
+        with self._condition:
+            if headers.get('X-RateLimit-Remaining') == '0':
+                channel.blocked_until = time.monotonic() + float(headers.get('X-RateLimit-Reset-After') or 0)
+            if 200 <= status < 300:
+                self._counters['sent'] += len(alerts)
+                self._counters['batches'] += 1
+            else:
+                self._counters['failed'] += 1
+                print(f"Webhook rejected {len(alerts)} alert(s) with {status}: {data[:200]!r}")
+
+    def _requeue(self, channel, alerts, delay, counter):
+        with self._condition:
+            self._counters[counter] += 1
+            channel.pending.extendleft(reversed(alerts))
+            while len(channel.pending) > MAX_PENDING:
+                channel.pending.pop()
+                self._counters['dropped'] += 1
+            channel.blocked_until = time.monotonic() + delay
+            channel.due = channel.blocked_until
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._counters)
+            stats['pending'] = sum(len(channel.pending) for channel in self._channels.values())
+        stats['requests'] = self.session.requests
+        stats['connections'] = self.session.connections
+        return stats
+
+def parse_webhooks(values):
+    """--webhook values ("<url>" or "<channel>=<url>") as AlertRelay's webhooks mapping"""
+    webhooks = {}
+    for value in values:
+        if value.startswith(('http://', 'https://')):
+            webhooks[None] = value
+        else:
+            channel, _, url = value.partition('=')
+            webhooks[channel] = url
+    return webhooks
+
+def main():
+    import paho.mqtt.client as mqtt
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--broker', default='broker.hivemq.com')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--prefix', default=ALERT_PREFIX, help='Alert topic prefix; the next level is the channel')
+    parser.add_argument('--webhook', action='append', required=True, metavar='[CHANNEL=]URL',
+                        help='Webhook for a channel, or for every channel without one')
+    parser.add_argument('--mention', help='Role id to mention with hot alerts')
+    parser.add_argument('--batch-delay', type=float, default=BATCH_DELAY,
+                        help='Seconds alerts are held to be sent together')
+    parser.add_argument('--dedup', type=float, default=DEDUP_SECONDS,
+                        help='Seconds the same alert for a table is sent only once')
+    args = parser.parse_args()
+
+    client = mqtt.Client("blackjack_relay_" + str(time.time()))
+    relay = AlertRelay(client, parse_webhooks(args.webhook), args.prefix, args.mention, args.batch_delay, args.dedup)
+    # Subscribe again on every (re)connect; the broker forgets clean sessions
+    client.on_connect = lambda client, userdata, flags, rc: client.subscribe(relay.subscription)
+    client.connect(args.broker, args.port, 60)
+    relay.start()
+    print(f"Relaying {relay.subscription} on {args.broker}:{args.port}")
+    client.loop_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import heapq
+import itertools
+import threading
+import time
+
+# --- Timed Event Scheduler ---
+# One daemon thread runs every delayed callback (card reveals, MQTT
+# publishes) so request handlers never have to sleep. Pending events live
+# in a heap ordered by due time, so thousands of them cost O(log n) each.
+
+_events = []
+_sequence = itertools.count()
+_condition = threading.Condition()
+_worker = None
+
+def call_at(due, func, *args):
+    """Run func(*args) on the scheduler thread once time.monotonic() reaches due"""
+    global _worker
+
+    with _condition:
+        # The sequence number keeps events with the same due time in FIFO order
+        event = (due, next(_sequence), func, args)
+        heapq.heappush(_events, event)
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name='scheduler', daemon=True)
+            _worker.start()
+        elif _events[0] is event:
+            # Only wake the worker when its next deadline moved earlier
+            _condition.notify()
+
+def call_later(delay, func, *args):
+    """Run func(*args) on the scheduler thread after delay seconds"""
+    call_at(time.monotonic() + delay, func, *args)
+
+def pending():
+    """Number of events waiting to run"""
+    with _condition:
+        return len(_events)
+
+def _run():
+    """Scheduler loop: sleep until the earliest event is due, then run it"""
+    while True:
+        with _condition:
+            while not _events or _events[0][0] > time.monotonic():
+                timeout = _events[0][0] - time.monotonic() if _events else None
+                _condition.wait(timeout)
+            due, _, func, args = heapq.heappop(_events)
+
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"Scheduled event {getattr(func, '__name__', func)} failed: {e}")
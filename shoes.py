@@ -0,0 +1,92 @@
+import collections
+import queue
+import random
+import threading
+
+# --- Shoe Factory ---
+# Shuffling a 312-card shoe is the slowest thing a request can end up
+# doing, and it used to happen inside whichever /deal or /hit crossed the
+# reshuffle point, under the table lock. A ShoeFactory keeps up to
+# `pool_size` shuffled shoes ready per table and refills the pool from a
+# background thread, so taking a shoe is a deque pop. If a pool runs dry
+# (a burst of reshuffles, or a table's first shoe) the shoe is shuffled on
+# the spot, exactly as before.
+#
+# With a seed, every table shuffles with its own random.Random seeded from
+# (seed, table id), and each pool produces its shoes in order under a lock,
+# so a table sees the same sequence of shoes on every run no matter how
+# the background thread is scheduled.
+
+class _Pool:
+    """Ready shoes of one table and the generator that shuffles them"""
+
+    __slots__ = ('rng', 'ready', 'lock')
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.ready = collections.deque()
+        self.lock = threading.Lock()  # Held while shuffling, so shoes come out in RNG order
+
+class ShoeFactory:
+    """Shuffled shoes of card codes, prepared ahead of time per table"""
+
+    def __init__(self, cards, pool_size=1, seed=None):
+        """`cards` is the unshuffled shoe (a list of card codes); seed=None shuffles unpredictably"""
+        self.cards = list(cards)
+        self.pool_size = pool_size
+        self.seed = seed
+        self.hits = 0    # Shoes that were ready when taken
+        self.misses = 0  # Shoes shuffled on the spot
+        self._pools = {}
+        self._pools_lock = threading.Lock()
+        self._refills = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name='shoe-factory', daemon=True)
+        self._worker.start()
+
+    def take(self, table_id):
+        """The table's next shoe as a bytearray, dealt from the end"""
+        pool = self._pool(table_id)
+        try:
+            shoe = pool.ready.popleft()
+            self.hits += 1
+        except IndexError:
+            with pool.lock:
+                # The worker may have finished one while we waited for the lock
+                shoe = pool.ready.popleft() if pool.ready else self._shuffle(pool)
+            self.misses += 1
+        self._refills.put(table_id)
+        return shoe
+
+    def stats(self):
+        return {
+            'pool_size': self.pool_size,
+            'seeded': self.seed is not None,
+            'tables': len(self._pools),
+            'ready': sum(len(pool.ready) for pool in list(self._pools.values())),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def _pool(self, table_id):
+        pool = self._pools.get(table_id)
+        if pool is None:
+            with self._pools_lock:
+                pool = self._pools.get(table_id)
+                if pool is None:
+                    rng = random.Random(f"{self.seed}:{table_id}" if self.seed is not None else None)
+                    pool = self._pools[table_id] = _Pool(rng)
+        return pool
+
+    def _shuffle(self, pool):
+        """Must be called with pool.lock held"""
+        shoe = list(self.cards)
+        pool.rng.shuffle(shoe)
+        return bytearray(shoe)
+
+    def _run(self):
+        """Worker loop: top up the pools of tables that took a shoe"""
+        while True:
+            pool = self._pool(self._refills.get())
+            with pool.lock:
+                while len(pool.ready) < self.pool_size:
+                    pool.ready.append(self._shuffle(pool))
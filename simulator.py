@@ -0,0 +1,358 @@
+"""
+Monte Carlo blackjack simulator for the table rules in helpers.py.
+
+Plays many independent "lanes" (one player, one shoe each) side by side
+with NumPy, one round at a time, and spreads lanes over a process pool:
+
+    python simulator.py --hands 2000000 --strategy basic --workers 4
+    python simulator.py --verify 20000
+
+Rules follow helpers.py exactly: a NUMBER_OF_DECKS shoe rebuilt whenever
+fewer than 25% of its cards remain before a card is dealt, no dealer
+peek, dealer stands on all 17s, blackjack pays 3:2 (rounded down), and
+doubling / splitting require enough bank. Rounds in which the player
+splits (a few percent) are finished by the scalar helpers code itself, so
+split quirks such as resplits and playable split aces are reproduced.
+
+--verify plays the same seeded shoes through the helpers actions used by
+the routes and through the vectorized path, and compares every hand.
+
+Requires numpy (pip install numpy); the web app does not.
+"""
+import argparse
+import concurrent.futures
+import os
+import random
+import time
+
+import numpy as np
+
+import helpers
+import strategy
+
+SHOE_SIZE = 52 * helpers.NUMBER_OF_DECKS
+RESHUFFLE_BELOW = SHOE_SIZE * 0.25  # Same threshold as helpers.deal_card
+
+# Cards are simulated by point value (2-11, ace = 11); suits never matter
+CODE_VALUES = np.frombuffer(helpers.CARD_CODE_VALUES, dtype=np.uint8).astype(np.int8)
+BASE_SHOE = CODE_VALUES[helpers._build_shoe_internal()]
+# A helpers card code for each value, used when a lane's cards go back to helpers
+VALUE_CARD_CODES = np.array([helpers.CARD_CODE_VALUES.index(value) if value >= 2 else 0
+                             for value in range(12)], dtype=np.uint8)
+
+HI_LO = np.zeros(12, dtype=np.int32)
+HI_LO[2:7] = 1
+HI_LO[10:12] = -1
+
+HIT, STAND, DOUBLE = 0, 1, 2
+ACTION_CODES = {'H': HIT, 'S': STAND, 'D': DOUBLE}
+
+def compile_strategy(strat):
+    """
+    Turn a strategy.Strategy into lookup arrays:
+    actions[can_double, soft, total, dealer_up] and splits[pair_value, dealer_up].
+    """
+    actions = np.zeros((2, 2, 22, 12), dtype=np.int8)
+    splits = np.zeros((12, 12), dtype=bool)
+    for can_double in (0, 1):
+        for soft in (0, 1):
+            for total in range(22):
+                for up in range(2, 12):
+                    action = strat.action(total, soft, 0, up, bool(can_double), False)
+                    actions[can_double, soft, total, up] = ACTION_CODES[action]
+    for pair_value in range(2, 12):
+        for up in range(2, 12):
+            splits[pair_value, up] = strat.action(0, False, pair_value, up, True, True) == 'P'
+    return actions, splits
+
+def _add_card(total, aces, values):
+    """Add one card to hands in place, counting aces as 1 when needed to stay at 21 or under"""
+    total += values
+    aces += values == 11
+    for _ in range(2):  # One card can force at most two aces down to 1
+        soften = (total > 21) & (aces > 0)
+        total[soften] -= 10
+        aces[soften] -= 1
+
+class BatchTable:
+    """Many independent one-player tables advanced together, one round per call"""
+
+    def __init__(self, lanes, rng, strat, bankroll, bet_units=1, ramp_units=0):
+        self.lanes = lanes
+        self.rng = rng
+        self.strat = strat
+        self.actions, self.splits = compile_strategy(strat)
+        self.bet_units = bet_units
+        self.ramp_units = ramp_units
+        self.cards = np.zeros((lanes, SHOE_SIZE), dtype=np.int8)
+        self.top = np.zeros(lanes, dtype=np.int64)  # Cards left; 0 forces a shuffle
+        self.running_count = np.zeros(lanes, dtype=np.int64)
+        self.bank = np.full(lanes, bankroll, dtype=np.int64)
+        self._scratch = helpers.Table('simulator', '')
+        self._scratch.log_shoes = False
+        # Split rounds that run out of cards reshuffle on the scratch table: seeded too
+        self._scratch.rng = random.Random(int(rng.integers(2 ** 63)))
+
+    def load_shoe(self, lane, cards):
+        """Put a helpers shoe (bytearray of card codes, dealt from the end) into a lane"""
+        self.cards[lane, :len(cards)] = CODE_VALUES[np.frombuffer(bytes(cards), dtype=np.uint8)]
+        self.top[lane] = len(cards)
+        self.running_count[lane] = -HI_LO[self.cards[lane, :len(cards)]].sum()
+
+    def _reshuffle(self, rows):
+        block = np.tile(BASE_SHOE, (len(rows), 1))
+        self.rng.permuted(block, axis=1, out=block)
+        self.cards[rows] = block
+        self.top[rows] = SHOE_SIZE
+        self.running_count[rows] = 0
+
+    def draw(self, rows):
+        """Deal one card to each lane in rows, rebuilding shoes that ran low"""
+        low = rows[self.top[rows] < RESHUFFLE_BELOW]
+        if len(low):
+            self._reshuffle(low)
+        self.top[rows] -= 1
+        values = self.cards[rows, self.top[rows]]
+        self.running_count[rows] += HI_LO[values]
+        return values.astype(np.int64)
+
+    def bets(self, rows):
+        """Flat bets, or a Hi-Lo ramp of 1 to ramp_units units by true count"""
+        units = np.full(len(rows), self.bet_units, dtype=np.int64)
+        if self.ramp_units:
+            decks_left = np.maximum(self.top[rows], 1) / 52
+            true_count = np.floor(self.running_count[rows] / decks_left)
+            units *= np.clip(true_count, 1, self.ramp_units).astype(np.int64)
+        return np.minimum(units * helpers.MIN_BET, self.bank[rows])
+
+    def play_round(self, rows):
+        """Play one round on the given lanes; returns (initial bets, net results)"""
+        bank_before = self.bank[rows].copy()
+        bet = self.bets(rows)
+        self.bank[rows] -= bet
+
+        p1 = self.draw(rows)
+        hole = self.draw(rows)
+        p2 = self.draw(rows)
+        up = self.draw(rows)
+
+        total = np.zeros(len(rows), dtype=np.int64)
+        aces = np.zeros(len(rows), dtype=np.int64)
+        _add_card(total, aces, p1)
+        _add_card(total, aces, p2)
+        natural = total == 21
+
+        bank = self.bank[rows]
+        split = (~natural & (p1 == p2) & (bank >= bet) & self.splits[p1, up])
+        if split.any():
+            for i in np.nonzero(split)[0]:
+                self._play_split_round(rows[i], bet[i], p1[i], hole[i], p2[i], up[i])
+
+        # status: 0 playing, 1 stood, 2 bust
+        status = np.where(natural | split, 1, 0)
+        hand_bet = bet.copy()
+        can_double = True
+        while True:
+            playing = np.nonzero(status == 0)[0]
+            if not len(playing):
+                break
+            allow = (self.bank[rows[playing]] >= hand_bet[playing]) if can_double else np.zeros(len(playing), bool)
+            act = self.actions[allow.astype(np.int64), (aces[playing] > 0).astype(np.int64),
+                               total[playing], up[playing]]
+
+            status[playing[act == STAND]] = 1
+
+            doubling = playing[act == DOUBLE]
+            if len(doubling):
+                self.bank[rows[doubling]] -= hand_bet[doubling]
+                hand_bet[doubling] *= 2
+
+            drawing = playing[act != STAND]
+            if len(drawing):
+                t, a = total[drawing], aces[drawing]
+                _add_card(t, a, self.draw(rows[drawing]))
+                total[drawing], aces[drawing] = t, a
+                status[drawing[t > 21]] = 2
+                status[drawing[t == 21]] = 1
+                status[doubling[total[doubling] <= 21]] = 1
+            can_double = False
+
+        # Dealer plays unless the only hand busted (split rounds are already settled)
+        dealer = np.nonzero((status == 1) & ~split)[0]
+        dealer_total = np.zeros(len(rows), dtype=np.int64)
+        dealer_aces = np.zeros(len(rows), dtype=np.int64)
+        dealer_cards = np.full(len(rows), 2, dtype=np.int64)
+        _add_card(dealer_total, dealer_aces, hole)
+        _add_card(dealer_total, dealer_aces, up)
+        while True:
+            drawing = dealer[dealer_total[dealer] < 17]
+            if not len(drawing):
+                break
+            t, a = dealer_total[drawing], dealer_aces[drawing]
+            _add_card(t, a, self.draw(rows[drawing]))
+            dealer_total[drawing], dealer_aces[drawing] = t, a
+            dealer_cards[drawing] += 1
+
+        # Settle exactly like helpers.determine_winners
+        payout = np.zeros(len(rows), dtype=np.int64)
+        dealer_blackjack = (dealer_total == 21) & (dealer_cards == 2)
+        payout[natural] = np.where(dealer_blackjack[natural], bet[natural], bet[natural] * 5 // 2)
+        stood = np.nonzero((status == 1) & ~natural & ~split)[0]
+        player, dealer_value = total[stood], dealer_total[stood]
+        payout[stood] = np.where((dealer_value > 21) | (player > dealer_value), 2 * hand_bet[stood],
+                                 np.where(player == dealer_value, hand_bet[stood], 0))
+        self.bank[rows] += payout
+        return bet, self.bank[rows] - bank_before
+
+    def _play_split_round(self, lane, bet, p1, hole, p2, up):
+        """Finish a round that starts with a split on the scalar helpers code"""
+        table = self._scratch
+        top = self.top[lane]
+        shoe = bytearray(VALUE_CARD_CODES[self.cards[lane, :top]].tobytes())
+        helpers.load_shoe(table, shoe)
+        helpers.reset_game_state(table)
+        game_state = table.game_state
+        hand = helpers.Hand([int(VALUE_CARD_CODES[p1]), int(VALUE_CARD_CODES[p2])])
+        game_state.update({
+            'player_hands': [{'hand': hand, 'value': hand.value,
+                              'status': 'playing', 'bet': int(bet)}],
+            'active_hand_index': 0,
+            'dealer_hand': helpers.Hand([int(VALUE_CARD_CODES[hole]), int(VALUE_CARD_CODES[up])]),
+            'dealer_value': int(up),
+            'game_status': 'playing',
+            'current_bet': int(bet),
+            'bank': int(self.bank[lane]),
+        })
+        helpers.update_hand_options(table)
+        strategy.play_hand(self.strat, table)
+
+        self.bank[lane] = game_state['bank']
+        if table.shoe is shoe:
+            # Cards were only popped off the end: the lane's shoe is still valid
+            left = len(shoe)
+            self.running_count[lane] += HI_LO[self.cards[lane, left:top]].sum()
+            self.top[lane] = left
+        else:
+            self.load_shoe(lane, table.shoe)
+
+def _run_lanes(args):
+    """Process pool worker: simulate `lanes` players for `rounds` rounds each"""
+    seed, lanes, rounds, strategy_spec, bankroll, bet_units, ramp_units = args
+    sim = BatchTable(lanes, np.random.default_rng(seed), strategy.load(strategy_spec),
+                     bankroll, bet_units, ramp_units)
+    totals = {'hands': 0, 'net': 0, 'net_sq': 0, 'wagered': 0, 'wins': 0, 'losses': 0}
+    all_lanes = np.arange(lanes)
+    for _ in range(rounds):
+        rows = all_lanes[sim.bank >= helpers.MIN_BET]
+        if not len(rows):
+            break
+        bet, net = sim.play_round(rows)
+        totals['hands'] += len(rows)
+        totals['net'] += int(net.sum())
+        totals['net_sq'] += int((net * net).sum())
+        totals['wagered'] += int(bet.sum())
+        totals['wins'] += int((net > 0).sum())
+        totals['losses'] += int((net < 0).sum())
+    totals['lanes'] = lanes
+    totals['ruined'] = int((sim.bank < helpers.MIN_BET).sum())
+    totals['final_bank'] = int(sim.bank.sum())
+    return totals
+
+def simulate(hands, strategy_spec='basic', bankroll=helpers.STARTING_BANK, bet_units=1,
+             ramp_units=0, rounds=100, workers=None, seed=None):
+    """
+    Simulate about `hands` hands as players who each play up to `rounds`
+    rounds from `bankroll`, and return EV, variance and risk-of-ruin figures.
+    """
+    workers = workers or os.cpu_count() or 1
+    lanes = max(1, hands // rounds)
+    chunks = [lanes // workers + (i < lanes % workers) for i in range(workers)]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    jobs = [(seeds[i], chunk, rounds, strategy_spec, bankroll, bet_units, ramp_units)
+            for i, chunk in enumerate(chunks) if chunk]
+
+    start = time.perf_counter()
+    if len(jobs) == 1:
+        results = [_run_lanes(jobs[0])]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(len(jobs)) as pool:
+            results = list(pool.map(_run_lanes, jobs))
+    elapsed = time.perf_counter() - start
+
+    total = {key: sum(r[key] for r in results) for key in results[0]}
+    n = total['hands']
+    mean = total['net'] / n
+    variance = total['net_sq'] / n - mean * mean
+    return {
+        'hands': n,
+        'players': total['lanes'],
+        'rounds_per_player': rounds,
+        'ev_per_hand': mean,
+        'ev_per_unit_wagered': total['net'] / total['wagered'],
+        'variance_per_hand': variance,
+        'std_per_hand': variance ** 0.5,
+        'std_error': (variance / n) ** 0.5,
+        'win_rate': total['wins'] / n,
+        'loss_rate': total['losses'] / n,
+        'risk_of_ruin': total['ruined'] / total['lanes'],
+        'mean_final_bank': total['final_bank'] / total['lanes'],
+        'seconds': elapsed,
+        'hands_per_second': n / elapsed,
+    }
+
+def verify(hands, strategy_spec='basic', bankroll=100000, seed=0):
+    """
+    Play `hands` seeded shoes through the helpers actions used by the routes
+    and through BatchTable, and return the hands whose results differ.
+    """
+    strat = strategy.load(strategy_spec)
+    sim = BatchTable(hands, np.random.default_rng(seed), strat, bankroll)
+    expected = []
+    for lane in range(hands):
+        shoe = helpers._build_shoe_internal()
+        random.Random(seed + lane).shuffle(shoe)
+        shoe = bytearray(shoe)
+        sim.load_shoe(lane, shoe)
+
+        table = helpers.Table('verify', '')
+        table.log_shoes = False
+        helpers.load_shoe(table, shoe)
+        table.game_state['bank'] = bankroll
+        helpers.start_hand(table, strategy.no_send)
+        strategy.play_hand(strat, table)
+        expected.append((table.game_state['bank'] - bankroll, len(table.shoe)))
+
+    _, net = sim.play_round(np.arange(hands))
+    return [(lane, expected[lane], (int(net[lane]), int(sim.top[lane])))
+            for lane in range(hands)
+            if expected[lane] != (int(net[lane]), int(sim.top[lane]))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--hands', type=int, default=1000000)
+    parser.add_argument('--strategy', default='basic', choices=sorted(strategy.BUILT_IN))
+    parser.add_argument('--bankroll', type=int, default=helpers.STARTING_BANK)
+    parser.add_argument('--bet-units', type=int, default=1, help='Bet in units of MIN_BET')
+    parser.add_argument('--ramp', type=int, default=0,
+                        help='Spread bets 1..RAMP units by Hi-Lo true count (0 = flat)')
+    parser.add_argument('--rounds', type=int, default=100, help='Rounds per simulated player')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--verify', type=int, metavar='HANDS',
+                        help='Compare HANDS seeded hands against the helpers code path')
+    args = parser.parse_args()
+
+    if args.verify:
+        mismatches = verify(args.verify, args.strategy, args.bankroll, args.seed or 0)
+        for lane, expected, actual in mismatches[:10]:
+            print(f"hand {lane}: helpers (net, cards left) {expected} != simulator {actual}")
+        print(f"{args.verify - len(mismatches)}/{args.verify} hands match")
+        raise SystemExit(1 if mismatches else 0)
+
+    results = simulate(args.hands, args.strategy, args.bankroll, args.bet_units, args.ramp,
+                       args.rounds, args.workers, args.seed)
+    for key, value in results.items():
+        print(f"{key:>20}: {value:.6g}" if isinstance(value, float) else f"{key:>20}: {value}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+import random
+import struct
+
+import helpers
+
+# --- Table Snapshots ---
+# A table's game state, the exact order of the cards left in its shoe and
+# the state of its own RNG (if it shuffles with one, see Table.rng) as one
+# binary blob. Restoring puts the table back exactly: the same cards come
+# out of the shoe and, with an RNG, the same shoes follow. Tables
+# shuffling from the shoe factory take their next shoe from it as usual.
+#
+#   size      field
+#   4         MAGIC
+#   1         VERSION
+#   1         flags (FLAG_*)
+#   _FIXED    bank, current bet, shoe id, round id, next wire sequence
+#             number, revision, active hand index, game status, dealer
+#             value, player hand count, cards remaining, message length,
+#             true count the round was dealt at
+#   m         message (UTF-8)
+#   1 + d     dealer card count and codes
+#   per hand  _HAND (status, bet, value, card count) and card codes
+#   2 + s     shoe length and codes, dealt from the end
+#   _RNG      Mersenne Twister state (with FLAG_RNG), then a double (with FLAG_GAUSS)
+#
+# Integers are little-endian. A blob of another version is refused rather
+# than guessed at; bump VERSION whenever the layout changes.
+
+MAGIC = b'BJSN'
+VERSION = 1
+FLAG_DEALER_HIDDEN = 0x01
+FLAG_CAN_SPLIT = 0x02
+FLAG_CAN_DOUBLE = 0x04
+FLAG_RNG = 0x08
+FLAG_GAUSS = 0x10  # The RNG holds a spare gauss() value
+
+GAME_STATUSES = ('waiting', 'playing', 'dealer_turn', 'complete')
+HAND_STATUSES = ('playing', 'pending', 'stood', 'bust', 'blackjack', 'win', 'lose', 'tie')
+_GAME_STATUS_CODES = {status: code for code, status in enumerate(GAME_STATUSES)}
+_HAND_STATUS_CODES = {status: code for code, status in enumerate(HAND_STATUSES)}
+
+_HEADER = struct.Struct('<4sBB')
+_FIXED = struct.Struct('<qqIIIIbBBBHHd')
+_HAND = struct.Struct('<BqBB')
+_COUNT = struct.Struct('<B')
+_SHOE_LENGTH = struct.Struct('<H')
+_RNG = struct.Struct('<625I')  # random.Random.getstate(): 624 words and the position in them
+_GAUSS = struct.Struct('<d')
+_RNG_VERSION = 3
+
+def dump(table):
+    """The table as a snapshot blob; hold its lock"""
+    state = table.game_state
+    flags = ((FLAG_DEALER_HIDDEN if state['dealer_hidden'] else 0) |
+             (FLAG_CAN_SPLIT if state['can_split'] else 0) |
+             (FLAG_CAN_DOUBLE if state['can_double'] else 0))
+    rng_state = None
+    if table.rng is not None:
+        _, rng_state, gauss_next = table.rng.getstate()
+        flags |= FLAG_RNG | (FLAG_GAUSS if gauss_next is not None else 0)
+    message = state['message'].encode('utf-8')
+    hands = state['player_hands']
+    dealer = state['dealer_hand']
+
+    parts = [
+        _HEADER.pack(MAGIC, VERSION, flags),
+        _FIXED.pack(state['bank'], state['current_bet'], table.shoe_id, table.round_id, table.next_seq,
+                    table.revision, state['active_hand_index'], _GAME_STATUS_CODES[state['game_status']],
+                    state['dealer_value'], len(hands), state['cards_remaining'], len(message),
+                    table.round_true_count),
+        message,
+        _COUNT.pack(len(dealer)), bytes(dealer.cards),
+    ]
+    for hand in hands:
+        parts.append(_HAND.pack(_HAND_STATUS_CODES[hand['status']], hand['bet'], hand['value'], len(hand['hand'])))
+        parts.append(bytes(hand['hand'].cards))
+    parts.append(_SHOE_LENGTH.pack(len(table.shoe)))
+    parts.append(bytes(table.shoe))
+    if rng_state is not None:
+        parts.append(_RNG.pack(*rng_state))
+        if gauss_next is not None:
+            parts.append(_GAUSS.pack(gauss_next))
+    return b''.join(parts)
+
+def _validate(bank, current_bet, active_hand_index, status, dealer, hands, shoe, cards_remaining):
+    """Raise ValueError unless a parsed snapshot describes a state the game can carry on from"""
+    if len(shoe) > len(helpers.CARD_NAMES) * helpers.NUMBER_OF_DECKS:
+        raise ValueError("Invalid table snapshot: more cards in the shoe than in a full one")
+    if shoe and max(shoe) >= len(helpers.CARD_NAMES):
+        raise ValueError("Invalid table snapshot: unknown card code in the shoe")
+    for hand in [dealer] + [hand['hand'] for hand in hands]:
+        if hand.hard_total > helpers.MAX_HARD_TOTAL:
+            raise ValueError("Invalid table snapshot: hand total out of range")
+    if any(hand['value'] > helpers.MAX_HARD_TOTAL or hand['bet'] < 0 for hand in hands):
+        raise ValueError("Invalid table snapshot: hand value or bet out of range")
+    if cards_remaining != len(shoe):
+        raise ValueError("Invalid table snapshot: cards remaining does not match the shoe")
+    if bank < 0 or current_bet < helpers.MIN_BET:
+        raise ValueError("Invalid table snapshot: negative bank or bet below the minimum")
+    if not -1 <= active_hand_index <= len(hands):
+        raise ValueError("Invalid table snapshot: active hand index out of range")
+    if status == 'playing' and not 0 <= active_hand_index < len(hands):
+        raise ValueError("Invalid table snapshot: no active hand to play")
+    if status in ('playing', 'dealer_turn') and len(dealer) < 2:
+        raise ValueError("Invalid table snapshot: the dealer has not been dealt")
+
+def _apply(table, blob):
+    """Set the table's state, shoe and RNG from a blob; returns the snapshot's revision"""
+    try:
+        magic, version, flags = _HEADER.unpack_from(blob)
+        if magic != MAGIC:
+            raise ValueError("Not a table snapshot")
+        if version != VERSION:
+            raise ValueError(f"Snapshot version {version} is not supported (expected {VERSION})")
+        offset = _HEADER.size
+        (bank, current_bet, shoe_id, round_id, next_seq, revision, active_hand_index, game_status,
+         dealer_value, hand_count, cards_remaining, message_length, round_true_count) = _FIXED.unpack_from(blob, offset)
+        offset += _FIXED.size
+        message = bytes(blob[offset:offset + message_length]).decode('utf-8')
+        offset += message_length
+        count = blob[offset]
+        dealer = helpers.Hand(blob[offset + 1:offset + 1 + count])
+        offset += 1 + count
+        hands = []
+        for _ in range(hand_count):
+            status, bet, value, count = _HAND.unpack_from(blob, offset)
+            offset += _HAND.size
+            hands.append({'hand': helpers.Hand(blob[offset:offset + count]), 'value': value,
+                          'status': HAND_STATUSES[status], 'bet': bet})
+            offset += count
+        (shoe_length,) = _SHOE_LENGTH.unpack_from(blob, offset)
+        offset += _SHOE_LENGTH.size
+        shoe = bytearray(blob[offset:offset + shoe_length])
+        offset += shoe_length
+        rng = None
+        if flags & FLAG_RNG:
+            words = _RNG.unpack_from(blob, offset)
+            offset += _RNG.size
+            gauss_next = None
+            if flags & FLAG_GAUSS:
+                (gauss_next,) = _GAUSS.unpack_from(blob, offset)
+                offset += _GAUSS.size
+            rng = random.Random()
+            rng.setstate((_RNG_VERSION, words, gauss_next))
+        status = GAME_STATUSES[game_status]
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"Malformed table snapshot: {e}") from None
+    if offset != len(blob) or len(shoe) != shoe_length:
+        raise ValueError("Malformed table snapshot: wrong length")
+    _validate(bank, current_bet, active_hand_index, status, dealer, hands, shoe, cards_remaining)
+
+    helpers._set_shoe(table, shoe)
+    table.shoe_id = shoe_id
+    # Round ids only go up: the hand log and its index rely on it
+    table.round_id = max(table.round_id, round_id)
+    table.next_seq = next_seq
+    table.round_true_count = round_true_count
+    table.rng = rng
+    state = table.game_state
+    state.clear()
+    state.update({
+        'player_hands': hands,
+        'active_hand_index': active_hand_index,
+        'dealer_hand': dealer,
+        'dealer_value': dealer_value,
+        'dealer_hidden': bool(flags & FLAG_DEALER_HIDDEN),
+        'game_status': status,
+        'message': message,
+        'can_split': bool(flags & FLAG_CAN_SPLIT),
+        'can_double': bool(flags & FLAG_CAN_DOUBLE),
+        'current_bet': current_bet,
+        'bank': bank,
+        'cards_remaining': cards_remaining,
+    })
+    return revision
+
+def load(table, blob):
+    """
+    Restore a table from a snapshot blob in place; hold its lock. The state
+    gets a new revision, the snapshot's unless the table is already past
+    it, and keeps its round id if that is past the snapshot's. Raises ValueError for a blob that is not a snapshot of this version.
+    """
+    revision = _apply(table, blob)
+    table.history.clear()
+    table.state_body = None
+    table.revision = max(revision, table.revision + 1) - 1
+    helpers.commit_state(table)
+
+def fork(blob, table_id='fork', topic=''):
+    """
+    A new table at the snapshot's position, for playing out what-ifs from
+    it: private (not in helpers.tables), without hand log, statistics or
+    committed state.
+    """
+    table = helpers.Table(table_id, topic)
+    table.revision = _apply(table, blob)
+    return table
@@ -0,0 +1,43 @@
+# --- State Patches ---
+# Computes JSON Patch (RFC 6902) operations that turn one revision of a
+# table's state into another. Game states are small and change in typical
+# ways (a card appended to a hand, a few scalars replaced), so a plain
+# recursive walk produces compact patches without a general diff algorithm.
+
+def _escape(key):
+    """Escape a key for use in a JSON Pointer"""
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+def diff(old, new, path=''):
+    """Return the list of patch operations turning `old` into `new`"""
+    if type(old) is not type(new):
+        return [{'op': 'replace', 'path': path, 'value': new}]
+
+    if isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            key_path = f"{path}/{_escape(key)}"
+            if key not in old:
+                ops.append({'op': 'add', 'path': key_path, 'value': value})
+            elif old[key] != value:
+                ops.extend(diff(old[key], value, key_path))
+        return ops
+
+    if isinstance(new, list):
+        if len(new) < len(old):
+            return [{'op': 'replace', 'path': path, 'value': new}]
+        ops = []
+        for index, value in enumerate(old):
+            if value != new[index]:
+                ops.extend(diff(value, new[index], f"{path}/{index}"))
+        # Appended items (a dealt card, a split hand) become 'add' operations
+        for index in range(len(old), len(new)):
+            ops.append({'op': 'add', 'path': f"{path}/{index}", 'value': new[index]})
+        return ops
+
+    if old != new:
+        return [{'op': 'replace', 'path': path, 'value': new}]
+    return []
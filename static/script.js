@@ -1,5 +1,11 @@
 let gameState = null;
 let previousState = null;
+let stateStream = null;
+
+// Card images bundled into cards.js by assets.py, or one file per card without a build
+function cardImageSource(name, path) {
+    return (typeof CARD_IMAGES !== 'undefined' && CARD_IMAGES[name]) || path;
+}
 
 function createCard(rank, hidden = false, shouldAnimate = true) {
     const card = document.createElement('div');
@@ -20,7 +26,7 @@ function createCard(rank, hidden = false, shouldAnimate = true) {
     img.className = 'card-image';
 
     if (hidden) {
-        img.src = '/static/images/back.png';
+        img.src = cardImageSource('back', '/static/images/back.png');
         img.alt = 'Hidden Card';
     } else {
         const suitMap = {
@@ -32,7 +38,7 @@ function createCard(rank, hidden = false, shouldAnimate = true) {
         
         const suitChar = rank.slice(-1);
         const suitFolder = suitMap[suitChar] || 'hearts';
-        img.src = `/static/images/${suitFolder}/${rank}.png`; 
+        img.src = cardImageSource(rank, `/static/images/${suitFolder}/${rank}.png`);
         
         const rankMap = {
             'A': 'Ace', 'K': 'King', 'Q': 'Queen', 'J': 'Jack', 'T': '10',
@@ -135,6 +141,11 @@ function updateDisplay(state) {
         return;
     }
     
+    // The stream and the action response usually carry the same state
+    if (previousState && JSON.stringify(state) === JSON.stringify(previousState)) {
+        return;
+    }
+    
     const previousDealerHand = previousState ? previousState.dealer_hand : [];
     const previousPlayerHands = previousState ? previousState.player_hands : [];
     
@@ -223,11 +234,26 @@ function updateDisplay(state) {
         document.getElementById('double-btn').disabled = true;
         document.getElementById('split-btn').disabled = true;
 
-        // Call the next dealer step after 1 second
-        setTimeout(dealerStep, 300); 
+        // The server plays the dealer's turn and streams each step;
+        // without a stream, drive it one request at a time
+        if (!isStreamOpen()) {
+            setTimeout(dealerStep, 300);
+        }
     }
 }
 
+function isStreamOpen() {
+    return stateStream !== null && stateStream.readyState === EventSource.OPEN;
+}
+
+function connectStateStream() {
+    if (!window.EventSource) {
+        return;
+    }
+    stateStream = new EventSource(`${API_BASE}/stream`);
+    stateStream.onmessage = (event) => updateDisplay(JSON.parse(event.data));
+}
+
 function setBet(amount) {
     const betInput = document.getElementById('bet-input');
     
@@ -247,14 +273,14 @@ async function deal() {
         
         // Set the bet first
         const betAmount = parseInt(document.getElementById('bet-input').value);
-        await fetch('/set_bet', {
+        await fetch(`${API_BASE}/set_bet`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ amount: betAmount })
         });
         
         // Then deal
-        const response = await fetch('/deal', { method: 'POST' });
+        const response = await fetch(`${API_BASE}/deal`, { method: 'POST' });
         const state = await response.json();
         updateDisplay(state);
     } catch (error) {
@@ -265,7 +291,7 @@ async function deal() {
 
 async function hit() {
     try {
-        const response = await fetch('/hit', { method: 'POST' });
+        const response = await fetch(`${API_BASE}/hit`, { method: 'POST' });
         const state = await response.json();
         updateDisplay(state);
     } catch (error) {
@@ -275,7 +301,7 @@ async function hit() {
 
 async function stand() {
     try {
-        const response = await fetch('/stand', { method: 'POST' });
+        const response = await fetch(`${API_BASE}/stand`, { method: 'POST' });
         const state = await response.json();
         updateDisplay(state);
     } catch (error) {
@@ -285,7 +311,7 @@ async function stand() {
 
 async function doubleDown() {
     try {
-        const response = await fetch('/double', { method: 'POST' });
+        const response = await fetch(`${API_BASE}/double`, { method: 'POST' });
         const state = await response.json();
         updateDisplay(state);
     } catch (error) {
@@ -295,7 +321,7 @@ async function doubleDown() {
 
 async function split() {
     try {
-        const response = await fetch('/split', { method: 'POST' });
+        const response = await fetch(`${API_BASE}/split`, { method: 'POST' });
         const state = await response.json();
         updateDisplay(state);
     } catch (error) {
@@ -305,7 +331,11 @@ async function split() {
 
 async function dealerStep() {
     try {
-        const response = await fetch('/dealer_step', { method: 'POST' });
+        let response = await fetch(`${API_BASE}/dealer_step`, { method: 'POST' });
+        if (response.status === 400) {
+            // The server already finished the dealer's turn
+            response = await fetch(`${API_BASE}/state`);
+        }
         if (!response.ok) {
             throw new Error(`Server error: ${response.status}`);
         }
@@ -320,9 +350,9 @@ async function dealerStep() {
 async function resetBankAndShuffle() {
     try {
         // Reset bank
-        await fetch('/reset_bank', { method: 'POST' });
+        await fetch(`${API_BASE}/reset_bank`, { method: 'POST' });
         // Shuffle deck
-        const response = await fetch('/shuffle', { method: 'POST' });
+        const response = await fetch(`${API_BASE}/shuffle`, { method: 'POST' });
         const state = await response.json();
         updateDisplay(state);
     } catch (error) {
@@ -339,21 +369,22 @@ const CARD_VALUES = {
 // Load initial state on page load
 window.onload = async function() {
     try {
-        const response = await fetch('/state');
+        const response = await fetch(`${API_BASE}/state`);
         const state = await response.json();
         updateDisplay(state);
     } catch (error) {
         console.error('Error loading state:', error);
     }
+    connectStateStream();
 
 };
 
 async function resetBankAndShuffle() {
     try {
         // Reset bank
-        await fetch('/reset_bank', { method: 'POST' });
+        await fetch(`${API_BASE}/reset_bank`, { method: 'POST' });
         // Shuffle deck
-        const response = await fetch('/shuffle', { method: 'POST' });
+        const response = await fetch(`${API_BASE}/shuffle`, { method: 'POST' });
         const state = await response.json();
         updateDisplay(state);
     } catch (error) {
@@ -372,7 +403,7 @@ async function updateMqttConfig() {
         const port = parseInt(document.getElementById('mqtt-port').value);
         const topic = document.getElementById('mqtt-topic').value;
         
-        const response = await fetch('/update_mqtt', {
+        const response = await fetch(`${API_BASE}/update_mqtt`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ broker, port, topic })
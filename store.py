@@ -0,0 +1,226 @@
+import atexit
+import json
+import sqlite3
+import threading
+import time
+
+import helpers
+
+# --- Table Store ---
+# Keeps every table's state (bank, bet, the hand in progress), its shoe and
+# its MQTT settings in SQLite so a restart picks up where the tables left
+# off. Requests only record the table's latest serialized state in memory;
+# a background thread writes whatever changed every FLUSH_INTERVAL seconds
+# in one transaction, so a burst of actions on a table costs one row
+# write, and many tables share one commit. The database runs in WAL mode
+# with synchronous=NORMAL: a crash of the server loses at most the last
+# interval, and SQLite rolls back a half-written batch on the next start.
+#
+# With more than one worker process, each would hold its own copy of every
+# table. SharedTableStore makes the database the one copy instead: a
+# request first brings its table up to the stored revision, and its write
+# only succeeds if the stored revision is still the one it started from,
+# so two workers acting on a table at once cannot overwrite each other.
+
+FLUSH_INTERVAL = 0.25
+BUSY_TIMEOUT = 10.0  # Seconds a write waits for another process holding the database lock
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tables (
+    table_id TEXT PRIMARY KEY,
+    topic TEXT NOT NULL,
+    state TEXT NOT NULL,
+    shoe BLOB NOT NULL,
+    shoe_id INTEGER NOT NULL,
+    round_id INTEGER NOT NULL,
+    saved_at REAL NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 0,
+    next_seq INTEGER NOT NULL DEFAULT 0,
+    mqtt TEXT NOT NULL DEFAULT '{}'
+)
+"""
+_ADDED_COLUMNS = {  # Columns newer than the first schema, added to older files on open
+    'revision': 'INTEGER NOT NULL DEFAULT 0',
+    'next_seq': 'INTEGER NOT NULL DEFAULT 0',
+    'mqtt': "TEXT NOT NULL DEFAULT '{}'",
+}
+_COLUMNS = "table_id, topic, state, shoe, shoe_id, round_id, saved_at, revision, next_seq, mqtt"
+_UPSERT = f"INSERT OR REPLACE INTO tables ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_INSERT_NEW = f"INSERT OR IGNORE INTO tables ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_UPDATE_IF_REVISION = """
+UPDATE tables SET topic = ?, state = ?, shoe = ?, shoe_id = ?, round_id = ?, saved_at = ?, revision = ?, next_seq = ?,
+    mqtt = ?
+WHERE table_id = ? AND revision = ?
+"""
+_SELECT = "SELECT topic, state, shoe, shoe_id, round_id, revision, next_seq, mqtt FROM tables WHERE table_id = ?"
+
+def _row(table):
+    """The table's row, in _COLUMNS order; hold the table's lock"""
+    # The table's own MQTT settings; None for those it takes from the app
+    mqtt = json.dumps({'broker': helpers.table_broker(table), 'qos': table.qos, 'wire_format': table.wire_format})
+    return (table.table_id, table.topic, table.state_body, bytes(table.shoe), table.shoe_id,
+            table.round_id, time.time(), table.revision, table.next_seq, mqtt)
+
+def _saved(row):
+    """A row selected with _SELECT as the dict helpers.restore_table takes"""
+    topic, state, shoe, shoe_id, round_id, revision, next_seq, mqtt = row
+    return {'topic': topic, 'state': state, 'shoe': shoe, 'shoe_id': shoe_id,
+            'round_id': round_id, 'revision': revision, 'next_seq': next_seq, 'mqtt': mqtt}
+
+class _Database:
+    """The SQLite file both stores keep their rows in, shared by the threads of one process"""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute(_SCHEMA)
+            columns = {column[1] for column in self._db.execute("PRAGMA table_info(tables)")}
+            for column, definition in _ADDED_COLUMNS.items():
+                if column not in columns:
+                    self._db.execute(f"ALTER TABLE tables ADD COLUMN {column} {definition}")
+        self._db_lock = threading.Lock()
+
+    def load(self, table_id):
+        """The saved row of a table as a dict, or None"""
+        with self._db_lock:
+            row = self._db.execute(_SELECT, (table_id,)).fetchone()
+        return None if row is None else _saved(row)
+
+    def table_ids(self):
+        with self._db_lock:
+            return [table_id for (table_id,) in self._db.execute("SELECT table_id FROM tables")]
+
+    def close(self):
+        self.flush()
+        with self._db_lock:
+            self._db.close()
+
+class TableStore(_Database):
+    """Write-behind persistence of table state in a SQLite database at `path`"""
+
+    shared = False  # Tables live in this process; the database only keeps a copy
+
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL):
+        super().__init__(path)
+        self.flush_interval = flush_interval
+        self._pending = {}  # table id -> row waiting to be written
+        self._pending_lock = threading.Lock()
+        self._saved_revisions = {}  # table id -> last revision handed to save()
+        self._counters = {'saves': 0, 'coalesced': 0, 'rows_written': 0, 'batches': 0, 'failed': 0}
+        self._worker = threading.Thread(target=self._run, name='table-store', daemon=True)
+        self._worker.start()
+        atexit.register(self.flush)
+
+    def save(self, table):
+        """
+        Record the table's current state for the next flush. Must be called
+        with the table's lock held, after helpers.commit_state.
+        """
+        if self._saved_revisions.get(table.table_id) == table.revision:
+            return
+        self._saved_revisions[table.table_id] = table.revision
+        row = _row(table)
+        with self._pending_lock:
+            if table.table_id in self._pending:
+                self._counters['coalesced'] += 1
+            self._pending[table.table_id] = row
+            self._counters['saves'] += 1
+
+    def flush(self):
+        """Write every pending row in one transaction"""
+        with self._pending_lock:
+            if not self._pending:
+                return
+            rows = list(self._pending.values())
+            self._pending = {}
+        try:
+            with self._db_lock, self._db:
+                self._db.executemany(_UPSERT, rows)
+        except sqlite3.Error as e:
+            print(f"Table store write failed, {len(rows)} table(s) not saved: {e}")
+            with self._pending_lock:
+                self._counters['failed'] += 1
+                for row in rows:
+                    # Retry with the next flush unless a newer state is already waiting
+                    self._pending.setdefault(row[0], row)
+            return
+        with self._pending_lock:
+            self._counters['rows_written'] += len(rows)
+            self._counters['batches'] += 1
+
+    def stats(self):
+        with self._pending_lock:
+            stats = dict(self._counters)
+            stats['pending'] = len(self._pending)
+        return stats
+
+    def _run(self):
+        """Worker loop: flush every flush_interval seconds"""
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+class SharedTableStore(_Database):
+    """
+    Table state shared by the worker processes that open the same SQLite
+    file at `path`. Nothing is written behind: save() is a compare-and-swap
+    on the table's revision that either lands or reports a conflict, and
+    sync() reloads a table another worker has changed since.
+    """
+
+    shared = True  # The database holds the tables; workers sync before every request
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._counters = {'saves': 0, 'conflicts': 0, 'reloads': 0, 'failed': 0}
+        self._counters_lock = threading.Lock()
+
+    def _count(self, key):
+        with self._counters_lock:
+            self._counters[key] += 1
+
+    def sync(self, table, force=False):
+        """
+        Bring the table to its stored revision if that differs from the
+        table's (with force, reload it regardless). Returns whether it was
+        reloaded; a table never saved is left as it is. Hold the table's lock.
+        """
+        revision = -1 if force else table.revision
+        with self._db_lock:
+            row = self._db.execute(_SELECT + " AND revision != ?", (table.table_id, revision)).fetchone()
+        if row is None:
+            return False
+        helpers.load_saved_state(table, _saved(row))
+        self._count('reloads')
+        return True
+
+    def save(self, table, expected_revision):
+        """
+        Write the table if the stored revision is still expected_revision
+        (or it was never saved); False if another worker got there first.
+        Call with the table's lock held, after helpers.commit_state.
+        """
+        row = _row(table)
+        try:
+            with self._db_lock, self._db:
+                saved = self._db.execute(_UPDATE_IF_REVISION, row[1:] + (table.table_id, expected_revision)).rowcount
+                if not saved:
+                    saved = self._db.execute(_INSERT_NEW, row).rowcount
+        except sqlite3.Error as e:
+            print(f"Table store write of {table.table_id} failed: {e}")
+            self._count('failed')
+            return False
+        self._count('saves' if saved else 'conflicts')
+        return bool(saved)
+
+    def flush(self):
+        """Nothing to flush: every save is written before it returns"""
+
+    def stats(self):
+        with self._counters_lock:
+            return dict(self._counters)
+
+BACKENDS = {'local': TableStore, 'shared': SharedTableStore}
@@ -0,0 +1,191 @@
+import helpers
+
+# --- Playing Strategies ---
+# A strategy is three charts indexed by the dealer's up card (2-9, T, A):
+#   'hard':  player hard total -> actions
+#   'soft':  player soft total -> actions
+#   'pairs': value of a pair   -> actions (only used while a split is possible)
+# Each row is a 10-character string, one action per up card:
+#   H = hit, S = stand, P = split,
+#   D = double if allowed, otherwise hit,
+#   X = double if allowed, otherwise stand.
+# Rows that are missing fall back to: pairs -> hard/soft chart, and totals
+# below the chart's lowest row -> hit, above its highest -> stand.
+
+ACTIONS = 'HSPDX'
+UP_CARDS = ['2', '3', '4', '5', '6', '7', '8', '9', 'T', 'A']
+
+# Basic strategy for this table: 6 decks, dealer stands on all 17s, double
+# on any two cards and after splits, no surrender. The dealer never peeks,
+# so doubles and splits against a ten or ace lose in full to a blackjack.
+BASIC = {
+    'hard': {
+        8:  'HHHHHHHHHH',
+        9:  'HDDDDHHHHH',
+        10: 'DDDDDDDDHH',
+        11: 'DDDDDDDDHH',
+        12: 'HHSSSHHHHH',
+        13: 'SSSSSHHHHH',
+        14: 'SSSSSHHHHH',
+        15: 'SSSSSHHHHH',
+        16: 'SSSSSHHHHH',
+        17: 'SSSSSSSSSS',
+    },
+    'soft': {
+        12: 'HHHHHHHHHH',
+        13: 'HHHDDHHHHH',
+        14: 'HHHDDHHHHH',
+        15: 'HHDDDHHHHH',
+        16: 'HHDDDHHHHH',
+        17: 'HDDDDHHHHH',
+        18: 'SXXXXSSHHH',
+        19: 'SSSSSSSSSS',
+    },
+    'pairs': {
+        2:  'PPPPPPHHHH',
+        3:  'PPPPPPHHHH',
+        4:  'HHHPPHHHHH',
+        6:  'PPPPPHHHHH',
+        7:  'PPPPPPHHHH',
+        8:  'PPPPPPPPHH',
+        9:  'PPPPPSPPSS',
+        11: 'PPPPPPPPPH',
+    },
+}
+
+# Plays like the dealer: hit anything under 17, never double or split
+MIMIC_DEALER = {
+    'hard': {16: 'HHHHHHHHHH', 17: 'SSSSSSSSSS'},
+    'soft': {16: 'HHHHHHHHHH', 17: 'SSSSSSSSSS'},
+    'pairs': {},
+}
+
+# Never risks a bust: stand on every hard 12 or more
+NEVER_BUST = {
+    'hard': {11: 'HHHHHHHHHH', 12: 'SSSSSSSSSS'},
+    'soft': {17: 'HHHHHHHHHH', 18: 'SSSSSSSSSS'},
+    'pairs': {},
+}
+
+BUILT_IN = {
+    'basic': BASIC,
+    'mimic_dealer': MIMIC_DEALER,
+    'never_bust': NEVER_BUST,
+}
+
+class Strategy:
+    """A compiled strategy: O(1) action lookups by total and dealer up card"""
+
+    def __init__(self, charts):
+        self.hard = self._expand(charts.get('hard', {}))
+        self.soft = self._expand(charts.get('soft', {}))
+        self.pairs = [None] * 12
+        for value, row in charts.get('pairs', {}).items():
+            self.pairs[int(value)] = self._check_row(row)
+
+    @staticmethod
+    def _check_row(row):
+        if len(row) != len(UP_CARDS) or any(action not in ACTIONS for action in row):
+            raise ValueError(f"Invalid strategy row {row!r}: need {len(UP_CARDS)} of {ACTIONS}")
+        return row
+
+    @classmethod
+    def _expand(cls, chart):
+        """Fill every total from 0 to 21, extending the chart's first and last rows"""
+        rows = {int(total): cls._check_row(row) for total, row in chart.items()}
+        if not rows:
+            return ['S' * len(UP_CARDS)] * 22
+        first, last = min(rows), max(rows)
+        expanded = []
+        for total in range(22):
+            if total in rows:
+                expanded.append(rows[total])
+            elif total < first:
+                expanded.append('H' * len(UP_CARDS))
+            elif total > last:
+                expanded.append('S' * len(UP_CARDS))
+            else:
+                expanded.append(expanded[-1])
+        return expanded
+
+    def action(self, total, soft, pair_value, dealer_up, can_double, can_split):
+        """
+        Resolve the action for a hand ('H', 'S', 'D' or 'P').
+        `pair_value` is the value of a splittable pair, or 0; `dealer_up` is
+        the up card's value (2-11).
+        """
+        column = dealer_up - 2
+        if pair_value and can_split:
+            row = self.pairs[pair_value]
+            if row is not None and row[column] == 'P':
+                return 'P'
+        action = (self.soft if soft else self.hard)[total][column]
+        if action == 'P':
+            action = 'H'
+        elif action == 'D':
+            action = 'D' if can_double else 'H'
+        elif action == 'X':
+            action = 'D' if can_double else 'S'
+        return action
+
+CHART_KEYS = {'hard': range(22), 'soft': range(22), 'pairs': range(2, 12)}  # Chart -> allowed row keys
+
+def check_charts(charts):
+    """Raise ValueError unless `charts` has the shape Strategy expects, e.g. as it came in JSON"""
+    if not isinstance(charts, dict):
+        raise ValueError("A strategy must be a dict of charts")
+    for name, chart in charts.items():
+        if name not in CHART_KEYS:
+            raise ValueError(f"Unknown strategy chart {name!r}; charts: {', '.join(CHART_KEYS)}")
+        if not isinstance(chart, dict):
+            raise ValueError(f"Strategy chart {name!r} must map totals to rows")
+        keys = CHART_KEYS[name]
+        for key, row in chart.items():
+            try:
+                total = int(key)
+            except (TypeError, ValueError):
+                total = None
+            if total not in keys:
+                raise ValueError(f"Invalid {name} chart key {key!r}: need {keys.start} to {keys.stop - 1}")
+            if not isinstance(row, str):
+                raise ValueError(f"Invalid strategy row {row!r}: need a string of {len(UP_CARDS)} of {ACTIONS}")
+
+def load(spec):
+    """Return a Strategy from a built-in name or a dict of charts; raises ValueError for anything else"""
+    if isinstance(spec, str):
+        if spec not in BUILT_IN:
+            raise ValueError(f"Unknown strategy {spec!r}; built-in: {', '.join(BUILT_IN)}")
+        spec = BUILT_IN[spec]
+    check_charts(spec)
+    return Strategy(spec)
+
+def next_action(strategy, table):
+    """The strategy's action for the table's active hand, limited to what the table allows"""
+    game_state = table.game_state
+    hand = game_state['player_hands'][game_state['active_hand_index']]['hand']
+    dealer_up = helpers.CARD_CODE_VALUES[game_state['dealer_hand'][1]]
+    return strategy.action(hand.value, hand.soft, hand.pair_value, dealer_up,
+                           game_state['can_double'], game_state['can_split'])
+
+def no_send(table, message, delay=0.0):
+    """send_func for tables that are not wired to MQTT"""
+
+def play_hand(strategy, table, send_func=no_send):
+    """
+    Finish the table's current hand: play every player hand with the
+    strategy through the same helpers actions the routes use, then the
+    dealer's turn. Returns once the hand is complete.
+    """
+    game_state = table.game_state
+    while game_state['game_status'] == 'playing':
+        action = next_action(strategy, table)
+        if action == 'H':
+            helpers.hit(table, send_func)
+        elif action == 'D':
+            helpers.double_down(table, send_func)
+        elif action == 'P':
+            helpers.split_hand(table, send_func)
+        else:
+            helpers.stand(table)
+    while game_state['game_status'] == 'dealer_turn':
+        helpers.dealer_step(table, send_func)
@@ -0,0 +1,131 @@
+import collections
+import struct
+
+import helpers
+
+# --- Card Event Wire Format ---
+# Cards leave the server either as the original text messages (one card
+# name per message, "0" for a shuffle) or as binary frames:
+#
+#   offset  size  field
+#   0       1     version (VERSION)
+#   1       1     flags (FLAG_SHUFFLE: the dealer shuffled; no cards follow)
+#   2       1     length of the table id
+#   3       n     table id (ASCII)
+#   3+n     2     shoe id, counting up each time the table builds a shoe (wraps)
+#   5+n     4     sequence number of the first event in the frame (wraps)
+#   9+n     1     number of cards
+#   10+n    k     card codes (helpers.CARD_NAMES order), one byte each
+#
+# Integers are big-endian. Every card and shuffle sent to a table takes the
+# next sequence number, so a frame with k cards covers k consecutive numbers
+# and a subscriber can tell a lost or reordered frame from a quiet table.
+# The version byte is never a printable character, so one subscriber can
+# tell both formats apart by the first byte.
+
+VERSION = 1
+FLAG_SHUFFLE = 0x01
+TEXT = 'text'
+BINARY = 'binary'
+FORMATS = (TEXT, BINARY)
+SHUFFLE_MESSAGE = '0'
+MAX_CARDS = 255
+
+_HEAD = struct.Struct('>BBB')
+_TAIL = struct.Struct('>HIB')
+
+Frame = collections.namedtuple('Frame', 'table_id shoe_id seq cards shuffle')
+Frame.__doc__ = """A decoded frame; table_id, shoe_id and seq are None for text messages"""
+
+def encode(table_id, shoe_id, seq, cards=b'', shuffle=False):
+    """One binary frame for consecutive events of a table; `cards` are card codes"""
+    table_id = table_id.encode('ascii')
+    return b''.join((
+        _HEAD.pack(VERSION, FLAG_SHUFFLE if shuffle else 0, len(table_id)),
+        table_id,
+        _TAIL.pack(shoe_id & 0xFFFF, seq & 0xFFFFFFFF, len(cards)),
+        bytes(cards),
+    ))
+
+def encode_events(table_id, events):
+    """
+    Binary frames for a table's events in order. Events are
+    (shoe_id, seq, message) with text messages as the routes send them;
+    consecutive cards of one shoe share a frame, and each shuffle gets its own.
+    """
+    frames = []
+    cards = bytearray()
+    first = None
+    for shoe_id, seq, message in events:
+        if cards and (message == SHUFFLE_MESSAGE or shoe_id != first[0] or len(cards) == MAX_CARDS):
+            frames.append(encode(table_id, first[0], first[1], cards))
+            cards = bytearray()
+        if message == SHUFFLE_MESSAGE:
+            frames.append(encode(table_id, shoe_id, seq, shuffle=True))
+            continue
+        if not cards:
+            first = (shoe_id, seq)
+        cards.append(helpers.CARD_CODES[message])
+    if cards:
+        frames.append(encode(table_id, first[0], first[1], cards))
+    return frames
+
+def text_batches(messages):
+    """
+    Text messages in order, split so that each shuffle is a batch of its own:
+    a publisher coalescing a batch then only ever joins card names.
+    """
+    batches = [[]]
+    for message in messages:
+        if message == SHUFFLE_MESSAGE:
+            batches.append([message])
+            batches.append([])
+        else:
+            batches[-1].append(message)
+    return [batch for batch in batches if batch]
+
+def decode(payload):
+    """Decode a binary frame or a text message (a card name, "0", or comma-separated names)"""
+    if payload and payload[0] == VERSION:
+        version, flags, id_length = _HEAD.unpack_from(payload)
+        start = _HEAD.size + id_length
+        shoe_id, seq, count = _TAIL.unpack_from(payload, start)
+        cards = payload[start + _TAIL.size:start + _TAIL.size + count]
+        if len(cards) != count:
+            raise ValueError(f"Truncated frame: {len(cards)} of {count} cards")
+        return Frame(payload[_HEAD.size:start].decode('ascii'), shoe_id, seq,
+                     bytes(cards), bool(flags & FLAG_SHUFFLE))
+
+    if isinstance(payload, (bytes, bytearray)):
+        payload = payload.decode('ascii')
+    names = [name.strip() for name in payload.split(',')]
+    if names == [SHUFFLE_MESSAGE]:
+        return Frame(None, None, None, b'', True)
+    return Frame(None, None, None, bytes(helpers.CARD_CODES[name] for name in names), False)
+
+class SequenceTracker:
+    """Spots lost, repeated and reordered frames per table from their sequence numbers"""
+
+    def __init__(self):
+        self.expected = {}  # table id -> next sequence number
+        self.gaps = 0
+        self.lost = 0
+        self.stale = 0
+
+    def check(self, frame):
+        """
+        Record a decoded binary frame. Returns True if it is in order (or
+        follows a gap) and False if it is a repeat or arrived after a newer one.
+        """
+        expected = self.expected.get(frame.table_id)
+        events = len(frame.cards) or 1
+        if expected is not None:
+            ahead = (frame.seq - expected) & 0xFFFFFFFF
+            if ahead >= 0x80000000:
+                self.stale += 1
+                return False
+            if ahead:
+                self.gaps += 1
+                self.lost += ahead
+        self.expected[frame.table_id] = (frame.seq + events) & 0xFFFFFFFF
+        return True